@@ -2,106 +2,114 @@
 import dash
 import dash_bootstrap_components as dbc
 #pip install dash-bootstrap-components
-from dash import Input, Output, dcc, html
-import pandas as pd
-import numpy as np
+from dash import ClientsideFunction, Input, Output, State, dcc, html, no_update
 import plotly.graph_objects as go
 import plotly.express as px
-import sqlite3
-import os
+import plotly.colors
+from flask import jsonify
+import config
+import clientside
+import background
+import compact
+import export
+import http_cache
+import ingest
+import metrics
+import patching
+import pyramid
+import request_scope
+from data_loader import load_dashboard_data, preload_for_fork
+from snapshot import SnapshotManager
+from sql_backend import SQLDashboardData
+from figure_cache import FigureCache
+from downsample import decimate_frame, max_points_for_width
 
 # %% [markdown]
-# Read from DB or Generate Mock Data(temperary)
+# Read from DB
 
 # %%
-current_directory = os.path.dirname(os.path.abspath(__file__))
-db_path = os.path.join(current_directory, 'Airline_MA.db')
-conn = sqlite3.connect(db_path) 
-
-# %%
-# read data for page 1
-# Sankey Chart Data Processing -> Final use: data_sankey
-query = """
-SELECT 
-    a.company_name,
-    i.year, 
-    i.revenue AS "Revenue", 
-    i.sales_and_services_revenue AS "Sales & Services Revenue", 
-    i.other_revenue AS "Other Revenue", 
-    i.operating_expenses AS "Operating Expenses", 
-    i.selling_and_marketing AS "Selling & Marketing", 
-    i.depreciation_and_amortization AS "Depreciation & Amortization", 
-    i.other_operating_expense AS "Other Operating Expense", 
-    i.operating_income AS "Operating Income", 
-    i.operating_loss AS "Operating Loss"
-FROM 
-    Airline a
-JOIN 
-    IncomeStatement i
-ON 
-    a.company_id = i.company_id;
-"""
-data_sankey = pd.read_sql_query(query, conn)
-
-# Ensure numeric columns are properly converted
-numeric_columns = [
-    "Revenue", "Sales & Services Revenue", "Other Revenue", 
-    "Operating Expenses", "Selling & Marketing", "Depreciation & Amortization", 
-    "Other Operating Expense", "Operating Income", "Operating Loss"
-]
-
-# Convert these columns to numeric, handling errors (e.g., commas or non-numeric values)
-data_sankey[numeric_columns] = data_sankey[numeric_columns].replace(',', '', regex=True)
-data_sankey[numeric_columns] = data_sankey[numeric_columns].apply(pd.to_numeric, errors='coerce')
-
-# Check for missing or NaN values after conversion
-if data_sankey[numeric_columns].isnull().values.any():
-    print("Warning: Some values in the numeric columns are NaN after conversion.")
-
-# read data for page 1
-# Line Chart Data Processing -> Final use: data_line
-data_line = pd.read_sql_query("SELECT * FROM Multiple NATURAL JOIN Airline", conn)
-data_line['date'] = pd.to_datetime(data_line['date'], format='%Y-%m-%d')
-data_line['year'] = data_line['date'].dt.year
-
-# %%
-# read data for page 2
-# Radar Chart Data Processing -> Final use: data_radar
-query = """
-SELECT a.company_name, k.ratio_year, 
-       k.return_on_assets AS Profitability, 
-       k.quick_ratio AS Liquidity, 
-       k.total_debt_to_capital AS Credit, 
-       k.total_debt_to_equity AS Leverage_Ratio, 
-       k.return_on_invested_capit AS ROIC
-FROM Airline a
-JOIN KeyRatios k
-ON a.company_id = k.company_id
-"""
-data_radar = pd.read_sql_query(query, conn)
-
-
-# FootBall Field Data Processing -> Final use: data_football
-key_financial = pd.read_sql_query("SELECT distinct company_name,fin_year, revenue, multiple_type, Q1 as 'lower', Q3 as 'upper' FROM key_financial join Multiple using(company_id) join Airline using (company_id)", conn)
-# Calculate EV_Revenue_lower and EV_Revenue_upper
-key_financial['EV_Revenue_lower'] = np.where(
-    key_financial['multiple_type'] == 'revenue',
-    key_financial['revenue'] * key_financial['lower'],
-    np.nan
-)
-
-key_financial['EV_Revenue_upper'] = np.where(
-    key_financial['multiple_type'] == 'revenue',
-    key_financial['revenue'] * key_financial['upper'] - key_financial['EV_Revenue_lower'],
-    np.nan
-)
-
-
-key_financial_reset = key_financial[['company_name', 'fin_year','multiple_type', 'EV_Revenue_lower', 'EV_Revenue_upper']]
-key_financial_reset = key_financial_reset.dropna()
-key_financial_reset
+# The datasets are read from the DB on first use (see data_loader.py), so
+# importing the app - e.g. in every gunicorn worker - stays cheap. Every
+# dataset is grouped into per-(company, year[, type]) slices so the callbacks
+# look rows up instead of masking the whole frame on each request.
+db_path = config.DB_PATH
+
+def build_data(db_path, reload):
+    if config.DATA_BACKEND == 'sql':
+        # Push the filters down into SQL instead of holding the data in every worker
+        return SQLDashboardData(db_path, immutable=config.SQLITE_IMMUTABLE)
+    return load_dashboard_data(db_path, preload=reload)
+
+# With HOT_RELOAD=1 a changed DB file is re-read in the background and swapped
+# in atomically (see snapshot.py). Callbacks take current_data() once per call
+# and use only that snapshot. The versions include the position in the ingest
+# change log (see ingest.py), so stale_figures() can tell what an ingest changed.
+snapshots = SnapshotManager(db_path, build_data, watch=config.HOT_RELOAD, poll_interval=config.HOT_RELOAD_INTERVAL,
+                            version_fn=ingest.data_version)
+
+def current_snapshot():
+    # One (data, version) snapshot for all the charts of a request (see request_scope.py)
+    return request_scope.memo('data', snapshots.current)
+
+def current_data():
+    return current_snapshot()[0]
+
+def data_version():
+    # Version of the data the callbacks see: within a request that of its
+    # snapshot, so the figure cache (which opens a scope around each figure)
+    # keys a figure on the data it was drawn from (the sql backend reads the live file)
+    if config.DATA_BACKEND == 'sql':
+        return ingest.data_version(db_path)
+    return current_snapshot()[1]
+
+# Figures that don't read the Multiple table, so an ingest never changes them
+INGEST_UNAFFECTED = {'update_sankey', 'update_radar_chart'}
+
+def stale_figures(old_version, new_version):
+    # Cache keys an incremental ingest (ingest.py) made stale: the line and
+    # trend graphs of the changed (company, year, type) slices, every bar chart showing
+    # one of their companies, whose ranges use the Q1/Q3 band as of their year
+    # (or the first band, for years before it; see valuation.one_band_per_key).
+    # None (drop everything) when the file changed some other way.
+    old_mark, new_mark = ingest.version_mark(old_version), ingest.version_mark(new_version)
+    if old_mark is None or new_mark is None or new_mark <= old_mark:
+        return None
+    changed = ingest.changed_slices(db_path, old_mark)
+    companies = {company for company, _, _ in changed}
+
+    def is_stale(key):
+        name, args = key
+        if name == 'line_figure':
+            return args[:3] in changed
+        if name == 'trend_figure':
+            selected, start_year, end_year, selected_type = args[:4]
+            return any(company in selected and multiple_type == selected_type and start_year <= year <= end_year
+                       for company, year, multiple_type in changed)
+        if name == 'update_bar_chart':
+            selected = args[0] if isinstance(args[0], tuple) else (args[0],)
+            return not companies.isdisjoint(selected)
+        return name not in INGEST_UNAFFECTED
+    return is_stale
+
+if config.PRELOAD_DATA:
+    # gunicorn preload_app: read everything in the master so the forked
+    # workers share the DataFrames copy-on-write
+    preload_for_fork(current_data())
+
+# data, data_sankey, data_line, data_radar and data_football stay importable from app
+DATASETS = {
+    'data_sankey': 'sankey',
+    'data_line': 'line',
+    'data_radar': 'radar',
+    'data_football': 'football',
+}
 
-data_football = key_financial_reset.melt(id_vars = ['company_name', 'fin_year', 'multiple_type'],var_name = 'Range', value_name= 'Value')
+def __getattr__(name):
+    if name == 'data':
+        return current_data()
+    if name in DATASETS:
+        return current_data().frame(DATASETS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # %% [markdown]
 # Build App
@@ -113,6 +121,69 @@ app = dash.Dash(external_stylesheets=[dbc.themes.BOOTSTRAP])
 # for deployment
 server = app.server
 
+# Figures are memoized per input combination and invalidated when the data changes
+figure_cache = FigureCache(
+    version_fn=data_version,
+    max_entries=config.FIGURE_CACHE_SIZE,
+    shared_path=config.FIGURE_CACHE_PATH,
+    shared_max_entries=config.FIGURE_CACHE_SHARED_SIZE,
+    stale_fn=stale_figures,
+    order_fn=ingest.version_mark,
+)
+
+# Page layouts (their controls are built from the data) once per data version
+PAGES = ("/", "/page-1")
+layout_cache = FigureCache(version_fn=data_version, max_entries=len(PAGES), order_fn=ingest.version_mark)
+
+@server.route("/cache-stats")
+def cache_stats():
+    return jsonify(figure_cache.stats())
+
+@server.route("/data-snapshot")
+def data_snapshot():
+    return jsonify(snapshots.stats())
+
+if config.EXPORT_ROUTES:
+    export.init_app(server, current_data, chunk_rows=config.EXPORT_CHUNK_ROWS)
+
+if config.METRICS:
+    metrics.init_app(server)
+
+compact.set_json_engine(config.JSON_ENGINE)
+if config.COMPRESS_RESPONSES:
+    compact.init_compression(server, min_bytes=config.COMPRESS_MIN_BYTES)
+
+# (after the compression hook, whose after_request then runs last)
+http_responses = http_cache.ResponseStore(config.HTTP_CACHE_SIZE)
+if config.HTTP_CACHE:
+    http_responses = http_cache.init_app(server, data_version, max_entries=config.HTTP_CACHE_SIZE)
+
+@metrics.REGISTRY.collector
+def cache_metrics():
+    stats = figure_cache.stats()
+    return [
+        ('figure_cache_hits_total', 'counter', 'Figures served from the worker cache', stats['hits']),
+        ('figure_cache_shared_hits_total', 'counter', 'Figures served from the shared cache file', stats['shared_hits']),
+        ('figure_cache_misses_total', 'counter', 'Figures that had to be built', stats['misses']),
+        ('figure_cache_evictions_total', 'counter', 'Figures dropped to stay under FIGURE_CACHE_SIZE', stats['evictions']),
+        ('figure_cache_carried_over_total', 'counter', 'Figures kept across a data change that did not affect them', stats['carried_over']),
+        ('figure_cache_hit_rate', 'gauge', 'Share of lookups served from a cache', stats['hit_rate']),
+        ('figure_cache_entries', 'gauge', 'Figures in the worker cache', stats['entries']),
+        ('layout_cache_misses_total', 'counter', 'Page layouts that had to be built', layout_cache.misses),
+        ('http_cache_hits_total', 'counter', 'Callback responses served from the stored responses', http_responses.hits),
+        ('figure_patches_total', 'counter', 'Figure updates sent as a patch of the drawn figure', drawn_figures.patches),
+        ('figure_full_updates_total', 'counter', 'Figure updates sent as a whole figure (PATCH_FIGURES)', drawn_figures.full),
+        ('http_cache_not_modified_total', 'counter', 'Callback requests answered 304 Not Modified', http_responses.not_modified),
+        ('data_reloads_total', 'counter', 'Hot reloads of the database', snapshots.reloads),
+        ('data_last_reload_seconds', 'gauge', 'Duration of the last hot reload', snapshots.last_reload_seconds),
+    ]
+
+def instrumented(func):
+    # Per-callback timings for /metrics and the slow-callback log
+    if not config.METRICS:
+        return func
+    return metrics.instrument(func, slow_ms=config.SLOW_CALLBACK_MS)
+
 external_stylesheets = [
     'https://fonts.googleapis.com/css2?family=Newsreader:ital,opsz,wght@0,6..72,200..800;1,6..72,200..800&family=Open+Sans:ital,wght@0,300..800;1,300..800&family=PT+Serif+Caption:ital@0;1&display=swap',
      dbc.themes.SLATE
@@ -193,12 +264,154 @@ sidebar = html.Div(
 content = html.Div(id="page-content", style=CONTENT_STYLE)
 
 app.layout = html.Div([dcc.Location(id="url"), sidebar, content])
+if config.COMPACT_FIGURES and not config.CLIENTSIDE_RENDERING:
+    # Compact mode ships the plotly template once here instead of in every figure
+    app.layout.children.append(compact.template_store())
+
+# Heavy figure builds as background jobs (see background.py)
+background_manager = None
+if config.BACKGROUND_CALLBACKS and not config.CLIENTSIDE_RENDERING:
+    background_manager = background.manager(config.BACKGROUND_CACHE_DIR, config.BACKGROUND_EXPIRE, data_version)
+
+# Figures sent per worker, to answer with what changed (see patching.py)
+drawn_figures = patching.DrawnFigures(config.PATCH_HISTORY)
+
+# %%
+# In client-side rendering mode each page carries its chart data in a dcc.Store
+# and the figures are drawn in the browser; otherwise the callbacks below run
+def overview_store():
+    if not config.CLIENTSIDE_RENDERING:
+        return []
+    data, version = current_data(), data_version()
+    return [dcc.Store(id='overview-data', data=clientside.overview_payload(data, version, company_colors, link_colors_by_company))]
+
+def comparison_store():
+    if not config.CLIENTSIDE_RENDERING:
+        return []
+    data, version = current_data(), data_version()
+    return [dcc.Store(id='comparison-data', data=clientside.comparison_payload(data, version, company_colors, config.FOOTBALL_MULTIPLES))]
+
+def trend_section(data):
+    # Multi-year trend of several airlines for the type picked above. The
+    # client-side payloads only hold single-year series, so not in that mode.
+    if config.CLIENTSIDE_RENDERING:
+        return []
+    trend = data.trend
+    if trend.years is None:
+        return []
+    first_year, last_year = trend.years
+    return [
+        html.Div(
+            [
+            dbc.Label("Airlines:"),
+            dbc.Checklist(
+                id="trend-companies",
+                options=[{'label': f'  {company}', 'value': company} for company in trend.companies],
+                value=trend.companies,
+                inline=True
+            )
+            ],
+            style={'display': 'flex', 'justifyContent': 'flex-start', 'gap': '15px', 'marginTop': '20px'}
+        ),
+        dcc.RangeSlider(
+            id='trend-years',
+            min=first_year,
+            max=last_year,
+            step=1,
+            value=[first_year, last_year],
+            marks={year: str(year) for year in range(first_year, last_year + 1)}
+        ),
+        *progress_bars('trend-graph'),
+        dcc.Graph(id='trend-graph'),
+        *figure_stores('trend-graph'),
+    ]
+
+def figure_stores(*graph_ids):
+    # Compact mode: the callbacks write to a '<graph>-payload' store; patch
+    # mode: a '<graph>-drawn' store tells which figure the graph shows
+    if config.CLIENTSIDE_RENDERING:
+        return []
+    if config.COMPACT_FIGURES:
+        return [compact.payload_store(graph_id) for graph_id in graph_ids]
+    if config.PATCH_FIGURES:
+        return [patching.drawn_store(graph_id) for graph_id in graph_ids]
+    return []
+
+def progress_bars(graph_id):
+    # Background mode: progress of the page callback that draws graph_id
+    if background_manager is None:
+        return []
+    return [background.progress_bar(graph_id)]
+
+def figure_callback(outputs, *args, **kwargs):
+    # `outputs`: the figure Output of a graph, or a list of them
+    if config.CLIENTSIDE_RENDERING:
+        return lambda func: func
+    graph_ids = [output.component_id for output in (outputs if isinstance(outputs, list) else [outputs])]
+    job = lambda func: func
+    if background_manager is not None:
+        kwargs.update(background.options(graph_ids[0], background_manager, config.BACKGROUND_INTERVAL_MS))
+        job = background.reporting
+    if config.COMPACT_FIGURES:
+        payloads = [Output(compact.payload_id(graph_id), 'data') for graph_id in graph_ids]
+        register = app.callback(payloads if isinstance(outputs, list) else payloads[0], *args, **kwargs)
+        for graph_id in graph_ids:
+            compact.register_graph(app, graph_id)
+        # Compacted once per cached figure (as many as the figure cache holds)
+        compacted = lambda func: compact.compacting(func, config.FIGURE_SIGNIFICANT_DIGITS, config.FIGURE_CACHE_SIZE)
+        return lambda func: register(job(instrumented(compacted(func))))
+    if config.PATCH_FIGURES:
+        # Also write the drawn tokens, and read them after the callback's own states
+        figures = outputs if isinstance(outputs, list) else [outputs]
+        register = app.callback(figures + patching.drawn_outputs(graph_ids), *args,
+                                *patching.drawn_states(graph_ids), **kwargs)
+        return lambda func: register(job(instrumented(patching.partial(func, len(graph_ids), drawn_figures))))
+    register = app.callback(outputs, *args, **kwargs)
+    return lambda func: register(job(instrumented(func)))
+
+def triggered_id():
+    # Component that fired the running callback (None when called directly)
+    try:
+        return dash.ctx.triggered_id
+    except dash.exceptions.MissingCallbackContextException:
+        return None
+
+if config.CLIENTSIDE_RENDERING:
+    clientside.register(app)
+else:
+    # Measure the line graph once per page load, update_graphs sizes its downsampling to it
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='graph_width'),
+        Output('line-graph-width', 'data'),
+        Input('line-graph-width', 'id'),
+    )
 
 # %%
 # Callback for page layout
 @app.callback(Output("page-content", "children"), [Input("url", "pathname")])
+@instrumented
 def render_page_content(pathname):
+    if pathname in PAGES:
+        return page_layout(pathname)
+    # If the user tries to reach a different page, return a 404 message
+    return html.Div(
+        [
+            html.H1("404: Not found", className="text-danger"),
+            html.Hr(),
+            html.P(f"The pathname {pathname} was not recognised..."),
+        ],
+        className="p-3 bg-light rounded-3",
+    )
+
+# Built on the first navigation after a data change, then shared by every
+# request (Dash only reads the component tree when it serializes it)
+@layout_cache.memoize
+def page_layout(pathname):
+    data = current_data()
     if pathname == "/":
+        sankey_companies = data.distinct('sankey', 'company_name')
+        sankey_years = data.distinct('sankey', 'year')
+        multiple_types = data.distinct('line', 'multiple_type')
         return html.Div([
             html.H2('Overview Yearly Performance', style={'font-family': 'Newsreader, serif', 'font-size': '24px', 'font-weight': '700'}),
             html.Div(
@@ -206,7 +419,7 @@ def render_page_content(pathname):
                 dbc.Label("Airline:"),
                 dbc.RadioItems(
                     id="company-filter",
-                    options=[{'label': company, 'value': company} for company in data_sankey['company_name'].unique()],
+                    options=[{'label': company, 'value': company} for company in sankey_companies],
                     value="Spirit", # Default selected company
                     inline=True
                     )
@@ -215,31 +428,38 @@ def render_page_content(pathname):
             html.Div(
                 dcc.Slider(
                     id='year-filter',
-                    min=data_sankey['year'].min(),
-                    max=data_sankey['year'].max(),
+                    min=min(sankey_years),
+                    max=max(sankey_years),
                     step=1,
-                    value=data_sankey['year'].max(), # Default selected year
+                    value=max(sankey_years), # Default selected year
                     included=False,
-                    marks={year: str(year) for year in range(data_sankey['year'].min(), data_sankey['year'].max() + 1)}
+                    marks={year: str(year) for year in range(min(sankey_years), max(sankey_years) + 1)}
                 ),
                 # style={'marginBottom': '40px'}
             ),
+            *progress_bars('sankey-diagram'),
             dcc.Graph(id="sankey-diagram"),
             html.Div(
                 [
                 dbc.Label("Type:"),
                 dbc.RadioItems(
                     id="multiple-filter",
-                    options=[{'label': type, 'value': type} for type in data_line['multiple_type'].unique()],
-                    value=data_line['multiple_type'].unique()[0],
+                    options=[{'label': type, 'value': type} for type in multiple_types],
+                    value=multiple_types[0],
                     inline=True
                 )
                 ],
                 style={'display': 'flex', 'justifyContent': 'flex-start', 'gap': '15px'}
             ),
             dcc.Graph(id='line-graph'),
+            dcc.Store(id='line-graph-width'),
+            *trend_section(data),
+            *overview_store(),
+            *figure_stores('sankey-diagram', 'line-graph'),
             ])
-    elif pathname == "/page-1":
+    else:
+        radar_companies = data.distinct('radar', 'company_name')
+        football_years = data.distinct('football', 'fin_year')
         return html.Div([
             html.H2("Comparison between Airlines", style={'font-family': 'Newsreader, serif', 'font-size': '24px', 'font-weight': '700'}),
 
@@ -249,8 +469,8 @@ def render_page_content(pathname):
                 dbc.Label("Airline:"),
                 dbc.Checklist(
                     id="company-checklist",
-                    options=[{'label': f'  {company}', 'value': company} for company in data_radar['company_name'].unique()],
-                    value=data_radar['company_name'].unique().tolist(),
+                    options=[{'label': f'  {company}', 'value': company} for company in radar_companies],
+                    value=radar_companies,
                     inline=True
                     )
                 ],
@@ -261,16 +481,18 @@ def render_page_content(pathname):
             html.Div(
                 dcc.Slider(
                     id='year-slider',
-                    min=data_football['fin_year'].min(),
-                    max=data_football['fin_year'].max(),
+                    min=min(football_years),
+                    max=max(football_years),
                     step=1,
-                    value=data_football['fin_year'].max(),
+                    value=max(football_years),
                     included=False,
-                    marks={int(year): str(year) for year in data_football['fin_year'].unique()}
+                    marks={int(year): str(year) for year in football_years}
                 ),
                 # style={'marginBottom': '40px'}
             ),
 
+            *progress_bars('radar-chart'),
+
             # Radar Chart
             html.Div(
                 dcc.Graph(id='radar-chart'), 
@@ -281,34 +503,47 @@ def render_page_content(pathname):
             html.Div(
                 dcc.Graph(id='bar-chart')
                 ),
+            *comparison_store(),
+            *figure_stores('radar-chart', 'bar-chart'),
         ])
-    # If the user tries to reach a different page, return a 404 message
-    return html.Div(
-        [
-            html.H1("404: Not found", className="text-danger"),
-            html.Hr(),
-            html.P(f"The pathname {pathname} was not recognised..."),
-        ],
-        className="p-3 bg-light rounded-3",
+
+# %%
+# Filtered slices shared by the charts of a page. Each page's charts are drawn
+# by one multi-output callback (update_overview, update_comparison at the end),
+# so within an interaction these run once however many charts use them.
+def line_rows(selected_company, selected_year, selected_type):
+    return request_scope.memo(
+        ('line', selected_company, selected_year, selected_type),
+        lambda: current_data().line_slices.get(selected_company, selected_year, selected_type),
     )
 
+def comparison_rows(selected_companies, selected_year):
+    # None when fewer than two companies are selected, otherwise the radar rows
+    # of each company and the football field rows of all of them
+    def compute():
+        if len(selected_companies) < 2:
+            return None
+        data = current_data()
+        return (
+            [data.radar_slices.get(company, selected_year) for company in selected_companies],
+            data.football_slices.get_many([
+                (company, selected_year, multiple_type)
+                for company in selected_companies for multiple_type in config.FOOTBALL_MULTIPLES
+            ]),
+        )
+    return request_scope.memo(('comparison', tuple(selected_companies), selected_year), compute)
+
 # %%
-# Callback for Sankey Diagram
-@app.callback(
-    Output('sankey-diagram', 'figure'),
-    [Input('company-filter', 'value'),
-     Input('year-filter', 'value')]
-)
+# Sankey Diagram
+@figure_cache.memoize
 def update_sankey(selected_company, selected_year):
+    data = current_data()
     # Ensure single company is selected
     if isinstance(selected_company, list):
         selected_company = selected_company[0]
     
-    # Filter the data for the selected company and year
-    filtered_data = data_sankey[
-        (data_sankey['company_name'] == selected_company) & 
-        (data_sankey['year'] == selected_year)
-    ]
+    # Look up the rows for the selected company and year
+    filtered_data = data.sankey_slices.get(selected_company, selected_year)
 
     # Get the individual values
     sales_services_revenue = filtered_data['Sales & Services Revenue'].values[0]
@@ -321,8 +556,8 @@ def update_sankey(selected_company, selected_year):
     depreciation_amortization = filtered_data['Depreciation & Amortization'].values[0]
     other_operating_expense = filtered_data['Other Operating Expense'].values[0]
 
-    # Select link colors for the selected company
-    link_colors = link_colors_by_company[selected_company]
+    # Select link colors for the selected company (plotly's default for others)
+    link_colors = link_colors_by_company.get(selected_company)
     
     # Generate the Sankey diagram data
     nodes = [
@@ -392,44 +627,49 @@ def update_sankey(selected_company, selected_year):
     )
     return sankey_chart
 
-# Callback for Line Chart
-@app.callback(
-    Output('line-graph', 'figure'),
-    [Input('company-filter', 'value'),
-     Input('year-filter', 'value'),
-     Input('multiple-filter', 'value')]
-)
-def update_graphs(selected_company, selected_year, selected_type):
-    filtered_df = data_line[
-        (data_line['company_name']==selected_company) &
-        (data_line['year'] == selected_year) & 
-        (data_line['multiple_type'] == selected_type)
-    ]
+# Line Chart
+def no_data_figure():
+    empty_figure = px.line()
+    message_annotation = {
+        'x': 0.5, 'y': 0.5, 'xref': 'paper', 'yref': 'paper', 
+        'text': 'No data available for the selected filters.',
+        'font':dict(
+                    size=15,
+                    family="Newsreader, serif",
+                    color="#CC0000"
+                ), 'showarrow': False}
+
+    # Update the figure layout and show
+    empty_figure.update_layout({'annotations': [message_annotation]})
+    empty_figure.update_layout(
+        plot_bgcolor='white',
+        height=400,
+        paper_bgcolor="white",
+        xaxis_showticklabels=False,
+        yaxis_showticklabels=False
+    )
+    return empty_figure
+
+def update_graphs(selected_company, selected_year, selected_type, graph_width=None):
+    # The figure is cached per number of points drawn rather than per graph
+    # width, so every width that shows the whole series shares one figure
+    # (and the warm-up in warmup.py does not need to know the browser widths)
+    points = len(line_rows(selected_company, selected_year, selected_type))
+    max_points = max_points_for_width(graph_width, config.LINE_POINTS_PER_PX, config.LINE_MAX_POINTS)
+    return line_figure(selected_company, selected_year, selected_type, min(points, max_points))
+
+@figure_cache.memoize
+def line_figure(selected_company, selected_year, selected_type, max_points):
+    filtered_df = line_rows(selected_company, selected_year, selected_type)
 
     if filtered_df.empty:
-        empty_figure = px.line()
-        message_annotation = {
-            'x': 0.5, 'y': 0.5, 'xref': 'paper', 'yref': 'paper', 
-            'text': 'No data available for the selected filters.',
-            'font':dict(
-                        size=15,
-                        family="Newsreader, serif",
-                        color="#CC0000"
-                    ), 'showarrow': False}
+        return no_data_figure()
 
-        # Update the figure layout and show
-        empty_figure.update_layout({'annotations': [message_annotation]})
-        empty_figure.update_layout(
-            plot_bgcolor='white',
-            height=400,
-            paper_bgcolor="white",
-            xaxis_showticklabels=False,
-            yaxis_showticklabels=False
-        )
-        return empty_figure
+    # Long series are decimated to about two points per pixel of the graph
+    plot_df = decimate_frame(filtered_df, 'date', 'multiple_value', max_points, config.LINE_DOWNSAMPLE)
 
     line_graph = px.line(
-        data_frame=filtered_df,
+        data_frame=plot_df,
         x='date', 
         y='multiple_value',
         color='company_name',
@@ -437,26 +677,26 @@ def update_graphs(selected_company, selected_year, selected_type):
         )
     
     line_graph.add_hline(
-        y=filtered_df[filtered_df['year']==selected_year].iloc[0]['average'],  
+        y=filtered_df.iloc[0]['average'],
         line_dash="solid",
         line_color="black",
-        annotation_text=f"Average({round(filtered_df[filtered_df['year']==selected_year].iloc[0]['average'],2)})",
+        annotation_text=f"Average({round(filtered_df.iloc[0]['average'],2)})",
         annotation_position="top right"
     )
 
     line_graph.add_hline(
-        y=filtered_df[filtered_df['year']==selected_year].iloc[0]['Q1'],  
+        y=filtered_df.iloc[0]['Q1'],
         line_dash="dash",
         line_color="grey",
-        annotation_text=f"-1 std({round(filtered_df[filtered_df['year']==selected_year].iloc[0]['Q1'],2)})",
+        annotation_text=f"-1 std({round(filtered_df.iloc[0]['Q1'],2)})",
         annotation_position="top right"
     )
 
     line_graph.add_hline(
-        y=filtered_df[filtered_df['year']==selected_year].iloc[0]['Q3'],  
+        y=filtered_df.iloc[0]['Q3'],
         line_dash="dash",
         line_color="grey",
-        annotation_text=f"+1 std({round(filtered_df[filtered_df['year']==selected_year].iloc[0]['Q3'],2)})",
+        annotation_text=f"+1 std({round(filtered_df.iloc[0]['Q3'],2)})",
         annotation_position="top right"
     )
     
@@ -469,14 +709,69 @@ def update_graphs(selected_company, selected_year, selected_type):
 
     return line_graph
 
-# Callback for Radar Chart
-@app.callback(
-    Output('radar-chart', 'figure'),
-    [Input('company-checklist', 'value'),
-     Input('year-slider', 'value')]
-)
+# Multi-year trend: the selected airlines over a range of years, drawn from
+# the aggregation pyramid (pyramid.py) at the finest level that fits the graph
+def update_trend_graph(selected_companies, selected_years, selected_type, graph_width=None):
+    max_points = max_points_for_width(graph_width, config.TREND_POINTS_PER_PX, config.LINE_MAX_POINTS)
+    start_year, end_year = selected_years
+    return trend_figure(selected_companies, start_year, end_year, selected_type, max_points)
+
+@figure_cache.memoize
+def trend_figure(selected_companies, start_year, end_year, selected_type, max_points):
+    level, series = current_data().trend.select(selected_companies, selected_type, start_year, end_year, max_points)
+    if not series:
+        return no_data_figure()
+
+    trend_graph = go.Figure()
+    for company, rows in series.items():
+        if len(rows) > max_points:
+            # Even the monthly level is longer than the graph is wide
+            rows = decimate_frame(rows, 'date', 'mean', max_points, config.LINE_DOWNSAMPLE)
+        color = company_colors.get(company)
+        if level != 'day':
+            # Range of the daily values in each bucket, as a band around the mean
+            red, green, blue = plotly.colors.hex_to_rgb(color) if color else (128, 128, 128)
+            trend_graph.add_trace(go.Scatter(
+                x=rows['date'], y=rows['max'], mode='lines', line=dict(width=0),
+                legendgroup=company, showlegend=False, hoverinfo='skip'
+            ))
+            trend_graph.add_trace(go.Scatter(
+                x=rows['date'], y=rows['min'], mode='lines', line=dict(width=0),
+                fill='tonexty', fillcolor=f'rgba({red}, {green}, {blue}, 0.25)',
+                legendgroup=company, showlegend=False, hoverinfo='skip'
+            ))
+        hover = f"{company}<br>%{{x|%Y-%m-%d}}: %{{y:.3f}}"
+        customdata = None
+        if level != 'day':
+            hover += " (min %{customdata[0]:.3f}, max %{customdata[1]:.3f}, last %{customdata[2]:.3f})"
+            customdata = rows[['min', 'max', 'last']].to_numpy()
+        trend_graph.add_trace(go.Scatter(
+            x=rows['date'], y=rows['mean'], mode='lines', name=company,
+            line=dict(color=color), legendgroup=company,
+            customdata=customdata, hovertemplate=hover + "<extra></extra>"
+        ))
+
+    span = str(start_year) if start_year == end_year else f"{start_year}-{end_year}"
+    trend_graph.update_layout(
+        title_text=f"Multiple Trend of {span} ({pyramid.LABELS[level]} {'values' if level == 'day' else 'mean, min-max band'})",
+        yaxis_title=f'{selected_type} multiple',
+        plot_bgcolor='#f5f5f5',
+        height=400
+    )
+    return trend_graph
+
+def checklist_order(selected_companies, year):
+    # The checklist sends its value in click order; the comparison charts are
+    # drawn (and cached, and pre-rendered by warmup.py) in the order of its options
+    options = request_scope.memo('checklist', lambda: current_data().distinct('radar', 'company_name'))
+    rank = {company: position for position, company in enumerate(options)}
+    return sorted(selected_companies, key=lambda company: rank.get(company, len(rank))), year
+
+# Radar Chart
+@figure_cache.memoize(canonical=checklist_order)
 def update_radar_chart(selected_companies, selected_year):
-    if len(selected_companies) < 2:
+    rows = comparison_rows(selected_companies, selected_year)
+    if rows is None:
         figure = go.Figure()
         figure.update_layout(
             plot_bgcolor="white",
@@ -501,12 +796,9 @@ def update_radar_chart(selected_companies, selected_year):
         )
         return figure
 
-    filtered_data = data_radar[
-        (data_radar['ratio_year'] == selected_year) & 
-        (data_radar['company_name'].isin(selected_companies))
-    ]
+    company_rows = rows[0]
     
-    if filtered_data.empty:
+    if all(rows.empty for rows in company_rows):
         figure = go.Figure()
         figure.update_layout(
             title=f"No data available for year {selected_year}",
@@ -518,13 +810,11 @@ def update_radar_chart(selected_companies, selected_year):
         return figure
 
     metrics = ["Profitability", "Liquidity", "Credit", "Leverage_Ratio", "ROIC"]
-    for metric in metrics:
-        filtered_data[metric] = pd.to_numeric(filtered_data[metric], errors='coerce')
     
     radar = []
-    for company in selected_companies:
-        company_data = filtered_data[filtered_data['company_name'] == company]
+    for company, company_data in zip(selected_companies, company_rows):
         if not company_data.empty:
+            # (numeric since the load stage, see schema.py)
             values = company_data[metrics].iloc[0].tolist()
             values.append(values[0])  # Close the loop
             radar.append(go.Scatterpolar(
@@ -553,14 +843,11 @@ def update_radar_chart(selected_companies, selected_year):
     )
     return radar_chart
 
-# Callback for Bar Chart
-@app.callback(
-    Output('bar-chart', 'figure'),
-    [Input('company-checklist', 'value'),
-     Input('year-slider', 'value')]
-)
+# Bar Chart
+@figure_cache.memoize(canonical=checklist_order)
 def update_bar_chart(selected_companies, year):
-    if len(selected_companies) < 2:
+    rows = comparison_rows(selected_companies, year)
+    if rows is None:
         figure = go.Figure()
         figure.update_layout(
             plot_bgcolor="white",
@@ -586,14 +873,9 @@ def update_bar_chart(selected_companies, year):
         return figure    
 
     # Filter data
-    filtered_data = data_football[data_football['company_name'].isin(selected_companies)]
-    filtered_data = filtered_data[filtered_data['fin_year'] == year]
-    
-    # Adjust Range for better legend and visualization
-    filtered_data['Range_Display'] = filtered_data.apply(
-        lambda row: row['company_name'] if row['Range'] == 'EV_Revenue_upper' else 'Transparent',
-        axis=1
-    )
+    # (the ranges and their Range_Display legend/colour are precomputed in valuation.py)
+    multiple_types = config.FOOTBALL_MULTIPLES
+    filtered_data = rows[1]
     
     # Define a color map
     color_discrete_map = {
@@ -606,7 +888,7 @@ def update_bar_chart(selected_companies, year):
     football_chart = px.bar(
         filtered_data, 
         x='Value', 
-        y='company_name', 
+        y='company_name' if len(multiple_types) == 1 else 'Label', # one bar per company and multiple type
         color='Range_Display',
         title="Enterprise Value Range",
         color_discrete_map=color_discrete_map
@@ -640,6 +922,60 @@ def update_bar_chart(selected_companies, year):
     
     return football_chart
 
+# %%
+# Page callbacks: one request per interaction draws every chart of the page
+@figure_callback(
+    [Output('sankey-diagram', 'figure'),
+     Output('line-graph', 'figure')],
+    [Input('company-filter', 'value'),
+     Input('year-filter', 'value'),
+     Input('multiple-filter', 'value')],
+    State('line-graph-width', 'data')
+)
+@request_scope.scoped
+def update_overview(selected_company, selected_year, selected_type, graph_width=None):
+    # A new multiple type only changes the line graph
+    if triggered_id() == 'multiple-filter':
+        sankey = no_update
+    else:
+        sankey = update_sankey(selected_company, selected_year)
+        background.progress(1, 2)
+    return sankey, update_graphs(selected_company, selected_year, selected_type, graph_width)
+
+@figure_callback(
+    [Output('radar-chart', 'figure'),
+     Output('bar-chart', 'figure')],
+    [Input('company-checklist', 'value'),
+     Input('year-slider', 'value')]
+)
+@request_scope.scoped
+def update_comparison(selected_companies, selected_year):
+    radar = update_radar_chart(selected_companies, selected_year)
+    background.progress(1, 2)
+    return radar, update_bar_chart(selected_companies, selected_year)
+
+@figure_callback(
+    Output('trend-graph', 'figure'),
+    [Input('trend-companies', 'value'),
+     Input('trend-years', 'value'),
+     Input('multiple-filter', 'value')],
+    State('line-graph-width', 'data')
+)
+def update_trend(selected_companies, selected_years, selected_type, graph_width=None):
+    return update_trend_graph(selected_companies, selected_years, selected_type, graph_width)
+
+# GET /figure/<chart>, e.g. /figure/bar?companies=Spirit&companies=JetBlue&year=2023
+FIGURE_ROUTES = {
+    'sankey': (update_sankey, [('company', str), ('year', int)]),
+    'line': (update_graphs, [('company', str), ('year', int), ('type', str)]),
+    'trend': (trend_figure, [('companies', list), ('start', int), ('end', int), ('type', str), ('points', int)]),
+    'radar': (update_radar_chart, [('companies', list), ('year', int)]),
+    'bar': (update_bar_chart, [('companies', list), ('year', int)]),
+}
+if config.FIGURE_ENDPOINT:
+    http_cache.figure_endpoint(server, FIGURE_ROUTES, data_version, max_age=config.HTTP_CACHE_MAX_AGE,
+                               store=http_responses)
+
 
 if __name__ == "__main__":
     app.run(debug=True)
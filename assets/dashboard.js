@@ -0,0 +1,293 @@
+// Clientside versions of update_sankey, update_graphs, update_radar_chart and
+// update_bar_chart (see clientside.py). They build the same figures as the
+// server-side callbacks from the payload stored in the page's dcc.Store.
+// graph_width is used in the default (server-side) mode to tell update_graphs
+// how wide the line graph is, with_template in the compact figure mode.
+
+(function () {
+    var SANKEY_NODES = [
+        "Sales & Services Revenue",
+        "Other Revenue",
+        "Revenue",
+        "Operating Income",
+        "Operating Expenses",
+        "Operating Loss",
+        "Selling & Marketing",
+        "Depreciation & Amortization",
+        "Other Operating Expense"
+    ];
+
+    var MESSAGE_FONT = {size: 15, family: "Newsreader, serif", color: "#CC0000"};
+
+    // Same as numpy's round(value, 2): scale, round half to even, unscale
+    function round2(value) {
+        var scaled = value * 100;
+        var rounded = Math.round(scaled);
+        if (rounded - scaled === 0.5 && rounded % 2 !== 0) {
+            rounded -= 1;
+        }
+        rounded = rounded / 100;
+        // Python prints whole floats as "4.0"
+        return Number.isInteger(rounded) ? rounded.toFixed(1) : String(rounded);
+    }
+
+    // The checklist sends its value in click order; the comparison charts
+    // follow the order of its options, like checklist_order in app.py
+    function checklistOrder(companies, payload) {
+        var rank = {};
+        payload.companies.forEach(function (company, position) {
+            rank[company] = position;
+        });
+        var last = payload.companies.length;
+        return companies.slice().sort(function (a, b) {
+            var first = rank.hasOwnProperty(a) ? rank[a] : last;
+            var second = rank.hasOwnProperty(b) ? rank[b] : last;
+            return first - second;
+        });
+    }
+
+    function reminderFigure(text, template) {
+        return {
+            data: [],
+            layout: {
+                template: template,
+                plot_bgcolor: "white",
+                paper_bgcolor: "white",
+                xaxis: {visible: false},
+                yaxis: {visible: false},
+                annotations: [{
+                    text: text, x: 0.5, y: 0.5, xref: "paper", yref: "paper",
+                    showarrow: false, font: MESSAGE_FONT
+                }]
+            }
+        };
+    }
+
+    function hline(y, dash, color, label) {
+        return {
+            shape: {
+                type: "line", x0: 0, x1: 1, xref: "x domain", y0: y, y1: y, yref: "y",
+                line: {color: color, dash: dash}
+            },
+            annotation: {
+                showarrow: false, text: label + "(" + round2(y) + ")",
+                x: 1, xanchor: "right", xref: "x domain", y: y, yanchor: "bottom", yref: "y"
+            }
+        };
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        dashboard: {
+            // Compact mode (compact.py): a server-side figure sent without the
+            // plotly template, which the page received once in its layout
+            with_template: function (figure, template) {
+                if (!figure) {
+                    return window.dash_clientside.no_update;
+                }
+                var layout = Object.assign({}, figure.layout);
+                if (!layout.template) {
+                    layout.template = template;
+                }
+                return Object.assign({}, figure, {layout: layout});
+            },
+
+            graph_width: function () {
+                var graph = document.getElementById("line-graph");
+                var width = graph ? graph.offsetWidth : window.innerWidth;
+                // Rounded up to 100px so the figure cache sees few distinct widths
+                return Math.ceil(width / 100) * 100;
+            },
+
+            sankey: function (company, year, payload) {
+                if (Array.isArray(company)) {
+                    company = company[0];
+                }
+                var row = ((payload.sankey[company] || {})[String(year)]);
+                if (!row) {
+                    return window.dash_clientside.no_update;
+                }
+                // Same column order as clientside.SANKEY_COLUMNS
+                var revenue = row[0], salesServices = row[1], other = row[2],
+                    opex = row[3], selling = row[4], depreciation = row[5],
+                    otherOpex = row[6], income = row[7], loss = row[8];
+
+                var links;
+                if (loss === 0 && income > 0) {
+                    // Revenue splits into Operating Expenses and Operating Income
+                    links = {
+                        source: [0, 1, 2, 2, 5, 4, 4, 4],
+                        target: [2, 2, 3, 4, 4, 6, 7, 8],
+                        value: [salesServices, other, income, opex, loss, selling, depreciation, otherOpex]
+                    };
+                } else {
+                    links = {
+                        source: [0, 1, 2, 5, 4, 4, 4],
+                        target: [2, 2, 4, 4, 6, 7, 8],
+                        value: [salesServices, other, revenue, loss, selling, depreciation, otherOpex]
+                    };
+                }
+                links.color = payload.link_colors[company];
+
+                return {
+                    data: [{
+                        type: "sankey",
+                        node: {
+                            pad: 15, thickness: 20, line: {color: "#E0E0E0", width: 0},
+                            label: SANKEY_NODES, color: "#f5f5f5"
+                        },
+                        link: links
+                    }],
+                    layout: {
+                        template: payload.template,
+                        title: {text: "Sankey Diagram for " + company + " " + year + " Financial Data"}
+                    }
+                };
+            },
+
+            line: function (company, year, type, payload) {
+                var series = (((payload.line[company] || {})[type] || {})[String(year)]);
+                if (!series) {
+                    return {
+                        data: [],
+                        layout: {
+                            template: payload.template,
+                            annotations: [{
+                                x: 0.5, y: 0.5, xref: "paper", yref: "paper",
+                                text: "No data available for the selected filters.",
+                                font: MESSAGE_FONT, showarrow: false
+                            }],
+                            plot_bgcolor: "white",
+                            height: 400,
+                            paper_bgcolor: "white",
+                            xaxis: {showticklabels: false},
+                            yaxis: {showticklabels: false}
+                        }
+                    };
+                }
+
+                var lines = [
+                    hline(series.average, "solid", "black", "Average"),
+                    hline(series.Q1, "dash", "grey", "-1 std"),
+                    hline(series.Q3, "dash", "grey", "+1 std")
+                ];
+                return {
+                    data: [{
+                        type: "scatter", mode: "lines", name: company, legendgroup: company,
+                        showlegend: true, x: series.x, y: series.y,
+                        line: {color: payload.company_colors[company], dash: "solid"},
+                        hovertemplate: "company_name=" + company + "<br>date=%{x}<br>multiple_value=%{y}<extra></extra>"
+                    }],
+                    layout: {
+                        template: payload.template,
+                        xaxis: {title: {text: "date"}},
+                        yaxis: {title: {text: type + " multiple"}},
+                        legend: {title: {text: "company_name"}, tracegroupgap: 0},
+                        margin: {t: 60},
+                        shapes: lines.map(function (l) { return l.shape; }),
+                        annotations: lines.map(function (l) { return l.annotation; }),
+                        title: {text: "Multiple Trend of " + year},
+                        plot_bgcolor: "#f5f5f5",
+                        height: 400
+                    }
+                };
+            },
+
+            radar: function (companies, year, payload) {
+                companies = companies || [];
+                if (companies.length < 2) {
+                    return reminderFigure("Reminder: Please select at least two companies to display a meaningful comparison on the radar chart.", payload.template);
+                }
+                companies = checklistOrder(companies, payload);
+                var metrics = payload.metrics;
+                var theta = metrics.concat([metrics[0]]);
+                var traces = [];
+                companies.forEach(function (company) {
+                    var values = (payload.radar[company] || {})[String(year)];
+                    if (values) {
+                        traces.push({
+                            type: "scatterpolar", r: values.concat([values[0]]), theta: theta,
+                            fill: "toself", name: company,
+                            line: {color: payload.company_colors[company] || "#000000"}
+                        });
+                    }
+                });
+                if (!traces.length) {
+                    return {
+                        data: [],
+                        layout: {
+                            template: payload.template,
+                            title: {text: "No data available for year " + year},
+                            plot_bgcolor: "white",
+                            paper_bgcolor: "white",
+                            xaxis: {visible: false},
+                            yaxis: {visible: false}
+                        }
+                    };
+                }
+                return {
+                    data: traces,
+                    layout: {
+                        template: payload.template,
+                        polar: {bgcolor: "#f5f5f5", radialaxis: {visible: true}},
+                        title: {text: "Financial Ratios for Year " + year},
+                        legend: {
+                            xanchor: "left", yanchor: "middle", x: 1.1, y: 0.5,
+                            orientation: "v", traceorder: "normal"
+                        }
+                    }
+                };
+            },
+
+            bar: function (companies, year, payload) {
+                companies = companies || [];
+                if (companies.length < 2) {
+                    return reminderFigure("Reminder: Please select at least two companies to display a meaningful comparison on the football field chart.", payload.template);
+                }
+                companies = checklistOrder(companies, payload);
+                // One trace per colour as px.bar does: the lower bound is drawn
+                // transparent and the upper range is stacked on top of it
+                var traces = [];
+                var byName = {};
+                companies.forEach(function (company) {
+                    var ranges = (payload.football[company] || {})[String(year)] || [];
+                    ranges.forEach(function (range) {
+                        var name = range[0];
+                        if (!byName[name]) {
+                            byName[name] = {
+                                type: "bar", orientation: "h", name: name, legendgroup: name,
+                                showlegend: name !== "Transparent", textposition: "auto",
+                                x: [], y: [],
+                                marker: {
+                                    color: name === "Transparent" ? "rgba(0, 0, 0, 0)" : (payload.company_colors[name] || "#000000"),
+                                    pattern: {shape: ""},
+                                    line: {width: 0}
+                                },
+                                hovertemplate: "Range_Display=" + name + "<br>Value=%{x}<br>" + (payload.football_by_label ? "Label" : "company_name") + "=%{y}<extra></extra>"
+                            };
+                            traces.push(byName[name]);
+                        }
+                        byName[name].x.push(range[1]);
+                        byName[name].y.push(payload.football_by_label ? range[2] : company);
+                    });
+                });
+                return {
+                    data: traces,
+                    layout: {
+                        template: payload.template,
+                        xaxis: {title: {text: "Business Valuation ($ in millions)"}, range: [0, 8000]},
+                        yaxis: {title: {text: "Company"}},
+                        legend: {
+                            title: {text: "Company"}, tracegroupgap: 0, traceorder: "normal",
+                            itemsizing: "constant", bgcolor: "rgba(255, 255, 255, 0)"
+                        },
+                        title: {text: "Enterprise Value Range"},
+                        barmode: "relative",
+                        showlegend: true,
+                        height: 400,
+                        plot_bgcolor: "#f5f5f5"
+                    }
+                };
+            }
+        }
+    });
+})();
@@ -0,0 +1,79 @@
+# %%
+# Background execution of the page callbacks (BACKGROUND_CALLBACKS=1).
+# With larger data a figure build can take long enough to tie up a gunicorn
+# worker thread. In this mode the page callbacks are Dash background
+# callbacks: the request only starts a job in a forked process and returns,
+# the browser polls for the result, and results go through a diskcache
+# directory shared by all workers on the box (no broker).
+#   - results are cached by the callback inputs plus the data version, so a
+#     repeated interaction is answered from disk at its first poll (Dash
+#     still forks a job for it, which is killed once the result is read)
+#   - a newer interaction with the same callback (e.g. dragging the year
+#     slider) kills the job it replaces instead of queueing behind it, and
+#     leaving the page kills the running one
+#   - the figure functions report how far they are with progress(), shown
+#     in a progress bar under the page's controls while a job runs
+# Needs `pip install "dash[diskcache]"` (diskcache, multiprocess, psutil).
+# Figures memoized inside a job are lost with its process; set
+# FIGURE_CACHE_PATH so the jobs share their figures through the file.
+import functools
+import threading
+
+from dash import Input, Output, html
+
+_local = threading.local()
+
+HIDDEN = {'display': 'none'}
+SHOWN = {'display': 'block', 'width': '100%'}
+
+
+def manager(cache_dir, expire, version_fn):
+    # DiskcacheManager storing the job results in cache_dir for `expire` seconds
+    try:
+        import diskcache
+        from dash import DiskcacheManager
+    except ImportError:
+        raise RuntimeError('BACKGROUND_CALLBACKS needs `pip install "dash[diskcache]"`') from None
+    return DiskcacheManager(diskcache.Cache(cache_dir), cache_by=[version_fn], expire=expire)
+
+
+def progress_id(graph_id):
+    return f'{graph_id}-progress'
+
+
+def progress_bar(graph_id):
+    # Progress of the job drawing `graph_id` and the graphs that share its callback
+    return html.Progress(id=progress_id(graph_id), value='0', max='1', style=HIDDEN)
+
+
+def options(graph_id, manager, interval):
+    # Keyword arguments that make app.callback register a background callback
+    bar = progress_id(graph_id)
+    return {
+        'background': True,
+        'manager': manager,
+        'interval': interval,
+        'running': [(Output(bar, 'style'), SHOWN, HIDDEN)],
+        'progress': [Output(bar, 'value'), Output(bar, 'max')],
+        'progress_default': ['0', '1'],
+        'cancel': [Input('url', 'pathname')],
+    }
+
+
+def reporting(func):
+    # func as a background job: Dash passes set_progress before the callback arguments
+    @functools.wraps(func)
+    def job(set_progress, *args):
+        _local.report = set_progress
+        try:
+            return func(*args)
+        finally:
+            _local.report = None
+    return job
+
+
+def progress(done, total):
+    # Called by the figure functions; does nothing outside a background job
+    report = getattr(_local, 'report', None)
+    if report is not None:
+        report((str(done), str(total)))
@@ -0,0 +1,242 @@
+# %%
+# Callback latency benchmark: every Dash callback, headless, at 1x/10x/100x data.
+# For each scale a copy of the database is made with every airline (and all
+# of its rows) repeated `scale` times under new names, and a fresh process
+# imports the app against it with the figure cache disabled. Each callback is
+# then timed over the input grid twice:
+#   direct   calling the callback function (pure Python + pandas + plotly)
+#   http     POST /_dash-update-component through the Flask test client
+#            (adds Dash's request handling and JSON serialization)
+# p50/p95/p99 latency and response bytes are printed and, with --output,
+# written as JSON; --baseline prints the p50 change against an earlier run.
+#
+#   python benchmarks/bench_callbacks.py [--scales 1 10 100] [--repeat 3] [--output out.json]
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config  # noqa: E402
+
+# Tables holding one row set per company; the copies get company_id + k * offset
+COMPANY_TABLES = ['IncomeStatement', 'Multiple', 'KeyRatios', 'key_financial']
+
+
+def scaled_copy(source, target, scale):
+    # Copy `source` with every airline repeated `scale` times ("Delta", "Delta 2", ...)
+    shutil.copyfile(source, target)
+    conn = sqlite3.connect(target)
+    try:
+        offset = conn.execute("SELECT MAX(company_id) FROM Airline").fetchone()[0] + 1
+        for k in range(1, scale):
+            conn.execute("INSERT INTO Airline (company_id, company_name) "
+                         "SELECT company_id + ?, company_name || ' ' || ? FROM Airline WHERE company_id < ?",
+                         (k * offset, k + 1, offset))
+            for table in COMPANY_TABLES:
+                columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+                select = ', '.join(
+                    'company_id + :shift' if column == 'company_id'
+                    else "company_name || ' ' || :suffix" if column == 'company_name'
+                    else f'"{column}"'
+                    for column in columns
+                )
+                names = ', '.join(f'"{column}"' for column in columns)
+                conn.execute(f"INSERT INTO {table} ({names}) SELECT {select} FROM {table} WHERE company_id < :offset",
+                             {'shift': k * offset, 'suffix': str(k + 1), 'offset': offset})
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# %%
+# Callback id -> (outputs, inputs, state) as registered in app.py
+CALLBACKS = {
+    'render_page_content': ([('page-content', 'children')], [('url', 'pathname')], []),
+    'update_overview': ([('sankey-diagram', 'figure'), ('line-graph', 'figure')],
+                        [('company-filter', 'value'), ('year-filter', 'value'), ('multiple-filter', 'value')],
+                        [('line-graph-width', 'data')]),
+    'update_comparison': ([('radar-chart', 'figure'), ('bar-chart', 'figure')],
+                          [('company-checklist', 'value'), ('year-slider', 'value')], []),
+}
+
+
+def input_grid(app, max_cases, seed=0):
+    # Argument tuples per callback, covering what the controls can send
+    data = app.current_data()
+    companies = data.distinct('sankey', 'company_name')
+    years = data.distinct('sankey', 'year')
+    types = data.distinct('line', 'multiple_type')
+    radar_companies = data.distinct('radar', 'company_name')
+    football_years = data.distinct('football', 'fin_year')
+    rng = random.Random(seed)
+
+    def sample(cases):
+        cases = list(cases)
+        return cases if len(cases) <= max_cases else rng.sample(cases, max_cases)
+
+    # Checklist selections: one, a few, and every airline
+    selections = [rng.sample(radar_companies, k) for k in (1, min(3, len(radar_companies)))] + [radar_companies]
+    return {
+        'render_page_content': [('/',), ('/page-1',), ('/missing',)],
+        'update_overview': sample((c, y, t, 1200) for c, y, t in itertools.product(companies, years, types)),
+        'update_comparison': sample(itertools.product(selections, football_years)),
+    }
+
+
+def update_request(name, args, changed=0):
+    # Body of the POST /_dash-update-component request for one callback call,
+    # as if input number `changed` had just changed
+    outputs, inputs, state = CALLBACKS[name]
+    values = list(args)
+
+    def props(specs):
+        return [{'id': cid, 'property': prop, 'value': values.pop(0)} for cid, prop in specs]
+
+    inputs, state = props(inputs), props(state)
+    if len(outputs) == 1:
+        output = '{}.{}'.format(*outputs[0])
+        output_specs = {'id': outputs[0][0], 'property': outputs[0][1]}
+    else:
+        # Dash's multi-output id: "..a.figure...b.figure.."
+        output = '..' + '...'.join(f'{cid}.{prop}' for cid, prop in outputs) + '..'
+        output_specs = [{'id': cid, 'property': prop} for cid, prop in outputs]
+    return {
+        'output': output,
+        'outputs': output_specs,
+        'inputs': inputs,
+        'state': state,
+        'changedPropIds': [f"{inputs[changed]['id']}.{inputs[changed]['property']}"],
+    }
+
+
+def summarize(latencies, sizes):
+    latencies = np.array(latencies) * 1000
+    return {
+        'calls': len(latencies),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'mean_bytes': float(np.mean(sizes)),
+        'max_bytes': int(np.max(sizes)),
+    }
+
+
+def run_worker(repeat, max_cases):
+    # Runs inside the child process (AIRLINE_DB_PATH points at the scaled copy)
+    from plotly.io.json import to_json_plotly
+    import app
+
+    started = time.perf_counter()
+    app.current_data().preload()
+    load_s = time.perf_counter() - started
+    grid = input_grid(app, max_cases)
+    client = app.server.test_client()
+    client.get('/')  # lets Dash finish its setup before the first update request
+
+    results = {}
+    for name, cases in grid.items():
+        callback = getattr(app, name)
+        callback(*cases[0])  # untimed: builds the slice indexes on first use
+        direct, direct_sizes, http, http_sizes = [], [], [], []
+        for args in cases:
+            body = update_request(name, args)
+            for _ in range(repeat):
+                t = time.perf_counter()
+                output = callback(*args)
+                direct.append(time.perf_counter() - t)
+                direct_sizes.append(len(to_json_plotly(output)))
+
+                t = time.perf_counter()
+                response = client.post('/_dash-update-component', json=body)
+                http.append(time.perf_counter() - t)
+                if response.status_code not in (200, 204):
+                    raise RuntimeError(f"{name}{args}: HTTP {response.status_code}")
+                http_sizes.append(len(response.data))
+        results[name] = {
+            'cases': len(cases),
+            'direct': summarize(direct, direct_sizes),
+            'http': summarize(http, http_sizes),
+        }
+    data = app.current_data()
+    rows = {name: len(data.frame(name)) for name in ('sankey', 'line', 'radar', 'football')}
+    return {'load_s': load_s, 'rows': rows, 'callbacks': results}
+
+
+# %%
+def run_scale(db_path, scale, repeat, max_cases, workdir):
+    if scale > 1:
+        target = os.path.join(workdir, f'airline_x{scale}.db')
+        scaled_copy(db_path, target, scale)
+        db_path = target
+    env = dict(os.environ, AIRLINE_DB_PATH=db_path, FIGURE_CACHE_SIZE='0', FIGURE_CACHE_PATH='',
+               CLIENTSIDE_RENDERING='0', COMPACT_FIGURES='0', HOT_RELOAD='0')
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', '--repeat', str(repeat), '--max-cases', str(max_cases)],
+        env=env, capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def print_report(results, baseline=None):
+    print(f"{'scale':>5} {'callback':<20} {'mode':<6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'bytes':>9}"
+          + (f" {'p50 vs base':>12}" if baseline else ''))
+    for scale, result in results['scales'].items():
+        for name, modes in result['callbacks'].items():
+            for mode in ('direct', 'http'):
+                s = modes[mode]
+                line = (f"{scale + 'x':>5} {name:<20} {mode:<6} {s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} "
+                        f"{s['p99_ms']:>8.2f} {s['mean_bytes']:>9.0f}")
+                try:
+                    before = baseline['scales'][scale]['callbacks'][name][mode]['p50_ms']
+                    line += f" {s['p50_ms'] / before - 1:>+11.0%}"
+                except (TypeError, KeyError, ZeroDivisionError):
+                    pass
+                print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency and response size of every Dash callback at scaled data sizes')
+    parser.add_argument('--db', default=config.DB_PATH)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=3, help='calls per input combination')
+    parser.add_argument('--max-cases', type=int, default=50, help='input combinations sampled per callback')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare against')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.repeat, args.max_cases)))
+        return
+
+    results = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'repeat': args.repeat, 'scales': {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in args.scales:
+            results['scales'][str(scale)] = run_scale(args.db, scale, args.repeat, args.max_cases, workdir)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# %%
+# Benchmark: update_graphs payload size and latency vs. raw series length,
+# without downsampling and with the 'lttb' and 'minmax' modes.
+# A synthetic daily series (random walk with spikes) replaces the Multiple
+# data of one company/year/type; the graph is assumed to be 1200px wide.
+#
+#   python benchmarks/bench_downsample.py
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+import config  # noqa: E402
+from data_store import DashboardData  # noqa: E402
+
+LENGTHS = [250, 2_500, 25_000, 250_000]
+GRAPH_WIDTH = 1200
+REPEAT = 5
+
+
+def synthetic_line(n, company='Spirit', multiple_type='EBITDA', year=2023):
+    rng = np.random.default_rng(0)
+    values = 5 + np.cumsum(rng.normal(0, 0.05, n))
+    values[rng.integers(0, n, max(1, n // 1000))] += rng.normal(0, 5, max(1, n // 1000))
+    # Intraday-like timestamps so every point falls into the same year
+    dates = pd.date_range(f'{year}-01-01', f'{year}-12-31', periods=n)
+    return pd.DataFrame({
+        'multiple_id': np.arange(n), 'company_id': 1, 'multiple_type': multiple_type,
+        'date': dates, 'multiple_value': values,
+        'Q1': np.quantile(values, 0.25), 'Q3': np.quantile(values, 0.75), 'average': values.mean(),
+        'company_name': company, 'year': dates.year,
+    })
+
+
+def main():
+    real = app.current_data()
+    print(f"{'points':>8} {'mode':>7} {'sent':>6} {'payload (KB)':>13} {'latency (ms)':>13}")
+    for n in LENGTHS:
+        line = synthetic_line(n)
+        app.snapshots.swap(DashboardData(real.sankey, line, real.radar, real.football), f'bench-{n}')
+        for mode in ('none', 'lttb', 'minmax'):
+            config.LINE_DOWNSAMPLE = mode
+            timings = []
+            for _ in range(REPEAT):
+                app.figure_cache.clear()
+                started = time.perf_counter()
+                figure = app.update_graphs('Spirit', 2023, 'EBITDA', GRAPH_WIDTH)
+                payload = figure.to_json()
+                timings.append(time.perf_counter() - started)
+            sent = len(figure.data[0].y)
+            print(f"{n:>8} {mode:>7} {sent:>6} {len(payload) / 1024:>13.1f} {np.median(timings) * 1e3:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
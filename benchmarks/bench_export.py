@@ -0,0 +1,104 @@
+# %%
+# Export benchmark: throughput and memory of GET /export/<dataset>.<format>
+# (export.py) on a scaled copy of the database (bench_callbacks.scaled_copy).
+# Each backend / format / mode runs in a fresh process that loads the data,
+# then exports the whole dataset through the Flask test client:
+#   stream   the response generator, consumed chunk by chunk
+#   whole    the same rows materialized first (one frame, one encode), as a
+#            non-streaming route would
+# The RSS of the process is sampled every few ms during the export; the peak
+# rise above the RSS before it is printed (Linux, /proc/self/statm).
+#
+#   python benchmarks/bench_export.py [--scale 100] [--dataset line]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config  # noqa: E402
+from bench_callbacks import scaled_copy  # noqa: E402
+
+CHILD = r"""
+import json, os, sys, threading, time
+sys.path.insert(0, {root!r})
+import app
+import export
+import schema
+
+PAGE = os.sysconf('SC_PAGE_SIZE')
+
+
+def rss():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * PAGE
+
+
+class Sampler(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.start_rss = self.peak = rss()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.peak = max(self.peak, rss())
+            time.sleep(0.002)
+
+
+name, fmt, mode = {dataset!r}, {fmt!r}, {mode!r}
+data = app.current_data()
+data.preload()
+client = app.server.test_client()
+sampler = Sampler()
+sampler.start()
+started = time.perf_counter()
+size = 0
+if mode == 'stream':
+    response = client.get(f'/export/{{name}}.{{fmt}}', buffered=False)
+    for chunk in response.response:
+        size += len(chunk)
+    response.close()
+else:
+    columns = list(schema.SCHEMAS[name])
+    frames = [export.pd.concat(list(data.iter_rows(name, {{}}, 10 ** 9)), ignore_index=True)]
+    chunks = export.arrow_chunks(name, columns, frames) if fmt == 'arrow' else export.csv_chunks(columns, frames)
+    size = len(b''.join(chunks))
+seconds = time.perf_counter() - started
+sampler.running = False
+sampler.join()
+print(json.dumps(dict(bytes=size, seconds=seconds, peak_rise=sampler.peak - sampler.start_rss)))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export throughput and peak RSS, streamed vs. materialized')
+    parser.add_argument('--scale', type=int, default=100)
+    parser.add_argument('--dataset', default='line')
+    parser.add_argument('--db', default=config.DB_PATH)
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'format':<6} {'mode':<7} {'MB':>8} {'MB/s':>8} {'peak RSS rise MB':>17}")
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, f'x{args.scale}.db')
+        scaled_copy(args.db, path, args.scale)
+        for backend in ('memory', 'sql'):
+            for fmt in ('csv', 'arrow'):
+                for mode in ('stream', 'whole'):
+                    child = CHILD.format(root=ROOT, dataset=args.dataset, fmt=fmt, mode=mode)
+                    env = {**os.environ, 'AIRLINE_DB_PATH': path, 'DATA_BACKEND': backend, 'HOT_RELOAD': '0'}
+                    output = subprocess.run([sys.executable, '-c', child], env=env,
+                                            capture_output=True, text=True, check=True).stdout
+                    result = json.loads(output.strip().splitlines()[-1])
+                    megabytes = result['bytes'] / 1e6
+                    print(f"{backend:<8} {fmt:<6} {mode:<7} {megabytes:>8.1f} {megabytes / result['seconds']:>8.1f} "
+                          f"{result['peak_rise'] / 1e6:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# %%
+# Repeat-interaction benchmark for the HTTP caching of callback responses
+# (HTTP_CACHE, see http_cache.py).
+# Each mode runs in a fresh process, since HTTP_CACHE is read when the app is
+# imported. The update_overview and update_comparison requests of the input
+# grid (bench_callbacks.input_grid) are sent through the Flask test client:
+#   cold     first time each request is seen
+#   repeat   the same request again (with HTTP_CACHE: the stored response)
+#   304      the same request with If-None-Match set to the ETag it got
+# The figure cache stays on (FIGURE_CACHE_SIZE, default 256), so without
+# HTTP_CACHE a repeat is already a figure cache hit and the difference is what
+# the response store saves on top of it; --figure-cache-size 0 compares
+# against rebuilding the figures.
+#
+#   python benchmarks/bench_http_cache.py [--cases 40] [--repeat 5] [--figure-cache-size 256]
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'off': {'HTTP_CACHE': '0'},
+    'on': {'HTTP_CACHE': '1'},
+}
+
+CHILD = r"""
+import json, sys, time
+import numpy as np
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {benchmarks!r})
+import app
+from bench_callbacks import input_grid, update_request
+
+client = app.server.test_client()
+client.get('/')
+grid = input_grid(app, {cases})
+results = {{}}
+for name in ('update_overview', 'update_comparison'):
+    times = {{'cold': [], 'repeat': [], '304': []}}
+    for args in grid[name]:
+        body = update_request(name, args)
+        started = time.perf_counter()
+        response = client.post('/_dash-update-component', json=body)
+        times['cold'].append(time.perf_counter() - started)
+        etag = response.headers.get('ETag')
+        for _ in range({repeat}):
+            started = time.perf_counter()
+            client.post('/_dash-update-component', json=body)
+            times['repeat'].append(time.perf_counter() - started)
+            if etag:
+                started = time.perf_counter()
+                response = client.post('/_dash-update-component', json=body, headers={{'If-None-Match': etag}})
+                times['304'].append(time.perf_counter() - started)
+                assert response.status_code == 304
+    results[name] = {{kind: float(np.median(values) * 1000) if values else None for kind, values in times.items()}}
+print(json.dumps(results))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Callback latency of repeated interactions with and without HTTP_CACHE')
+    parser.add_argument('--cases', type=int, default=40, help='max input combinations per callback')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--figure-cache-size', type=int, default=256)
+    args = parser.parse_args()
+
+    child = CHILD.format(root=ROOT, benchmarks=os.path.dirname(os.path.abspath(__file__)),
+                         cases=args.cases, repeat=args.repeat)
+    results = {}
+    for mode, env in MODES.items():
+        env = {**os.environ, 'FIGURE_CACHE_SIZE': str(args.figure_cache_size), **env}
+        output = subprocess.run([sys.executable, '-c', child], env=env,
+                                capture_output=True, text=True, check=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'callback':<18} {'mode':<4} {'cold ms':>8} {'repeat ms':>10} {'304 ms':>7}")
+    for name in results['off']:
+        for mode in MODES:
+            timings = results[mode][name]
+            not_modified = f"{timings['304']:>7.2f}" if timings['304'] is not None else f"{'-':>7}"
+            print(f"{name:<18} {mode:<4} {timings['cold']:>8.2f} {timings['repeat']:>10.2f} {not_modified}")
+        print(f"{'':<18} repeat speedup with HTTP_CACHE: "
+              f"{results['off'][name]['repeat'] / results['on'][name]['repeat']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
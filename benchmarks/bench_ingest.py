@@ -0,0 +1,108 @@
+# %%
+# Ingest benchmark: appending a day of multiples incrementally vs. rebuilding
+# the Q1/Q3/average columns of the whole Multiple table.
+# A synthetic database (generate_db.py) gets one new business day for every
+# (airline, multiple type) series, `--days` times:
+#   rebuild       append the rows, then recompute the bands of every row from
+#                 the full history with pandas and write them all back
+#   ingest        ingest.py: streaming state per series, batched inserts
+# The first ingest also builds the state of every series from its history
+# (reported separately), later days only touch the new rows.
+#
+#   python benchmarks/bench_ingest.py [--airlines 100] [--years 7] [--days 5] [--bands std]
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ingest  # noqa: E402
+from generate_db import generate  # noqa: E402
+
+
+def next_day(path, rng):
+    # One observation per series, the business day after its last one
+    conn = sqlite3.connect(path)
+    try:
+        last = pd.read_sql_query("SELECT company_id, multiple_type, MAX(date) AS date, multiple_value "
+                                 "FROM Multiple GROUP BY company_id, multiple_type", conn)
+    finally:
+        conn.close()
+    last['date'] = (pd.to_datetime(last['date']) + pd.offsets.BDay()).dt.strftime('%Y-%m-%d')
+    last['multiple_value'] = (last['multiple_value'] * np.exp(rng.normal(0, 0.02, len(last)))).round(3)
+    return last
+
+
+def rebuild(path, rows, bands):
+    # Append, then recompute every row's bands over its whole series
+    conn = sqlite3.connect(path)
+    try:
+        next_id = conn.execute("SELECT COALESCE(MAX(multiple_id), 0) + 1 FROM Multiple").fetchone()[0]
+        conn.executemany("INSERT INTO Multiple (multiple_id, company_id, multiple_type, date, multiple_value) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         [(next_id + i, int(c), t, d, float(v)) for i, (c, t, d, v) in
+                          enumerate(rows[['company_id', 'multiple_type', 'date', 'multiple_value']].itertuples(index=False))])
+        frame = pd.read_sql_query("SELECT rowid, company_id, multiple_type, multiple_value FROM Multiple", conn)
+        values = frame.groupby(['company_id', 'multiple_type'])['multiple_value']
+        average = values.transform('mean')
+        if bands == 'std':
+            std = values.transform(lambda series: series.std(ddof=0))
+            q1, q3 = average - std, average + std
+        else:
+            q1, q3 = values.transform(lambda s: s.quantile(0.25)), values.transform(lambda s: s.quantile(0.75))
+        conn.executemany("UPDATE Multiple SET Q1 = ?, Q3 = ?, average = ? WHERE rowid = ?",
+                         zip(q1.round(3).tolist(), q3.round(3).tolist(), average.round(3).tolist(), frame['rowid'].tolist()))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental ingest vs. full recomputation of the multiple bands')
+    parser.add_argument('--airlines', type=int, default=100)
+    parser.add_argument('--years', type=int, default=7)
+    parser.add_argument('--days', type=int, default=5)
+    parser.add_argument('--bands', choices=ingest.BANDS, default='std')
+    parser.add_argument('--window', type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(workdir, 'source.db')
+        counts = generate(source, args.airlines, args.years, bands=args.bands)
+        print(f"{counts['Multiple']} Multiple rows, {args.airlines} airlines, {args.days} days\n")
+        timings = {}
+        for mode in ('rebuild', 'ingest'):
+            path = os.path.join(workdir, f'{mode}.db')
+            shutil.copy(source, path)
+            rng = np.random.default_rng(0)
+            for day in range(args.days):
+                rows = next_day(path, rng)
+                started = time.perf_counter()
+                if mode == 'rebuild':
+                    rebuild(path, rows, args.bands)
+                else:
+                    report = ingest.ingest(path, rows, args.bands, args.window)
+                label = f'{mode} (build state)' if mode == 'ingest' and day == 0 else mode
+                timings.setdefault(label, []).append(time.perf_counter() - started)
+            if mode == 'ingest':
+                print(f"last ingest: {report['inserted']} rows, {report['changed_slices']} changed slices\n")
+
+        print(f"{'mode':<22} {'days':>5} {'ms per day':>11}")
+        for label, seconds in timings.items():
+            print(f"{label:<22} {len(seconds):>5} {np.median(seconds) * 1000:>11.1f}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# %%
+# Navigation benchmark: page layouts built on every navigation vs. cached per
+# data version (app.layout_cache).
+# Each rendering mode runs in a fresh process, since the modes are read from
+# the environment when the app is imported. The render_page_content request
+# of every page is replayed through the Flask test client; the latency covers
+# the callback and Dash's serialization, the size is the JSON response body.
+#
+#   python benchmarks/bench_layout.py [--repeat 50]
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'server': {},
+    'compact': {'COMPACT_FIGURES': '1'},
+    'clientside': {'CLIENTSIDE_RENDERING': '1'},
+}
+
+CHILD = r"""
+import json, sys, time
+import numpy as np
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {benchmarks!r})
+import app
+from bench_callbacks import update_request
+
+client = app.server.test_client()
+client.get('/')
+results = []
+for cached in (False, True):
+    app.layout_cache.max_entries = len(app.PAGES) if cached else 0
+    for path in app.PAGES:
+        body = update_request('render_page_content', (path,))
+        times = []
+        for _ in range({repeat}):
+            started = time.perf_counter()
+            response = client.post('/_dash-update-component', json=body)
+            times.append(time.perf_counter() - started)
+        results.append(dict(path=path, cached=cached, ms=float(np.median(times) * 1000), bytes=len(response.data)))
+print(json.dumps(results))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Navigation latency and layout size, built per request vs. cached')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    child = CHILD.format(root=ROOT, benchmarks=os.path.dirname(os.path.abspath(__file__)), repeat=args.repeat)
+    print(f"{'mode':<11} {'page':<8} {'bytes':>8} {'built ms':>9} {'cached ms':>10} {'speedup':>8}")
+    for mode, env in MODES.items():
+        output = subprocess.run([sys.executable, '-c', child], env={**os.environ, 'FIGURE_CACHE_SIZE': '0', **env},
+                                capture_output=True, text=True, check=True).stdout
+        results = json.loads(output.strip().splitlines()[-1])
+        for path in dict.fromkeys(result['path'] for result in results):
+            built, cached = (next(r for r in results if r['path'] == path and r['cached'] == flag) for flag in (False, True))
+            print(f"{mode:<11} {path:<8} {cached['bytes']:>8} {built['ms']:>9.2f} {cached['ms']:>10.2f} "
+                  f"{built['ms'] / cached['ms']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
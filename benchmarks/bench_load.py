@@ -0,0 +1,291 @@
+# %%
+# Load test: concurrent dashboard users against a local `gunicorn app:server`.
+# For each worker configuration a gunicorn is started on a free localhost
+# port (nothing leaves the machine) and simulated users replay sessions like
+# a browser would:
+#   open the app (GET /, /_dash-layout, /_dash-dependencies), navigate to the
+#   Overview page (render_page_content) and draw it (update_overview), drag
+#   the year slider and switch airline / multiple type in bursts, then go to
+#   the Comparison page and toggle the checklist and year slider
+# with a random think time between interactions (--think-ms, shorter within
+# a burst). The number of users is ramped up (--users); at every step the
+# throughput, p50/p95/p99 latency and error rate are reported per callback,
+# and at the end the configurations are compared by the most users each
+# served with p95 under --slo-ms and no errors.
+# Configurations are kind:workers[xthreads], e.g. sync:3 gthread:3x8
+# gevent:3x100 (gevent needs `pip install gevent`, skipped otherwise).
+# The users are threads of this process, so on a small box they compete with
+# the server for CPU; compare configurations on the same box only.
+#
+#   python benchmarks/bench_load.py [--configs sync:3 gthread:3x8] [--users 1 4 16 64] [--duration 20]
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config  # noqa: E402
+from bench_callbacks import update_request  # noqa: E402
+from sql_backend import DISTINCT_QUERIES  # noqa: E402
+
+UPDATE_PATH = '/_dash-update-component'
+
+
+def control_values(db_path):
+    # What the page controls offer (same queries as the sql backend's distinct())
+    conn = sqlite3.connect(db_path)
+    try:
+        values = {key: [row[0] for row in conn.execute(query)] for key, query in DISTINCT_QUERIES.items()}
+    finally:
+        conn.close()
+    return {
+        'companies': values['sankey', 'company_name'],
+        'years': list(range(min(values['sankey', 'year']), max(values['sankey', 'year']) + 1)),
+        'types': values['line', 'multiple_type'],
+        'radar_companies': values['radar', 'company_name'],
+        'football_years': list(range(min(values['football', 'fin_year']), max(values['football', 'fin_year']) + 1)),
+    }
+
+
+def session(values, rng, burst):
+    # One user's visit: (label, method, path, body) requests, each followed by
+    # a think time ('think') or a short pause within a burst ('burst')
+    company, multiple_type = rng.choice(values['companies']), values['types'][0]
+    year = values['years'][-1]
+    yield 'page', 'GET', '/', None, 'burst'
+    yield 'layout', 'GET', '/_dash-layout', None, 'burst'
+    yield 'dependencies', 'GET', '/_dash-dependencies', None, 'burst'
+    yield 'render_page_content', 'POST', UPDATE_PATH, update_request('render_page_content', ('/',)), 'burst'
+    yield 'update_overview', 'POST', UPDATE_PATH, update_request('update_overview', (company, year, multiple_type, 1200)), 'think'
+    for _ in range(rng.randint(1, 3)):
+        # A slider drag fires for every year passed, then a new airline or type
+        for year in rng.sample(values['years'], min(burst, len(values['years']))):
+            yield 'update_overview', 'POST', UPDATE_PATH, update_request('update_overview', (company, year, multiple_type, 1200), 1), 'burst'
+        if rng.random() < 0.5:
+            company = rng.choice(values['companies'])
+            yield 'update_overview', 'POST', UPDATE_PATH, update_request('update_overview', (company, year, multiple_type, 1200), 0), 'think'
+        else:
+            multiple_type = rng.choice(values['types'])
+            yield 'update_overview', 'POST', UPDATE_PATH, update_request('update_overview', (company, year, multiple_type, 1200), 2), 'think'
+
+    selected, year = list(values['radar_companies']), values['football_years'][-1]
+    yield 'render_page_content', 'POST', UPDATE_PATH, update_request('render_page_content', ('/page-1',)), 'burst'
+    yield 'update_comparison', 'POST', UPDATE_PATH, update_request('update_comparison', (selected, year)), 'think'
+    for _ in range(rng.randint(1, 3)):
+        for year in rng.sample(values['football_years'], min(burst, len(values['football_years']))):
+            yield 'update_comparison', 'POST', UPDATE_PATH, update_request('update_comparison', (selected, year), 1), 'burst'
+        toggled = rng.choice(values['radar_companies'])
+        selected = [c for c in values['radar_companies'] if (c in selected) != (c == toggled)]
+        yield 'update_comparison', 'POST', UPDATE_PATH, update_request('update_comparison', (selected, year), 0), 'think'
+
+
+# %%
+class User(threading.Thread):
+    # Replays sessions until `stop` is set; records (label, seconds, ok)
+    def __init__(self, port, values, seed, stop, think_ms, burst):
+        super().__init__(daemon=True)
+        self.port, self.values, self.stop = port, values, stop
+        self.rng = random.Random(seed)
+        self.think_ms, self.burst = think_ms, burst
+        self.records = []
+        self.conn = None
+
+    def request(self, method, path, body):
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        # A kept-alive connection the server closed while the user was idle is
+        # retried once on a new one, as a browser does; that is not an error
+        for attempt in range(2):
+            reused = self.conn is not None
+            if not reused:
+                self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=payload, headers=headers)
+                response = self.conn.getresponse()
+                response.read()
+                return response.status in (200, 204)
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                self.conn = None
+                if not reused:
+                    return False
+        return False
+
+    def pause(self, kind):
+        mean = self.think_ms if kind == 'think' else self.think_ms / 20
+        self.stop.wait(self.rng.expovariate(1000 / mean) if mean > 0 else 0)
+
+    def run(self):
+        while not self.stop.is_set():
+            for label, method, path, body, pause in session(self.values, self.rng, self.burst):
+                if self.stop.is_set():
+                    break
+                started = time.perf_counter()
+                ok = self.request(method, path, body)
+                self.records.append((label, time.perf_counter() - started, ok))
+                self.pause(pause)
+        if self.conn is not None:
+            self.conn.close()
+
+
+def run_step(port, values, users, duration, think_ms, burst, seed):
+    stop = threading.Event()
+    threads = [User(port, values, seed * 1000 + n, stop, think_ms, burst) for n in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    by_label = {}
+    for thread in threads:
+        for label, seconds, ok in thread.records:
+            entry = by_label.setdefault(label, ([], [0]))
+            entry[0].append(seconds)
+            entry[1][0] += not ok
+    result = {}
+    for label, (latencies, errors) in sorted(by_label.items()):
+        latencies = np.array(latencies) * 1000
+        result[label] = {
+            'requests': len(latencies),
+            'rps': len(latencies) / elapsed,
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'error_rate': errors[0] / len(latencies),
+        }
+    return result
+
+
+# %%
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def gunicorn_command(spec, port):
+    # 'sync:3', 'gthread:3x8', 'gevent:3x100' -> gunicorn arguments
+    kind, _, size = spec.partition(':')
+    workers, _, threads = (size or '1').partition('x')
+    command = [sys.executable, '-m', 'gunicorn', '-k', kind, '-w', workers, '-b', f'127.0.0.1:{port}',
+               '--timeout', '120', '--log-level', 'warning']
+    if kind == 'gthread':
+        command += ['--threads', threads or '8']
+    elif kind == 'gevent':
+        command += ['--worker-connections', threads or '100']
+    elif threads:
+        raise ValueError(f"{spec}: only gthread and gevent take a thread/connection count")
+    return command + ['app:server']
+
+
+def wait_ready(server, port, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {server.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/_dash-layout')
+            ready = conn.getresponse().status == 200
+            conn.close()
+            if ready:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("gunicorn did not come up")
+
+
+def run_config(spec, values, args, log):
+    port = free_port()
+    server = subprocess.Popen(gunicorn_command(spec, port), cwd=ROOT, stdout=log, stderr=log)
+    try:
+        wait_ready(server, port)
+        # One untimed pass so the workers have read the data before the ramp
+        run_step(port, values, 2, 2.0, args.think_ms, args.burst, seed=0)
+        steps = {}
+        for users in args.users:
+            steps[users] = run_step(port, values, users, args.duration, args.think_ms, args.burst, seed=users)
+            print_step(spec, users, steps[users])
+        return steps
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def print_step(spec, users, result):
+    total = sum(entry['requests'] for entry in result.values())
+    errors = sum(entry['requests'] * entry['error_rate'] for entry in result.values())
+    print(f"{spec:<14} {users:>5} users  {sum(entry['rps'] for entry in result.values()):>7.1f} req/s  "
+          f"errors {errors / max(total, 1):.1%}")
+    for label, entry in result.items():
+        print(f"{'':<14} {label:<20} {entry['rps']:>7.1f} req/s  p50 {entry['p50_ms']:>7.1f}  "
+              f"p95 {entry['p95_ms']:>7.1f}  p99 {entry['p99_ms']:>7.1f} ms  errors {entry['error_rate']:.1%}")
+
+
+def capacity(steps, slo_ms):
+    # Most users served with every callback's p95 under the SLO and no errors
+    best = 0
+    for users, result in steps.items():
+        callbacks = [entry for label, entry in result.items() if label.startswith(('update_', 'render_'))]
+        if callbacks and all(entry['p95_ms'] <= slo_ms and entry['error_rate'] == 0 for entry in callbacks):
+            best = max(best, users)
+    return best
+
+
+def main():
+    workers = 2 * (os.cpu_count() or 1) + 1
+    parser = argparse.ArgumentParser(description='Concurrent dashboard sessions against local gunicorn configurations')
+    parser.add_argument('--configs', nargs='+', default=[f'sync:{workers}', f'gthread:{workers}x8', f'gevent:{workers}x100'])
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 4, 16, 64], help='concurrent users per step')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per step')
+    parser.add_argument('--think-ms', type=float, default=1000, help='mean pause between interactions')
+    parser.add_argument('--burst', type=int, default=4, help='callbacks per slider drag')
+    parser.add_argument('--slo-ms', type=float, default=500, help='p95 latency target for the comparison')
+    parser.add_argument('--db', default=config.DB_PATH)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    values = control_values(args.db)
+    results = {}
+    with tempfile.TemporaryFile('w+') as log:
+        for spec in args.configs:
+            kind = spec.partition(':')[0]
+            if kind == 'gevent' and importlib.util.find_spec('gevent') is None:
+                print(f"{spec}: skipped, gevent is not installed")
+                continue
+            try:
+                results[spec] = run_config(spec, values, args, log)
+            except RuntimeError as error:
+                log.seek(0)
+                print(f"{spec}: {error}\n{log.read()[-2000:]}")
+
+    print(f"\nUsers served with callback p95 <= {args.slo_ms:.0f} ms and no errors:")
+    for spec, steps in results.items():
+        peak = max(steps.values(), key=lambda result: sum(entry['rps'] for entry in result.values()))
+        print(f"  {spec:<14} {capacity(steps, args.slo_ms):>5} users   peak {sum(e['rps'] for e in peak.values()):.1f} req/s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# %%
+# Memory of the four datasets: typed columns (schema.py) vs. the types the
+# loader produced before - text as str columns, every integer as int64 and the
+# radar metrics as object columns. Measured with memory_usage(deep=True) on
+# the real database and on copies with every airline repeated --scales times
+# (see bench_callbacks.scaled_copy).
+#
+#   python benchmarks/bench_memory.py [--scales 1 100]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config  # noqa: E402
+import data_loader  # noqa: E402
+import schema  # noqa: E402
+from bench_callbacks import scaled_copy  # noqa: E402
+
+
+def untyped(name, frame):
+    # The frame with the column types of the loader before schema.py
+    types = {}
+    for column, kind in schema.SCHEMAS[name].items():
+        if kind == 'category':
+            types[column] = str
+        elif kind == 'integer':
+            types[column] = np.int64
+        elif name == 'radar' and kind == 'float':
+            types[column] = object
+    return frame.astype(types)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dataset memory before/after the typed load stage')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 100])
+    parser.add_argument('--db', default=config.DB_PATH)
+    args = parser.parse_args()
+
+    print(f"{'scale':>5} {'dataset':<9} {'rows':>9} {'before KiB':>11} {'after KiB':>10} {'after':>6} {'load s':>7}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in args.scales:
+            path = args.db
+            if scale > 1:
+                path = os.path.join(workdir, f'x{scale}.db')
+                scaled_copy(args.db, path, scale)
+            loader = data_loader.SQLiteLoader(path)
+            totals = [0, 0]
+            for name in data_loader.READERS:
+                started = time.perf_counter()
+                frame = loader.load(name)
+                seconds = time.perf_counter() - started
+                after = frame.memory_usage(deep=True).sum()
+                before = untyped(name, frame).memory_usage(deep=True).sum()
+                totals[0] += before
+                totals[1] += after
+                print(f"{scale:>5} {name:<9} {len(frame):>9} {before / 1024:>11.0f} {after / 1024:>10.0f} "
+                      f"{after / before:>6.0%} {seconds:>7.2f}")
+            print(f"{scale:>5} {'total':<9} {'':>9} {totals[0] / 1024:>11.0f} {totals[1] / 1024:>10.0f} "
+                  f"{totals[1] / totals[0]:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
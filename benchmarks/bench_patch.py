@@ -0,0 +1,98 @@
+# %%
+# Bytes per interaction with whole figures vs. patches of the drawn figure
+# (PATCH_FIGURES, see patching.py).
+# Each mode runs in a fresh process, since PATCH_FIGURES is read when the app
+# is imported. The overview page is walked like a user would: for every
+# airline the year slider steps through every year, then the multiple type
+# changes, then the next airline is picked. The requests go through the Flask
+# test client, carrying the drawn tokens of the previous response in patch
+# mode; the sizes are the JSON response bodies, raw and gzipped.
+#
+#   python benchmarks/bench_patch.py [--companies 4]
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'full': {'PATCH_FIGURES': '0'},
+    'patch': {'PATCH_FIGURES': '1'},
+}
+
+CHILD = r"""
+import gzip, json, sys, time
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {benchmarks!r})
+import app
+import config
+from bench_callbacks import CALLBACKS, update_request
+
+graphs = ['sankey-diagram', 'line-graph']
+if config.PATCH_FIGURES:
+    outputs, inputs, state = CALLBACKS['update_overview']
+    drawn = [('%s-drawn' % graph, 'data') for graph in graphs]
+    CALLBACKS['update_overview'] = (outputs + drawn, inputs, state + drawn)
+
+data = app.current_data()
+companies = data.distinct('sankey', 'company_name')[:{companies}]
+years = sorted(data.distinct('sankey', 'year'))
+types = data.distinct('line', 'multiple_type')
+
+steps = []
+for company in companies:
+    steps.append(('airline', (company, years[0], types[0]), 0))
+    steps += [('year', (company, year, types[0]), 1) for year in years[1:]]
+    steps += [('multiple type', (company, years[-1], multiple_type), 2) for multiple_type in types[1:]]
+
+client = app.server.test_client()
+client.get('/')
+tokens = [None, None]
+results = {{}}
+for kind, args, changed in steps:
+    extra = tuple(tokens) if config.PATCH_FIGURES else ()
+    body = update_request('update_overview', args + (1200,) + extra, changed)
+    started = time.perf_counter()
+    response = client.post('/_dash-update-component', json=body)
+    seconds = time.perf_counter() - started
+    raw = response.data if response.status_code == 200 else b''
+    if raw and config.PATCH_FIGURES:
+        outputs = json.loads(raw)['response']
+        tokens = [outputs.get('%s-drawn' % graph, {{}}).get('data', token) for graph, token in zip(graphs, tokens)]
+    total = results.setdefault(kind, [0, 0, 0, 0.0])
+    total[0] += 1
+    total[1] += len(raw)
+    total[2] += len(gzip.compress(raw)) if raw else 0
+    total[3] += seconds
+print(json.dumps(results))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Overview response bytes per interaction, whole figures vs. patches')
+    parser.add_argument('--companies', type=int, default=4, help='airlines walked through')
+    args = parser.parse_args()
+
+    child = CHILD.format(root=ROOT, benchmarks=os.path.dirname(os.path.abspath(__file__)), companies=args.companies)
+    results = {}
+    for mode, env in MODES.items():
+        output = subprocess.run([sys.executable, '-c', child], env={**os.environ, **env},
+                                capture_output=True, text=True, check=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'interaction':<14} {'count':>5} {'full B':>8} {'patch B':>8} {'full gz':>8} {'patch gz':>9} "
+          f"{'full ms':>8} {'patch ms':>9}")
+    for kind in list(results['full']) + ['all']:
+        if kind == 'all':
+            full, patch = ([sum(values[i] for values in results[mode].values()) for i in range(4)] for mode in MODES)
+        else:
+            full, patch = results['full'][kind], results['patch'][kind]
+        count = full[0]
+        print(f"{kind:<14} {count:>5} {full[1] / count:>8.0f} {patch[1] / count:>8.0f} {full[2] / count:>8.0f} "
+              f"{patch[2] / count:>9.0f} {full[3] * 1000 / count:>8.2f} {patch[3] * 1000 / count:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# %%
+# Serialization benchmark: bytes on the wire and encoding time per figure.
+# Every page callback is run over its input grid once, then each figure is
+# encoded the way Dash would send it in each mode:
+#   json            plotly's encoder with the stdlib json engine (before)
+#   orjson          the same with the orjson engine
+#   compact         no template, floats trimmed (compact.py), orjson
+#   compact+gzip    ... and gzip compressed (COMPRESS_RESPONSES=1)
+#   compact+br      ... brotli instead of gzip, when `brotli` is installed
+#
+#   python benchmarks/bench_serialization.py [--digits 6] [--repeat 5]
+import argparse
+import gzip
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ['FIGURE_CACHE_SIZE'] = '0'
+
+import app  # noqa: E402
+import compact  # noqa: E402
+from bench_callbacks import input_grid  # noqa: E402
+from plotly.io.json import to_json_plotly  # noqa: E402
+
+
+def modes(digits):
+    template = compact.default_template()
+
+    def compacted(figure):
+        return to_json_plotly(compact.compact_figure(figure, digits, template), engine='orjson')
+
+    result = {
+        'json': lambda figure: to_json_plotly(figure, engine='json'),
+        'orjson': lambda figure: to_json_plotly(figure, engine='orjson'),
+        'compact': compacted,
+        'compact+gzip': lambda figure: gzip.compress(compacted(figure).encode(), compresslevel=6),
+    }
+    if compact.brotli is not None:
+        result['compact+br'] = lambda figure: compact.brotli.compress(compacted(figure).encode(), quality=6)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Response bytes and encoding time per figure and serialization mode')
+    parser.add_argument('--digits', type=int, default=6)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-cases', type=int, default=30)
+    args = parser.parse_args()
+
+    grid = input_grid(app, args.max_cases)
+    encoders = modes(args.digits)
+    print(f"{'callback':<20} {'mode':<13} {'bytes':>8} {'vs json':>8} {'encode ms':>10}")
+    for name, cases in grid.items():
+        if name == 'render_page_content':
+            continue
+        figures = []
+        for case in cases:
+            # The page callbacks return one figure per graph
+            result = getattr(app, name)(*case)
+            figures.extend(result if isinstance(result, (tuple, list)) else [result])
+        baseline = None
+        for mode, encode in encoders.items():
+            sizes, times = [], []
+            for figure in figures:
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    body = encode(figure)
+                    times.append(time.perf_counter() - started)
+                sizes.append(len(body.encode() if isinstance(body, str) else body))
+            size = np.mean(sizes)
+            baseline = baseline or size
+            print(f"{name:<20} {mode:<13} {size:>8.0f} {size / baseline:>8.0%} {np.median(times) * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
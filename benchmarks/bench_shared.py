@@ -0,0 +1,119 @@
+# %%
+# Shared page callbacks vs. one callback per chart: server CPU per interaction.
+# app.py draws the charts of a page with one multi-output callback that shares
+# the data snapshot, filtered slices and validation between them. For
+# comparison a second Dash app registers the same figure functions the old
+# way, one single-output callback (and one request) per chart. Each user
+# interaction is replayed through the Flask test client of both apps with the
+# figure cache disabled, and the CPU time of the process is measured.
+#
+#   python benchmarks/bench_shared.py [--repeat 5]
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.update(FIGURE_CACHE_SIZE='0', FIGURE_CACHE_PATH='', COMPACT_FIGURES='0', CLIENTSIDE_RENDERING='0')
+
+import dash  # noqa: E402
+from dash import Input, Output, State  # noqa: E402
+
+import app  # noqa: E402
+from bench_callbacks import CALLBACKS, update_request  # noqa: E402
+
+
+# The charts as single-output callbacks: (output, inputs, state, figure function)
+CHARTS = [
+    (('sankey-diagram', 'figure'), [('company-filter', 'value'), ('year-filter', 'value')], [], 'update_sankey'),
+    (('line-graph', 'figure'), [('company-filter', 'value'), ('year-filter', 'value'), ('multiple-filter', 'value')],
+     [('line-graph-width', 'data')], 'update_graphs'),
+    (('radar-chart', 'figure'), [('company-checklist', 'value'), ('year-slider', 'value')], [], 'update_radar_chart'),
+    (('bar-chart', 'figure'), [('company-checklist', 'value'), ('year-slider', 'value')], [], 'update_bar_chart'),
+]
+
+
+def separate_app():
+    # The charts registered one callback each, as before the page callbacks
+    separate = dash.Dash(__name__, suppress_callback_exceptions=True)
+    separate.layout = app.app.layout
+    for output, inputs, state, function in CHARTS:
+        separate.callback(Output(*output), [Input(*spec) for spec in inputs],
+                          [State(*spec) for spec in state])(getattr(app, function))
+    return separate
+
+
+def chart_request(output, values, changed):
+    # Request of the single-output callback of chart `output`; values maps
+    # (id, property) of every control to its value
+    _, inputs, state, _ = next(chart for chart in CHARTS if chart[0] == output)
+    return {
+        'output': '{}.{}'.format(*output),
+        'outputs': {'id': output[0], 'property': output[1]},
+        'inputs': [{'id': cid, 'property': prop, 'value': values[cid, prop]} for cid, prop in inputs],
+        'state': [{'id': cid, 'property': prop, 'value': values[cid, prop]} for cid, prop in state],
+        'changedPropIds': ['{}.{}'.format(*changed)],
+    }
+
+
+def interactions(data):
+    # (label, page callback, args, changed input, charts redrawn)
+    companies = data.distinct('sankey', 'company_name')
+    years = data.distinct('sankey', 'year')
+    types = data.distinct('line', 'multiple_type')
+    radar_companies = data.distinct('radar', 'company_name')
+    football_years = data.distinct('football', 'fin_year')
+    result = []
+    for company, year in itertools.product(companies, years):
+        result.append(('overview: airline/year', 'update_overview', (company, year, types[0], 1200), 1,
+                       [('sankey-diagram', 'figure'), ('line-graph', 'figure')]))
+        for multiple_type in types[1:]:
+            result.append(('overview: multiple type', 'update_overview', (company, year, multiple_type, 1200), 2,
+                           [('line-graph', 'figure')]))
+    for size, year in itertools.product(range(2, len(radar_companies) + 1), football_years):
+        result.append(('comparison: checklist/year', 'update_comparison', (radar_companies[:size], year), 1,
+                       [('radar-chart', 'figure'), ('bar-chart', 'figure')]))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CPU per interaction: shared page callbacks vs. one callback per chart')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    shared = app.server.test_client()
+    separate = separate_app().server.test_client()
+    shared.get('/')
+    separate.get('/')
+
+    results = {}
+    for label, callback, values, changed, charts in interactions(app.current_data()) * args.repeat:
+        _, inputs, state = CALLBACKS[callback]
+        controls = dict(zip(inputs + state, values))
+        bodies = {
+            'shared': [update_request(callback, values, changed)],
+            'separate': [chart_request(chart, controls, inputs[changed]) for chart in charts],
+        }
+        for mode, client in (('shared', shared), ('separate', separate)):
+            started = time.process_time()
+            for body in bodies[mode]:
+                response = client.post('/_dash-update-component', json=body)
+                if response.status_code not in (200, 204):
+                    raise RuntimeError(f"{mode} {callback}{values}: HTTP {response.status_code}")
+            results.setdefault((label, mode), []).append((time.process_time() - started, len(bodies[mode])))
+
+    print(f"{'interaction':<28} {'mode':<9} {'requests':>8} {'CPU ms':>8} {'vs separate':>12}")
+    for label in dict.fromkeys(label for label, _ in results):
+        separate_ms = np.mean([cpu for cpu, _ in results[label, 'separate']]) * 1000
+        for mode in ('separate', 'shared'):
+            cpu_ms = np.mean([cpu for cpu, _ in results[label, mode]]) * 1000
+            print(f"{label:<28} {mode:<9} {results[label, mode][0][1]:>8} {cpu_ms:>8.2f} {cpu_ms / separate_ms - 1:>+12.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# %%
+# Micro-benchmark: boolean-mask filtering vs. SliceStore lookup on data_line.
+# The Multiple table is scaled up by cloning every airline under a new name, so
+# the number of (company, year, type) slices grows with the row count.
+#
+#   python benchmarks/bench_slice_store.py
+import os
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import data_line  # noqa: E402
+from data_store import SliceStore  # noqa: E402
+
+SCALES = [1, 10, 100]
+REPEAT = 200
+
+
+def scale_frame(frame, factor):
+    copies = []
+    for i in range(factor):
+        copy = frame.copy()
+        if i:
+            copy['company_name'] = copy['company_name'].astype(str) + f' #{i}'
+        copies.append(copy)
+    # Categorical again, like the loaded frames (schema.py)
+    return pd.concat(copies, ignore_index=True).astype({'company_name': 'category'})
+
+
+def main():
+    company, year, multiple_type = data_line[['company_name', 'year', 'multiple_type']].iloc[0]
+    print(f"{'scale':>6} {'rows':>9} {'mask (us)':>11} {'lookup (us)':>12} {'build (ms)':>11}")
+    for factor in SCALES:
+        frame = scale_frame(data_line, factor)
+
+        def mask():
+            return frame[
+                (frame['company_name'] == company) &
+                (frame['year'] == year) &
+                (frame['multiple_type'] == multiple_type)
+            ]
+
+        build_s = timeit.timeit(lambda: SliceStore(frame, ['company_name', 'year', 'multiple_type']), number=1)
+        store = SliceStore(frame, ['company_name', 'year', 'multiple_type'])
+        assert len(store.get(company, year, multiple_type)) == len(mask())
+
+        mask_us = min(timeit.repeat(mask, number=REPEAT, repeat=3)) / REPEAT * 1e6
+        lookup_us = min(timeit.repeat(lambda: store.get(company, year, multiple_type), number=REPEAT, repeat=3)) / REPEAT * 1e6
+        print(f"{factor:>5}x {len(frame):>9} {mask_us:>11.1f} {lookup_us:>12.2f} {build_s * 1e3:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# %%
+# Startup benchmark: SQLite queries vs. the memory-mapped columnar snapshot.
+# Each mode runs in a fresh process that imports the app and loads every
+# dataset, then reports the elapsed time (and the part of it spent loading
+# the data, after the imports, which cost the same in both modes) and its
+# memory from /proc (Linux only). The snapshot is (re)built first if it does
+# not match the database. On the small Airline_MA.db both modes boot in about
+# the same time; the snapshot pays off as the database grows.
+#
+#   python benchmarks/bench_snapshot.py [--db path/to/Airline_MA.db] [--repeat 5]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import columnar_cache  # noqa: E402
+import config  # noqa: E402
+
+CHILD = r"""
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.current_data().preload()
+loaded = time.perf_counter()
+
+fields = {{}}
+with open('/proc/self/smaps_rollup') as f:
+    for line in f:
+        parts = line.split()
+        if len(parts) == 3 and parts[2] == 'kB':
+            fields[parts[0].rstrip(':')] = int(parts[1])
+print(json.dumps(dict(
+    boot_s=loaded - started,
+    load_s=loaded - imported,
+    rss=fields.get('Rss', 0),
+    private=fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+)))
+"""
+
+
+def run(db_path, snapshot):
+    env = dict(os.environ, AIRLINE_DB_PATH=db_path, COLUMNAR_SNAPSHOT='1' if snapshot else '0', DATA_BACKEND='memory')
+    out = subprocess.run([sys.executable, '-c', CHILD.format(root=ROOT)], env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Boot time and memory with and without the columnar snapshot')
+    parser.add_argument('--db', default=config.DB_PATH)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if columnar_cache.read_manifest(args.db) is None:
+        columnar_cache.build(args.db)
+
+    print(f"{'source':>9} {'boot (s)':>9} {'load (s)':>9} {'RSS (MB)':>9} {'private (MB)':>13}   (median of {args.repeat})")
+    for snapshot in (False, True):
+        runs = [run(args.db, snapshot) for _ in range(args.repeat)]
+
+        def median(key):
+            return statistics.median(r[key] for r in runs)
+
+        print(f"{'snapshot' if snapshot else 'sqlite':>9} {median('boot_s'):>9.3f} {median('load_s'):>9.3f} "
+              f"{median('rss') / 1024:>9.1f} {median('private') / 1024:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
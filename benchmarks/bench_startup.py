@@ -0,0 +1,111 @@
+# %%
+# Startup benchmark: cold start time and per-worker memory, lazy vs. preloaded.
+# Simulates `gunicorn -w N app:server` without gunicorn: a parent process
+# imports the app (and with --preload reads all data), then forks N workers
+# that each render every chart once. Memory is read from /proc (Linux only):
+# Private is what each worker pays for itself, Shared is what the fork shares.
+#
+#   python benchmarks/bench_startup.py [--workers 4]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+if {preload!r}:
+    app.preload_for_fork(app.data)
+preloaded = time.perf_counter()
+
+
+def memory_kb():
+    fields = {{}}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {{
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+    }}
+
+
+def work():
+    # Roughly what a worker does while serving both pages
+    company = app.data.sankey['company_name'].iloc[0]
+    year = int(app.data.line['year'].max())
+    app.update_sankey(company, int(app.data.sankey['year'].max()))
+    app.update_graphs(company, year, app.data.line['multiple_type'].iloc[0])
+    companies = app.data.radar['company_name'].unique().tolist()
+    app.update_radar_chart(companies, int(app.data.football['fin_year'].max()))
+    app.update_bar_chart(companies, int(app.data.football['fin_year'].max()))
+
+
+pipes = []
+for _ in range({workers}):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        t = time.perf_counter()
+        work()
+        first = time.perf_counter() - t
+        with os.fdopen(write_fd, 'w') as out:
+            json.dump(dict(first_request_s=first, **memory_kb()), out)
+        os._exit(0)
+    os.close(write_fd)
+    pipes.append((pid, read_fd))
+
+workers = []
+for pid, read_fd in pipes:
+    with os.fdopen(read_fd) as f:
+        workers.append(json.load(f))
+    os.waitpid(pid, 0)
+
+print(json.dumps(dict(
+    import_s=imported - started,
+    preload_s=preloaded - imported,
+    master=memory_kb(),
+    workers=workers,
+)))
+"""
+
+
+def run(preload, workers):
+    code = CHILD.format(root=ROOT, preload=preload, workers=workers)
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start time and per-worker memory, lazy vs. preloaded data')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'import (s)':>11} {'preload (s)':>12} {'1st req (s)':>12} "
+          f"{'worker RSS':>11} {'private':>9} {'shared':>9}   (MB, mean per worker)")
+    for preload in (False, True):
+        result = run(preload, args.workers)
+        workers = result['workers']
+
+        def mean(key):
+            return sum(w[key] for w in workers) / len(workers)
+
+        print(f"{'preload' if preload else 'lazy':>8} {result['import_s']:>11.3f} {result['preload_s']:>12.3f} "
+              f"{mean('first_request_s'):>12.3f} {mean('rss') / 1024:>11.1f} "
+              f"{mean('private') / 1024:>9.1f} {mean('shared') / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# %%
+# Multi-year trend benchmark: every daily row of the selected years plotted
+# vs. the aggregation pyramid (pyramid.py) at the level picked for the graph.
+# The database is copied with the multiple history repeated further back in
+# time until it covers --years years, then a fresh process imports the app
+# against it (figure cache off) and draws the trend of every airline over
+# spans of 1 year up to the whole history, for a 1200 px wide graph. Latency
+# covers the figure and its JSON encoding; bytes are the encoded figure.
+# Each run first checks one monthly bucket against the daily rows.
+#
+#   python benchmarks/bench_trend.py [--years 2 10 40] [--repeat 5]
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config  # noqa: E402
+
+CHILD = r"""
+import json, sys, time
+import numpy as np
+import plotly.express as px
+from plotly.io.json import to_json_plotly
+sys.path.insert(0, {root!r})
+import app
+
+data = app.current_data()
+started = time.perf_counter()
+trend = data.trend
+build_s = time.perf_counter() - started
+companies = trend.companies
+multiple_type = data.distinct('line', 'multiple_type')[0]
+first_year, last_year = trend.years
+
+# Check one known bucket against the daily rows: the month of the latest row
+# of the first series ('last' is the value of its latest date)
+rows = data.line[(data.line['company_name'] == companies[0]) & (data.line['multiple_type'] == multiple_type)]
+month = rows['date'].max().to_period('M')
+daily = rows[rows['date'].dt.to_period('M') == month].sort_values('date')
+level, series = trend.select([companies[0]], multiple_type, month.year, month.year, 12)
+buckets = series[companies[0]]
+assert level == 'month', level
+bucket = buckets[buckets['date'] == month.start_time].iloc[0]
+assert bucket['last'] == daily['multiple_value'].iloc[-1], (bucket['last'], daily['multiple_value'].iloc[-1])
+assert bucket['count'] == len(daily) and np.isclose(bucket['mean'], daily['multiple_value'].mean())
+
+
+def naive(start, end):
+    rows = data.line_slices.get_many([(company, year, multiple_type)
+                                      for company in companies for year in range(start, end + 1)])
+    return px.line(rows, x='date', y='multiple_value', color='company_name', color_discrete_map=app.company_colors)
+
+
+results = []
+for span in sorted({{1, 5, 10, last_year - first_year + 1}}):
+    if span > last_year - first_year + 1:
+        continue
+    start = last_year - span + 1
+    for mode, draw in (('all rows', lambda: naive(start, last_year)),
+                       ('pyramid', lambda: app.update_trend_graph(companies, [start, last_year], multiple_type, 1200))):
+        times = []
+        for _ in range({repeat}):
+            started = time.perf_counter()
+            figure = draw()
+            encoded = to_json_plotly(figure)
+            times.append(time.perf_counter() - started)
+        results.append(dict(span=span, mode=mode, ms=float(np.median(times) * 1000), bytes=len(encoded),
+                            title=figure.layout.title.text or ''))
+print(json.dumps(dict(rows=len(data.line), build_s=build_s, results=results)))
+"""
+
+
+def history_copy(source, target, years):
+    # Copy `source` with the Multiple rows repeated further back in time
+    # (shifted by the length of the existing history) to cover `years` years
+    shutil.copyfile(source, target)
+    conn = sqlite3.connect(target)
+    try:
+        first, last = conn.execute("SELECT MIN(date), MAX(date) FROM Multiple").fetchone()
+        covered = int(last[:4]) - int(first[:4]) + 1
+        shift = max(1, covered - 1)
+        offset = conn.execute("SELECT MAX(multiple_id) FROM Multiple").fetchone()[0] + 1
+        for k in range(1, -(-(years - covered) // shift) + 1):
+            conn.execute("INSERT INTO Multiple SELECT multiple_id + ?, company_id, multiple_type, "
+                         "date(date, ?), multiple_value, Q1, Q3, average FROM Multiple WHERE multiple_id < ?",
+                         (k * offset, f'-{k * shift} years', offset))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-year trend latency and size, all daily rows vs. the pyramid')
+    parser.add_argument('--years', type=int, nargs='+', default=[2, 10, 40], help='history lengths to test')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', default=config.DB_PATH)
+    args = parser.parse_args()
+
+    child = CHILD.format(root=ROOT, repeat=args.repeat)
+    print(f"{'history':>7} {'span':>4} {'mode':<9} {'ms':>8} {'bytes':>9}  level")
+    with tempfile.TemporaryDirectory() as workdir:
+        for years in args.years:
+            path = os.path.join(workdir, f'history{years}.db')
+            history_copy(args.db, path, years)
+            env = {**os.environ, 'AIRLINE_DB_PATH': path, 'FIGURE_CACHE_SIZE': '0', 'FIGURE_CACHE_PATH': '',
+                   'CLIENTSIDE_RENDERING': '0', 'HOT_RELOAD': '0'}
+            output = subprocess.run([sys.executable, '-c', child], env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            report = json.loads(output.strip().splitlines()[-1])
+            print(f"{years:>7} years: {report['rows']} daily rows, pyramid built in {report['build_s']:.2f} s")
+            for result in report['results']:
+                level = result['title'] if result['mode'] == 'pyramid' else ''
+                print(f"{'':>7} {result['span']:>4} {result['mode']:<9} {result['ms']:>8.1f} {result['bytes']:>9}  {level}")
+
+
+if __name__ == "__main__":
+    main()
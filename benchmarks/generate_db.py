@@ -0,0 +1,282 @@
+# %%
+# Synthetic Airline_MA.db for load and capacity testing.
+# Writes a SQLite file with the same five tables as Airline_MA.db (Airline,
+# IncomeStatement, Multiple, KeyRatios, key_financial) for any number of
+# airlines, years and multiple types:
+#   - income statements grow year over year with noise, expenses broken down
+#     like the real filings (and, like them, partly stored as "1,234.50" text)
+#   - key_financial / KeyRatios are derived from the same revenue, with some
+#     airlines only covered from a later year
+#   - every multiple is a business-daily mean-reverting random walk; Q1 and Q3
+#     are its average -/+ one (population) standard deviation, as in the real
+#     file, or its 25% and 75% quantiles with --bands quartile, computed over
+#     the whole history (as in the real file) or over a trailing window with
+#     --rolling-window (the band then moves with every row, as after ingest.py)
+# Rows are generated one series at a time and inserted in batches, so memory
+# stays bounded even for multi-million-row Multiple tables.
+#
+#   python benchmarks/generate_db.py synthetic.db --airlines 500 --years 10 [--bands quartile] [--migrate]
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ingest  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE "Airline" (
+    "company_id" INTEGER,
+    "company_name" TEXT,
+    PRIMARY KEY("company_id")
+);
+CREATE TABLE "IncomeStatement" (
+    "incomestatement_id" INTEGER,
+    "year" INTEGER,
+    "company_id" INTEGER,
+    "company_name" TEXT,
+    "revenue" REAL,
+    "sales_and_services_revenue" REAL,
+    "other_revenue" INTEGER,
+    "operating_expenses" REAL,
+    "selling_and_marketing" INTEGER,
+    "depreciation_and_amortization" INTEGER,
+    "other_operating_expense" REAL,
+    "operating_income" INTEGER,
+    "operating_loss" INTEGER
+);
+CREATE TABLE "Multiple" (
+    "multiple_id" INTEGER,
+    "company_id" INTEGER,
+    "multiple_type" TEXT,
+    "date" TEXT,
+    "multiple_value" REAL,
+    "Q1" REAL,
+    "Q3" REAL,
+    "average" REAL
+);
+CREATE TABLE "KeyRatios" (
+    "ratio_year" INTEGER,
+    "company_id" INTEGER,
+    "return_on_assets" REAL,
+    "quick_ratio" REAL,
+    "total_debt_to_capital" REAL,
+    "total_debt_to_equity" REAL,
+    "return_on_invested_capit" REAL,
+    "ratio_id" INTEGER
+);
+CREATE TABLE "key_financial" (
+    "financial_id" INTEGER,
+    "company_id" INTEGER,
+    "fin_year" INTEGER,
+    "mkt_captalization" REAL,
+    "cash_equival" REAL,
+    "total_debt" REAL,
+    "enterprise_val" REAL,
+    "revenue" REAL,
+    "EBITDA" REAL,
+    "net_income" REAL,
+    "EPS" REAL,
+    "cash_from_operations" REAL,
+    "capital_expenditures" REAL,
+    "free_cash_flow" REAL
+);
+"""
+
+# Multiple type -> (median level, spread of the level across airlines); types
+# not listed get revenue-like levels
+MULTIPLE_LEVELS = {
+    'revenue': (1.0, 0.4),
+    'EBITDA': (6.0, 0.5),
+    'P_BV': (1.5, 0.6),
+}
+
+
+# %%
+class BatchWriter:
+    # Buffers rows per table and inserts them with executemany every `size` rows
+    def __init__(self, conn, size):
+        self.conn = conn
+        self.size = size
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, table, rows):
+        buffer = self.buffers.setdefault(table, [])
+        buffer.extend(rows)
+        if len(buffer) >= self.size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        for name in ([table] if table else list(self.buffers)):
+            rows = self.buffers.get(name)
+            if not rows:
+                continue
+            placeholders = ', '.join('?' * len(rows[0]))
+            self.conn.executemany(f'INSERT INTO "{name}" VALUES ({placeholders})', rows)
+            self.counts[name] = self.counts.get(name, 0) + len(rows)
+            rows.clear()
+
+
+def money(value):
+    # Like the text columns of the real IncomeStatement table
+    return f"{value:,.2f}"
+
+
+def income_statements(rng, company_id, name, years, first_id):
+    revenue = rng.lognormal(np.log(3000), 1.0)
+    rows, revenues = [], []
+    for offset, year in enumerate(years):
+        if offset:
+            revenue *= max(0.3, 1 + rng.normal(0.05, 0.12))
+        other = revenue * rng.uniform(0.01, 0.06)
+        expenses = revenue * rng.normal(0.93, 0.08)
+        selling = revenue * rng.uniform(0.02, 0.06)
+        depreciation = revenue * rng.uniform(0.04, 0.09)
+        income = revenue - expenses
+        rows.append((
+            first_id + offset, year, company_id, name, money(revenue), money(revenue - other), round(other, 1),
+            money(expenses), round(selling, 1), round(depreciation, 1), money(expenses - selling - depreciation),
+            round(max(income, 0), 1), round(max(-income, 0), 1),
+        ))
+        revenues.append(revenue)
+    return rows, revenues
+
+
+def key_financials(rng, company_id, years, revenues, first_id):
+    # Some airlines are only covered from a later year, like in the real file
+    start = rng.integers(0, max(1, len(years) // 2)) if rng.random() < 0.3 else 0
+    rows = []
+    for offset in range(start, len(years)):
+        revenue = revenues[offset]
+        ebitda = revenue * rng.normal(0.14, 0.08)
+        net_income = ebitda * rng.uniform(0.2, 0.5) - revenue * 0.03
+        cap = revenue * rng.lognormal(np.log(0.8), 0.4)
+        cash = revenue * rng.uniform(0.1, 0.5)
+        debt = revenue * rng.uniform(0.3, 1.5)
+        cfo = ebitda * rng.uniform(0.6, 1.1)
+        capex = -revenue * rng.uniform(0.05, 0.2)
+        rows.append(tuple(
+            round(float(v), 2) if isinstance(v, float) else v for v in (
+                first_id + offset, company_id, years[offset], cap, cash, debt, cap + debt - cash, revenue, ebitda,
+                net_income, net_income / rng.uniform(50, 200), cfo, capex, cfo + capex,
+            )
+        ))
+    return rows
+
+
+def key_ratios(rng, company_id, years, first_id):
+    rows = []
+    for offset, year in enumerate(years):
+        roa = rng.normal(4, 5)
+        capital = rng.uniform(30, 85)
+        rows.append((
+            year, company_id, round(roa, 2), round(rng.lognormal(0, 0.3), 2), round(capital, 2),
+            round(capital / (100 - capital) * 100, 2), round(roa * rng.uniform(1.2, 1.8), 2), first_id + offset,
+        ))
+    return rows
+
+
+def multiple_series(rng, multiple_type, n_days, rolling_window, bands='std'):
+    # Mean-reverting random walk in log space around an airline-specific level
+    median, spread = MULTIPLE_LEVELS.get(multiple_type, MULTIPLE_LEVELS['revenue'])
+    level = np.log(median) + rng.normal(0, spread)
+    volatility = rng.uniform(0.01, 0.03)
+    shocks = rng.normal(0, volatility, n_days)
+    log_values = np.empty(n_days)
+    current = level
+    for i in range(n_days):
+        current += 0.02 * (level - current) + shocks[i]
+        log_values[i] = current
+    values = pd.Series(np.round(np.exp(log_values), 3))
+    if rolling_window:
+        window = values.rolling(rolling_window, min_periods=1)
+        average = window.mean()
+        if bands == 'std':
+            std = window.std(ddof=0)
+            return values, average - std, average + std, average
+        return values, window.quantile(0.25), window.quantile(0.75), average
+    average = pd.Series(values.mean(), index=values.index)
+    if bands == 'std':
+        std = values.std(ddof=0)
+        return values, average - std, average + std, average
+    return (values, pd.Series(values.quantile(0.25), index=values.index),
+            pd.Series(values.quantile(0.75), index=values.index), average)
+
+
+# %%
+def generate(path, airlines=50, years=7, start_year=2017, types=('revenue', 'EBITDA', 'P_BV'),
+             history_years=None, rolling_window=0, batch_size=50000, seed=0, bands='std'):
+    if os.path.exists(path):
+        os.remove(path)
+    rng = np.random.default_rng(seed)
+    year_list = list(range(start_year, start_year + years))
+    history_years = history_years or years
+    # Business days of the last `history_years` years of the range
+    dates = pd.bdate_range(f'{year_list[-history_years]}-01-01', f'{year_list[-1]}-12-31').strftime('%Y-%m-%d').tolist()
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript(SCHEMA)
+    writer = BatchWriter(conn, batch_size)
+    multiple_id = 1
+    try:
+        for company_id in range(1, airlines + 1):
+            name = f"Airline {company_id:0{len(str(airlines))}d}"
+            first_id = (company_id - 1) * years + 1
+            writer.add('Airline', [(company_id, name)])
+            statements, revenues = income_statements(rng, company_id, name, year_list, first_id)
+            writer.add('IncomeStatement', statements)
+            writer.add('key_financial', key_financials(rng, company_id, year_list, revenues, first_id))
+            writer.add('KeyRatios', key_ratios(rng, company_id, year_list, first_id))
+            for multiple_type in types:
+                values, q1, q3, average = multiple_series(rng, multiple_type, len(dates), rolling_window, bands)
+                writer.add('Multiple', list(zip(
+                    range(multiple_id, multiple_id + len(dates)), [company_id] * len(dates),
+                    [multiple_type] * len(dates), dates, values.tolist(),
+                    q1.round(3).tolist(), q3.round(3).tolist(), average.round(3).tolist(),
+                )))
+                multiple_id += len(dates)
+        writer.flush()
+        conn.commit()
+    finally:
+        conn.close()
+    return writer.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic database with the Airline_MA.db schema')
+    parser.add_argument('path')
+    parser.add_argument('--airlines', type=int, default=50)
+    parser.add_argument('--years', type=int, default=7)
+    parser.add_argument('--start-year', type=int, default=2017)
+    parser.add_argument('--types', nargs='+', default=['revenue', 'EBITDA', 'P_BV'])
+    parser.add_argument('--history-years', type=int, help='years of daily multiples (default: all)')
+    parser.add_argument('--rolling-window', type=int, default=0,
+                        help='trailing window (days) for Q1/Q3/average instead of the whole history')
+    parser.add_argument('--bands', choices=ingest.BANDS, default='std',
+                        help='Q1/Q3 as average -/+ std (as in Airline_MA.db) or as the 25%%/75%% quantiles')
+    parser.add_argument('--batch-size', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--migrate', action='store_true', help='also add the sql backend indexes')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = generate(args.path, args.airlines, args.years, args.start_year, args.types,
+                      args.history_years, args.rolling_window, args.batch_size, args.seed, args.bands)
+    if args.migrate:
+        import sql_backend
+        sql_backend.migrate(args.path)
+    print(', '.join(f"{table}: {count:,}" for table, count in counts.items())
+          + f" rows in {time.perf_counter() - started:.1f}s -> {args.path}")
+
+
+if __name__ == "__main__":
+    main()
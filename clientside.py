@@ -0,0 +1,147 @@
+# %%
+# Client-side rendering mode (CLIENTSIDE_RENDERING=1).
+# The dataset behind the charts is tiny and static, so instead of a round trip
+# to the server on every slider move, render_page_content embeds a compact,
+# pre-aggregated payload in a dcc.Store and the figures are drawn by the
+# clientside callbacks in assets/dashboard.js.
+# The server-side callbacks in app.py stay the default when the mode is off.
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+from dash import ClientsideFunction, Input, Output, State
+
+# Order of the values in every sankey payload entry
+SANKEY_COLUMNS = [
+    "Revenue", "Sales & Services Revenue", "Other Revenue",
+    "Operating Expenses", "Selling & Marketing", "Depreciation & Amortization",
+    "Other Operating Expense", "Operating Income", "Operating Loss"
+]
+RADAR_METRICS = ["Profitability", "Liquidity", "Credit", "Leverage_Ratio", "ROIC"]
+
+
+def _clean(values):
+    # NaN is not valid JSON; the browser gets null instead
+    return [None if pd.isna(value) else value for value in values]
+
+
+def _template():
+    # The server-side figures use the default plotly template, ship it once
+    return pio.templates[pio.templates.default].layout.to_plotly_json()
+
+
+# Payloads are built once per data version (app.data_version: the sql backend
+# keeps one DashboardData for the life of the process while the file changes);
+# the last few are kept for requests still on the previous version
+_payloads = OrderedDict()
+MAX_PAYLOADS = 4
+
+
+def _cached(version, name, build):
+    key = (version, name)
+    if key not in _payloads:
+        _payloads[key] = build()
+        while len(_payloads) > MAX_PAYLOADS:
+            _payloads.popitem(last=False)
+    return _payloads[key]
+
+
+# %%
+def overview_payload(data, version, company_colors, link_colors_by_company):
+    return _cached(version, 'overview', lambda: _build_overview(data, company_colors, link_colors_by_company))
+
+
+def comparison_payload(data, version, company_colors, football_multiples):
+    return _cached(version, 'comparison', lambda: _build_comparison(data, company_colors, football_multiples))
+
+
+def _build_overview(data, company_colors, link_colors_by_company):
+    # Sankey link values and multiple series per company / year
+    sankey = {}
+    values = data.sankey[SANKEY_COLUMNS].to_numpy(dtype=np.float64)
+    for company, year, row in zip(data.sankey['company_name'], data.sankey['year'], values):
+        sankey.setdefault(company, {})[str(int(year))] = _clean(row.tolist())
+
+    line = {}
+    for (company, year, multiple_type), rows in data.line.groupby(['company_name', 'year', 'multiple_type'], sort=False):
+        first = rows.iloc[0]
+        line.setdefault(company, {}).setdefault(multiple_type, {})[str(int(year))] = {
+            'x': rows['date'].dt.strftime('%Y-%m-%d').tolist(),
+            'y': _clean(rows['multiple_value'].tolist()),
+            'average': float(first['average']),
+            'Q1': float(first['Q1']),
+            'Q3': float(first['Q3']),
+        }
+
+    return {
+        'sankey': sankey,
+        'line': line,
+        'company_colors': dict(company_colors),
+        'link_colors': dict(link_colors_by_company),
+        'template': _template(),
+    }
+
+
+def _build_comparison(data, company_colors, football_multiples):
+    # Radar metrics and football field ranges per company / year
+    radar = {}
+    metrics = data.radar[RADAR_METRICS]
+    for company, year, values in zip(data.radar['company_name'], data.radar['ratio_year'], metrics.to_numpy(dtype=np.float64)):
+        radar.setdefault(company, {})[str(int(year))] = _clean(values.tolist())
+
+    # [Range_Display, Value, Label] rows of the multiple types shown in the chart
+    # (ordered by type like the server-side chart)
+    football = {}
+    type_order = {multiple_type: position for position, multiple_type in enumerate(football_multiples)}
+    shown = data.football[data.football['multiple_type'].isin(football_multiples)]
+    shown = shown.iloc[shown['multiple_type'].map(type_order).to_numpy().argsort(kind='stable')]
+    for row in shown.itertuples(index=False):
+        ranges = football.setdefault(row.company_name, {}).setdefault(str(int(row.fin_year)), [])
+        ranges.append([row.Range_Display, None if pd.isna(row.Value) else float(row.Value), row.Label])
+
+    return {
+        # Options of the company checklist: the charts follow their order, not
+        # the click order of the selection (as app.checklist_order)
+        'companies': data.distinct('radar', 'company_name'),
+        'radar': radar,
+        'metrics': RADAR_METRICS,
+        'football': football,
+        'football_by_label': len(football_multiples) > 1,
+        'company_colors': dict(company_colors),
+        'template': _template(),
+    }
+
+
+# %%
+def register(app):
+    # Draw the four figures in the browser from the payload stores
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='sankey'),
+        Output('sankey-diagram', 'figure'),
+        [Input('company-filter', 'value'),
+         Input('year-filter', 'value')],
+        State('overview-data', 'data'),
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='line'),
+        Output('line-graph', 'figure'),
+        [Input('company-filter', 'value'),
+         Input('year-filter', 'value'),
+         Input('multiple-filter', 'value')],
+        State('overview-data', 'data'),
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='radar'),
+        Output('radar-chart', 'figure'),
+        [Input('company-checklist', 'value'),
+         Input('year-slider', 'value')],
+        State('comparison-data', 'data'),
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='bar'),
+        Output('bar-chart', 'figure'),
+        [Input('company-checklist', 'value'),
+         Input('year-slider', 'value')],
+        State('comparison-data', 'data'),
+    )
@@ -0,0 +1,150 @@
+# %%
+# Columnar snapshot of the four derived datasets (COLUMNAR_SNAPSHOT=1).
+# Reading SQLite rows into pandas, regex-cleaning the numeric columns and
+# parsing dates on every boot is wasted work when the DB rarely changes. The
+# build step below writes every column of data_sankey, data_line, data_radar
+# and data_football as a typed .npy file next to the DB, stamped with the DB's
+# SHA-256. At startup the numeric and date columns are memory-mapped straight
+# into the DataFrames (shared page cache, no parsing); categorical columns
+# (schema.py) are stored as their integer codes plus the categories, and
+# rebuilt from the mapped codes without materializing any text per row. A
+# missing or stale snapshot falls back to the SQLite path.
+#
+#   python columnar_cache.py build [path/to/Airline_MA.db]
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Bump when the file layout or the derivation of the datasets changes
+FORMAT_VERSION = 2
+
+
+def snapshot_dir(db_path):
+    return db_path + '.snapshot'
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+# %%
+def write_snapshot(db_path, frames):
+    # frames: {'sankey': data_sankey, ...}. Written to a temporary directory and
+    # renamed into place, so readers never see a half-written snapshot.
+    target = snapshot_dir(db_path)
+    parent = os.path.dirname(os.path.abspath(target))
+    tmp = tempfile.mkdtemp(prefix='.snapshot-', dir=parent)
+    manifest = {
+        'format': FORMAT_VERSION,
+        'db_hash': file_hash(db_path),
+        'db_stat': _stat(db_path),
+        'datasets': {},
+    }
+    for name, frame in frames.items():
+        columns = []
+        for position, (column, series) in enumerate(frame.items()):
+            filename = f'{name}.{position}.npy'
+            entry = {'name': column, 'file': filename, 'dtype': str(series.dtype)}
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                np.save(os.path.join(tmp, filename), series.cat.codes.to_numpy())
+                entry['kind'] = 'categorical'
+                entry['values'] = series.cat.categories.tolist()
+            elif pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype):
+                np.save(os.path.join(tmp, filename), series.to_numpy())
+                entry['kind'] = 'array'
+            else:
+                codes, uniques = pd.factorize(series, use_na_sentinel=True)
+                np.save(os.path.join(tmp, filename), codes.astype(np.int32))
+                entry['kind'] = 'codes'
+                entry['values'] = [None if pd.isna(value) else value for value in uniques.tolist()]
+            columns.append(entry)
+        manifest['datasets'][name] = {'rows': len(frame), 'columns': columns}
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    if os.path.isdir(target):
+        old = target + '.old'
+        shutil.rmtree(old, ignore_errors=True)
+        os.rename(target, old)
+        os.rename(tmp, target)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.rename(tmp, target)
+    return target
+
+
+def read_manifest(db_path):
+    # The manifest if the snapshot exists and matches the DB, otherwise None
+    path = os.path.join(snapshot_dir(db_path), 'manifest.json')
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+        stat = _stat(db_path)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format') != FORMAT_VERSION:
+        return None
+    # Unchanged size and mtime: trust the stamp; otherwise hash the file, and
+    # if only the stat differed (e.g. a copied file) record the new one, so the
+    # next boot does not hash it again
+    if manifest.get('db_stat') != stat:
+        if manifest.get('db_hash') != file_hash(db_path):
+            return None
+        manifest['db_stat'] = stat
+        try:
+            temporary = f'{path}.{os.getpid()}.tmp'
+            with open(temporary, 'w') as f:
+                json.dump(manifest, f)
+            os.replace(temporary, path)
+        except OSError:
+            pass
+    return manifest
+
+
+def read_dataset(db_path, manifest, name):
+    # DataFrame whose numeric/date columns are read-only memory maps
+    directory = snapshot_dir(db_path)
+    columns = {}
+    for entry in manifest['datasets'][name]['columns']:
+        values = np.load(os.path.join(directory, entry['file']), mmap_mode='r')
+        if entry['kind'] == 'categorical':
+            # Only the categories are Python objects; code -1 is missing
+            values = pd.Categorical.from_codes(values, categories=entry['values'], validate=False)
+        elif entry['kind'] == 'codes':
+            uniques = np.array(entry['values'] + [None], dtype=object)
+            # code -1 (missing) picks the trailing None
+            values = pd.array(uniques[values], dtype=entry['dtype'])
+        columns[entry['name']] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+# %%
+def build(db_path):
+    # Read the datasets through the normal SQLite path and write the snapshot
+    import data_loader
+    loader = data_loader.SQLiteLoader(db_path, consistent=True)
+    frames = {name: loader.load(name) for name in data_loader.READERS}
+    return write_snapshot(db_path, frames)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        sys.exit("usage: python columnar_cache.py build [db_path]")
+    import config
+    path = sys.argv[2] if len(sys.argv) > 2 else config.DB_PATH
+    print(f"Snapshot written to {build(path)}")
@@ -0,0 +1,154 @@
+# %%
+# Compact callback payloads (COMPACT_FIGURES=1, COMPRESS_RESPONSES=1).
+# Most of a server-side figure response is boilerplate: the default plotly
+# template alone is ~7 kB of every figure, and computed values go out with 17
+# significant digits. In compact mode
+#   - the template is sent once, in a dcc.Store of the app layout, and left
+#     out of every figure; the callbacks write the figure to a
+#     '<graph>-payload' store and the clientside dashboard.with_template puts
+#     the template back before the graph draws it
+#   - floats are rounded to FIGURE_SIGNIFICANT_DIGITS significant digits
+#     (float64 arrays become float32 at 6 digits or less) and dates at
+#     midnight lose their "T00:00:00"
+# and with COMPRESS_RESPONSES the JSON responses of the Dash endpoints are
+# brotli (if the `brotli` package is installed) or gzip compressed.
+# JSON_ENGINE picks plotly's encoder ('orjson' is much faster on arrays).
+import base64
+import functools
+import gzip
+
+import numpy as np
+import plotly.io as pio
+from dash import ClientsideFunction, Input, Output, State, dcc, no_update
+
+from figure_cache import FigureMemo
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TEMPLATE_STORE = 'plotly-template'
+NoUpdate = type(no_update)
+
+
+def payload_id(graph_id):
+    return f'{graph_id}-payload'
+
+
+def set_json_engine(engine):
+    # 'json', 'orjson' or 'auto' (orjson when installed), used by Dash for every response
+    pio.json.config.default_engine = engine
+
+
+def default_template():
+    return pio.templates[pio.templates.default].to_plotly_json()
+
+
+def template_store():
+    return dcc.Store(id=TEMPLATE_STORE, data=default_template())
+
+
+def payload_store(graph_id):
+    return dcc.Store(id=payload_id(graph_id))
+
+
+# %%
+def _trim_typed_array(spec, digits):
+    # plotly sends numpy arrays as base64 {'dtype', 'bdata'}; float64 -> float32
+    # halves them and float32 still holds ~7 significant digits
+    if spec['dtype'] != 'f8' or digits > 6:
+        return spec
+    values = np.frombuffer(base64.b64decode(spec['bdata']), dtype='<f8').astype('<f4')
+    return {**spec, 'dtype': 'f4', 'bdata': base64.b64encode(values.tobytes()).decode('ascii')}
+
+
+def round_significant(value, digits):
+    # Floats (also inside lists, dicts and float arrays) rounded to `digits` significant digits
+    if isinstance(value, float):
+        return float(f'{value:.{digits}g}') if np.isfinite(value) else value
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'M' and (value == value.astype('datetime64[D]')).all():
+            # Whole days: "2023-12-29" instead of "2023-12-29T00:00:00"
+            return np.datetime_as_string(value, unit='D').tolist()
+        if value.dtype.kind != 'f':
+            return value
+        return np.array([float(f'{v:.{digits}g}') if np.isfinite(v) else v for v in value.ravel().tolist()],
+                        dtype=value.dtype).reshape(value.shape)
+    if isinstance(value, dict):
+        if 'bdata' in value and 'dtype' in value:
+            return _trim_typed_array(value, digits)
+        return {key: round_significant(item, digits) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [round_significant(item, digits) for item in value]
+    return value
+
+
+def compact_figure(figure, digits, template=None):
+    # The figure as a dict without the default template and with rounded floats
+    figure = figure.to_plotly_json() if hasattr(figure, 'to_plotly_json') else dict(figure)
+    layout = dict(figure.get('layout', {}))
+    if layout.get('template') == (template if template is not None else default_template()):
+        del layout['template']
+    return {
+        'data': round_significant(figure.get('data', []), digits),
+        'layout': round_significant(layout, digits),
+        **{key: value for key, value in figure.items() if key not in ('data', 'layout')},
+    }
+
+
+def compacting(func, digits, max_entries=256):
+    # Wraps a figure callback; the compacted form of a figure object returned
+    # again (a figure cache hit) is reused, up to max_entries figures
+    compacted = FigureMemo(max_entries)
+    template = default_template()
+
+    def compact_one(figure):
+        if isinstance(figure, NoUpdate):
+            return figure
+        return compacted.get(figure, lambda figure: compact_figure(figure, digits, template))
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        result = func(*args)
+        # Multi-output callbacks return one figure per graph
+        if isinstance(result, (tuple, list)):
+            return [compact_one(figure) for figure in result]
+        return compact_one(result)
+    return wrapper
+
+
+def register_graph(app, graph_id):
+    # Draw the '<graph>-payload' store into the graph, template added back
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='with_template'),
+        Output(graph_id, 'figure'),
+        Input(payload_id(graph_id), 'data'),
+        State(TEMPLATE_STORE, 'data'),
+    )
+
+
+# %%
+def init_compression(server, min_bytes=500, level=6):
+    # Compress the JSON responses (callback outputs, layout) the client accepts compressed
+    from flask import request
+
+    @server.after_request
+    def compress(response):
+        if (response.direct_passthrough or response.status_code != 200 or response.mimetype != 'application/json'
+                or 'Content-Encoding' in response.headers):
+            return response
+        body = response.get_data()
+        if len(body) < min_bytes:
+            return response
+        accepted = request.headers.get('Accept-Encoding', '')
+        if brotli is not None and 'br' in accepted:
+            response.set_data(brotli.compress(body, quality=min(level, 11)))
+            response.headers['Content-Encoding'] = 'br'
+        elif 'gzip' in accepted:
+            response.set_data(gzip.compress(body, compresslevel=level))
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            return response
+        response.vary.add('Accept-Encoding')
+        return response
@@ -0,0 +1,124 @@
+# %%
+# Runtime settings for the dashboard.
+# Everything is read from environment variables so a deployment (e.g. the
+# Procfile) can change behaviour without touching the code.
+import os
+import tempfile
+
+current_directory = os.path.dirname(os.path.abspath(__file__))
+
+
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+# Location of the SQLite database
+DB_PATH = os.environ.get('AIRLINE_DB_PATH', os.path.join(current_directory, 'Airline_MA.db'))
+
+# Figure cache: max number of figures kept per worker, and an optional SQLite
+# file shared by all gunicorn workers on the box (disabled when empty) with
+# its own size limit
+FIGURE_CACHE_SIZE = env_int('FIGURE_CACHE_SIZE', 256)
+FIGURE_CACHE_PATH = os.environ.get('FIGURE_CACHE_PATH', '')
+FIGURE_CACHE_SHARED_SIZE = env_int('FIGURE_CACHE_SHARED_SIZE', 4096)
+
+# Draw the charts in the browser from a dcc.Store payload (see clientside.py)
+# instead of the server-side callbacks
+CLIENTSIDE_RENDERING = env_bool('CLIENTSIDE_RENDERING')
+
+# Read every dataset at import time (used with gunicorn's preload_app so the
+# workers share the loaded data); otherwise each dataset is read on first use
+PRELOAD_DATA = env_bool('PRELOAD_DATA')
+
+# Where the callbacks get their rows from: 'memory' (all datasets loaded and
+# indexed per worker) or 'sql' (parameterized queries per request, see
+# sql_backend.py; run `python sql_backend.py migrate` first)
+DATA_BACKEND = os.environ.get('DATA_BACKEND', 'memory')
+# Open the database with immutable=1 in the sql backend: fastest, but only
+# safe when nothing writes to the file while the app runs
+SQLITE_IMMUTABLE = env_bool('SQLITE_IMMUTABLE')
+
+# Watch the database file and swap in re-read data without a restart
+HOT_RELOAD = env_bool('HOT_RELOAD')
+HOT_RELOAD_INTERVAL = float(os.environ.get('HOT_RELOAD_INTERVAL') or 2.0)
+
+# Downsampling of the multiple trend line: 'lttb', 'minmax' or 'none', points
+# sent per pixel of graph width, and the cap used before the width is known
+LINE_DOWNSAMPLE = os.environ.get('LINE_DOWNSAMPLE', 'lttb')
+LINE_POINTS_PER_PX = float(os.environ.get('LINE_POINTS_PER_PX') or 2)
+LINE_MAX_POINTS = env_int('LINE_MAX_POINTS', 1000)
+# Buckets per pixel of graph width for the multi-year trend graph, which
+# picks its aggregation level (day, week, month) to stay under it
+TREND_POINTS_PER_PX = float(os.environ.get('TREND_POINTS_PER_PX') or 1)
+
+# Multiple types drawn in the football field chart (comma separated); with more
+# than one, each company gets a bar per type
+FOOTBALL_MULTIPLES = [t.strip() for t in os.environ.get('FOOTBALL_MULTIPLES', 'revenue').split(',') if t.strip()]
+
+# Load the datasets from the memory-mapped columnar snapshot next to the
+# database when it matches the file (build it with
+# `python columnar_cache.py build`); falls back to SQLite otherwise. Off by
+# default: on Airline_MA.db itself the queries are as fast, it pays off on
+# databases of some hundred thousand multiples and more (benchmarks/bench_snapshot.py)
+COLUMNAR_SNAPSHOT = env_bool('COLUMNAR_SNAPSHOT')
+
+# Per-callback timings, response sizes and cache counters on GET /metrics
+# (Prometheus text format); callbacks slower than SLOW_CALLBACK_MS are logged
+# with their arguments (0 = off)
+METRICS = env_bool('METRICS', True)
+SLOW_CALLBACK_MS = env_int('SLOW_CALLBACK_MS', 0)
+
+# Smaller callback responses (see compact.py): send the plotly template once
+# per page load instead of in every figure and round floats to
+# FIGURE_SIGNIFICANT_DIGITS; gzip/brotli the JSON responses; plotly's JSON
+# encoder ('auto', 'json' or 'orjson')
+COMPACT_FIGURES = env_bool('COMPACT_FIGURES')
+FIGURE_SIGNIFICANT_DIGITS = env_int('FIGURE_SIGNIFICANT_DIGITS', 6)
+COMPRESS_RESPONSES = env_bool('COMPRESS_RESPONSES')
+COMPRESS_MIN_BYTES = env_int('COMPRESS_MIN_BYTES', 500)
+JSON_ENGINE = os.environ.get('JSON_ENGINE', 'auto')
+
+# Pre-render every figure into the shared figure cache (FIGURE_CACHE_PATH)
+# when gunicorn starts (see warmup.py): worker processes (0 = one per CPU),
+# max checklist subsets per year, and extra line graph widths in pixels
+WARMUP_ON_BOOT = env_bool('WARMUP_ON_BOOT')
+WARMUP_WORKERS = env_int('WARMUP_WORKERS', 0)
+WARMUP_MAX_SUBSETS = env_int('WARMUP_MAX_SUBSETS', 64)
+WARMUP_LINE_WIDTHS = [int(w) for w in os.environ.get('WARMUP_LINE_WIDTHS', '').split(',') if w.strip()]
+
+# Run the page callbacks as Dash background callbacks in forked processes,
+# with results, progress and cancellation through a diskcache directory (see
+# background.py): where the results go, how long they are kept (seconds) and
+# how often the browser polls for them (ms)
+BACKGROUND_CALLBACKS = env_bool('BACKGROUND_CALLBACKS')
+BACKGROUND_CACHE_DIR = os.environ.get('BACKGROUND_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'airline-dashboard-jobs'))
+BACKGROUND_EXPIRE = env_int('BACKGROUND_EXPIRE', 600)
+BACKGROUND_INTERVAL_MS = env_int('BACKGROUND_INTERVAL_MS', 250)
+
+# HTTP caching (see http_cache.py): ETags from the request and the data
+# version on the callback responses, with 304 Not Modified and the last
+# HTTP_CACHE_SIZE encoded responses kept per worker; FIGURE_ENDPOINT adds
+# GET /figure/<chart> for a caching proxy, fresh for HTTP_CACHE_MAX_AGE seconds
+HTTP_CACHE = env_bool('HTTP_CACHE')
+HTTP_CACHE_SIZE = env_int('HTTP_CACHE_SIZE', 512)
+FIGURE_ENDPOINT = env_bool('FIGURE_ENDPOINT')
+HTTP_CACHE_MAX_AGE = env_int('HTTP_CACHE_MAX_AGE', 60)
+
+# Answer filter changes with a dash.Patch of what changed in a figure instead
+# of the whole figure (see patching.py; not with COMPACT_FIGURES or
+# CLIENTSIDE_RENDERING), remembering the last PATCH_HISTORY figures sent per worker
+PATCH_FIGURES = env_bool('PATCH_FIGURES')
+PATCH_HISTORY = env_int('PATCH_HISTORY', 256)
+
+# GET /export/<dataset>.<csv|arrow> streams the rows behind a chart, filtered
+# like the page controls (see export.py), EXPORT_CHUNK_ROWS rows per chunk
+EXPORT_ROUTES = env_bool('EXPORT_ROUTES', True)
+EXPORT_CHUNK_ROWS = env_int('EXPORT_CHUNK_ROWS', 10000)
@@ -0,0 +1,190 @@
+# %%
+# Reading the dashboard datasets from Airline_MA.db.
+# Each reader turns one query into one of the four derived frames used by the
+# callbacks: data_sankey, data_line, data_radar and data_football, with the
+# column types of schema.py.
+# SQLiteLoader runs them lazily, so importing the app (e.g. in every gunicorn
+# worker) does not touch the database until a callback needs the data.
+import functools
+import gc
+import sqlite3
+import threading
+
+import pandas as pd
+
+import columnar_cache
+import config
+import schema
+from data_store import DashboardData
+from valuation import football_ranges
+
+
+# %%
+# read data for page 1
+# Sankey Chart Data Processing -> Final use: data_sankey
+SANKEY_QUERY = """
+SELECT
+    a.company_name,
+    i.year,
+    i.revenue AS "Revenue",
+    i.sales_and_services_revenue AS "Sales & Services Revenue",
+    i.other_revenue AS "Other Revenue",
+    i.operating_expenses AS "Operating Expenses",
+    i.selling_and_marketing AS "Selling & Marketing",
+    i.depreciation_and_amortization AS "Depreciation & Amortization",
+    i.other_operating_expense AS "Other Operating Expense",
+    i.operating_income AS "Operating Income",
+    i.operating_loss AS "Operating Loss"
+FROM
+    Airline a
+JOIN
+    IncomeStatement i
+ON
+    a.company_id = i.company_id
+"""
+
+numeric_columns = schema.SANKEY_NUMERIC
+
+
+def read_sankey(conn):
+    return clean_sankey(pd.read_sql_query(SANKEY_QUERY, conn))
+
+
+def clean_sankey(data_sankey):
+    # Convert these columns to numeric, handling errors (e.g., commas or non-numeric values)
+    # (only the text columns are parsed, see schema.py)
+    data_sankey = schema.conform('sankey', data_sankey)
+
+    # Check for missing or NaN values after conversion
+    if data_sankey[numeric_columns].isnull().values.any():
+        print("Warning: Some values in the numeric columns are NaN after conversion.")
+    return data_sankey
+
+
+# read data for page 1
+# Line Chart Data Processing -> Final use: data_line
+LINE_QUERY = "SELECT * FROM Multiple NATURAL JOIN Airline"
+
+
+def read_line(conn):
+    return clean_line(pd.read_sql_query(LINE_QUERY, conn))
+
+
+def clean_line(data_line):
+    data_line['date'] = pd.to_datetime(data_line['date'], format='%Y-%m-%d')
+    data_line['year'] = data_line['date'].dt.year
+    return schema.conform('line', data_line)
+
+
+# %%
+# read data for page 2
+# Radar Chart Data Processing -> Final use: data_radar
+RADAR_QUERY = """
+SELECT a.company_name, k.ratio_year,
+       k.return_on_assets AS Profitability,
+       k.quick_ratio AS Liquidity,
+       k.total_debt_to_capital AS Credit,
+       k.total_debt_to_equity AS Leverage_Ratio,
+       k.return_on_invested_capit AS ROIC
+FROM Airline a
+JOIN KeyRatios k
+ON a.company_id = k.company_id
+"""
+
+
+def read_radar(conn):
+    # The metric columns hold text for some rows; parsed once here
+    return schema.conform('radar', pd.read_sql_query(RADAR_QUERY, conn))
+
+
+# FootBall Field Data Processing -> Final use: data_football
+# EV ranges for every multiple type are computed in valuation.py. The Q1/Q3
+# band of a series moves with every ingested row (ingest.py), so the query
+# returns the band of the last row of each calendar year (band_year) and
+# valuation.one_band_per_key picks the one as of each fin_year. SQLite takes
+# the bare Q1/Q3 columns from the row holding the MAX(date).
+FOOTBALL_QUERY = """
+SELECT * FROM (
+    SELECT company_name, fin_year, revenue, EBITDA, bands.multiple_type, band_year, Q1 AS 'lower', Q3 AS 'upper'
+    FROM key_financial
+    JOIN Airline USING (company_id)
+    JOIN (
+        SELECT company_id, multiple_type, CAST(substr(date, 1, 4) AS INTEGER) AS band_year, MAX(date) AS band_date, Q1, Q3
+        FROM Multiple
+        WHERE Q1 IS NOT NULL AND Q3 IS NOT NULL
+        GROUP BY company_id, multiple_type, substr(date, 1, 4)
+    ) bands USING (company_id)
+)
+"""
+
+
+def read_football(conn):
+    return schema.conform('football', football_ranges(pd.read_sql_query(FOOTBALL_QUERY, conn)))
+
+
+READERS = {
+    'sankey': read_sankey,
+    'line': read_line,
+    'radar': read_radar,
+    'football': read_football,
+}
+
+
+# %%
+class SQLiteLoader:
+    # Opens the database on first use and closes it again once every dataset
+    # has been read, so no connection is left open in the workers.
+    # With consistent=True all datasets are read inside one read transaction
+    # (only meant for loading everything at once, e.g. a hot reload).
+    def __init__(self, db_path, consistent=False):
+        self.db_path = db_path
+        self.consistent = consistent
+        self.conn = None
+        self._pending = set(READERS)
+        self._lock = threading.Lock()
+
+    def load(self, name):
+        with self._lock:
+            if self.conn is None:
+                self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                if self.consistent:
+                    self.conn.execute("BEGIN")
+            try:
+                return READERS[name](self.conn)
+            finally:
+                self._pending.discard(name)
+                if not self._pending:
+                    self.close()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def read_snapshot(db_path, manifest, name):
+    # Snapshots written before schema.py hold wider types
+    return schema.conform(name, columnar_cache.read_dataset(db_path, manifest, name))
+
+
+def load_dashboard_data(db_path, preload=False):
+    # DashboardData whose datasets are read from db_path on first access, or
+    # all at once from a single consistent read when preload is set.
+    # An up-to-date columnar snapshot (columnar_cache.py) replaces the queries.
+    if config.COLUMNAR_SNAPSHOT:
+        manifest = columnar_cache.read_manifest(db_path)
+        if manifest is not None:
+            data = DashboardData(*(functools.partial(read_snapshot, db_path, manifest, name) for name in READERS))
+            return data.preload() if preload else data
+    loader = SQLiteLoader(db_path, consistent=preload)
+    data = DashboardData(*(functools.partial(loader.load, name) for name in READERS))
+    return data.preload() if preload else data
+
+
+def preload_for_fork(data):
+    # Materialize everything before gunicorn forks its workers (preload_app),
+    # then move the objects out of the GC's reach so collections in the workers
+    # don't write to - and so un-share - the copy-on-write pages
+    data.preload()
+    gc.collect()
+    gc.freeze()
@@ -0,0 +1,144 @@
+# %%
+# Pre-indexed slices of the dashboard datasets.
+# Every callback used to build a full-length boolean mask over the module level
+# DataFrames on each slider tick. Here each dataset is grouped once at load time
+# into small per-key frames so a callback only does a dict lookup.
+import threading
+import time
+
+import pandas as pd
+
+import metrics
+
+
+# %%
+class SliceStore:
+    # Group `frame` by `keys` once; `get(*key)` then returns the rows for that key.
+    # The returned frames are shared between requests, so treat them as read-only
+    # (use .assign()/.copy() instead of assigning columns in place).
+    def __init__(self, frame, keys):
+        self.keys = list(keys)
+        self.columns = list(frame.columns)
+        self._empty = frame.iloc[0:0].copy()
+        self._slices = {}
+        if not frame.empty:
+            for key, group in frame.groupby(self.keys, sort=False):
+                self._slices[key] = group.reset_index(drop=True)
+
+    def get(self, *key):
+        with metrics.phase('data'):
+            return self._slices.get(key, self._empty)
+
+    def get_many(self, keys):
+        # Concatenate the slices for several keys, keeping the order of `keys`
+        with metrics.phase('data'):
+            frames = [self._slices[key] for key in keys if key in self._slices]
+            if not frames:
+                return self._empty
+            if len(frames) == 1:
+                return frames[0]
+            return pd.concat(frames, ignore_index=True)
+
+    def __iter__(self):
+        # The keys of the slices
+        return iter(self._slices)
+
+    def __contains__(self, key):
+        return key in self._slices
+
+    def __len__(self):
+        return len(self._slices)
+
+
+# %%
+class DashboardData:
+    # The four derived datasets of the dashboard plus their slice indexes.
+    # Each dataset is given either as a DataFrame or as a function returning one;
+    # functions are only called (and the slices only built) on first access.
+    SLICE_KEYS = {
+        'sankey': ['company_name', 'year'],
+        'line': ['company_name', 'year', 'multiple_type'],
+        'radar': ['company_name', 'ratio_year'],
+        'football': ['company_name', 'fin_year', 'multiple_type'],
+    }
+
+    def __init__(self, data_sankey, data_line, data_radar, data_football):
+        self._sources = {
+            'sankey': data_sankey,
+            'line': data_line,
+            'radar': data_radar,
+            'football': data_football,
+        }
+        self._frames = {}
+        self._slices = {}
+        self._trend = None
+        self._lock = threading.RLock()
+
+    def frame(self, name):
+        if name not in self._frames:
+            with self._lock:
+                if name not in self._frames:
+                    source = self._sources[name]
+                    started = time.perf_counter()
+                    self._frames[name] = source() if callable(source) else source
+                    metrics.observe_load(name, 'read', time.perf_counter() - started)
+        return self._frames[name]
+
+    def slices(self, name):
+        if name not in self._slices:
+            with self._lock:
+                if name not in self._slices:
+                    frame = self.frame(name)
+                    started = time.perf_counter()
+                    self._slices[name] = SliceStore(frame, self.SLICE_KEYS[name])
+                    metrics.observe_load(name, 'index', time.perf_counter() - started)
+        return self._slices[name]
+
+    @property
+    def trend(self):
+        # Aggregation pyramid of data_line for the multi-year trend graph (pyramid.py)
+        if self._trend is None:
+            with self._lock:
+                if self._trend is None:
+                    from pyramid import TrendPyramid
+                    line = self.frame('line')
+                    started = time.perf_counter()
+                    self._trend = TrendPyramid(line)
+                    metrics.observe_load('line', 'pyramid', time.perf_counter() - started)
+        return self._trend
+
+    def preload(self):
+        for name in self._sources:
+            self.slices(name)
+        self.trend
+        return self
+
+    def distinct(self, name, column):
+        # Unique values of one column in order of appearance (page controls)
+        frame = self.frame(name)
+        with metrics.phase('data'):
+            return frame[column].unique().tolist()
+
+    def iter_rows(self, name, filters, chunk_rows=None):
+        # The slices of dataset `name` whose key values are all in `filters`
+        # ({key column: allowed values}, a missing column allows everything),
+        # one frame per slice (already small, so chunk_rows is not needed here),
+        # for the streaming exports (export.py)
+        store = self.slices(name)
+        positions = [(store.keys.index(column), set(values)) for column, values in filters.items()]
+        for key in list(store):
+            if all(key[position] in values for position, values in positions):
+                yield store.get(*key)
+
+    def loaded(self):
+        return [name for name in self._sources if name in self._frames]
+
+    sankey = property(lambda self: self.frame('sankey'))
+    line = property(lambda self: self.frame('line'))
+    radar = property(lambda self: self.frame('radar'))
+    football = property(lambda self: self.frame('football'))
+
+    sankey_slices = property(lambda self: self.slices('sankey'))
+    line_slices = property(lambda self: self.slices('line'))
+    radar_slices = property(lambda self: self.slices('radar'))
+    football_slices = property(lambda self: self.slices('football'))
@@ -0,0 +1,119 @@
+# %%
+# Decimation of long time series before they are sent to the browser.
+# update_graphs used to ship every raw multiple_value point; past a few
+# thousand points per trace that only costs payload bytes and render time,
+# since the graph is no wider than ~1-2k pixels anyway.
+#
+# Two modes, both of which keep the first/last point and the global
+# minimum/maximum of the series:
+#   'lttb'   largest-triangle-three-buckets, keeps the visual shape
+#   'minmax' the lowest and the highest point of every bucket
+import numpy as np
+
+MODES = ('lttb', 'minmax', 'none')
+
+
+def max_points_for_width(width_px, points_per_px=2, default=1000, floor=100):
+    # Points per trace worth sending for a graph `width_px` pixels wide
+    if not width_px:
+        return default
+    return max(floor, int(width_px * points_per_px))
+
+
+# %%
+def _buckets(n_points, edges):
+    # Row positions of every bucket [edges[i], edges[i + 1]) padded to the
+    # widest one, and the mask of the real ones, for per-bucket numpy reductions
+    counts = np.diff(edges)
+    offsets = np.arange(max(int(counts.max()), 1))
+    positions = np.minimum(edges[:-1, None] + offsets, n_points - 1)
+    return positions, offsets < counts[:, None]
+
+
+def lttb_indices(x, y, n_out):
+    # Indices of the n_out points chosen by largest-triangle-three-buckets
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # n - 2 inner points split into n_out - 2 buckets; first and last are kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    # Average point of every bucket, then shifted by one: the "next bucket"
+    # of the last bucket is the last point
+    avg_x = np.append(np.add.reduceat(x[:-1], edges[:-1]) / counts, x[-1])[1:]
+    avg_y = np.append(np.add.reduceat(np.nan_to_num(y[:-1]), edges[:-1]) / counts, y[-1])[1:]
+    positions, real = _buckets(n, edges)
+    bucket_x, bucket_y = x[positions], y[positions]
+
+    def largest(rows, previous):
+        # Point of each bucket forming the largest triangle with the previous
+        # selected point and the next bucket's average
+        px, py = x[previous][:, None], y[previous][:, None]
+        area = np.abs((px - avg_x[rows, None]) * (bucket_y[rows] - py)
+                      - (px - bucket_x[rows]) * (avg_y[rows, None] - py))
+        area = np.where(real[rows], np.nan_to_num(area, nan=-1.0), -2.0)
+        return edges[rows] + np.argmax(area, axis=1)
+
+    # Every bucket depends on the point selected in the one before it: solve all
+    # buckets at once from a first guess, then again only those whose previous
+    # point changed, until none does (the same points as one bucket at a time)
+    chosen = edges[:-1].copy()
+    rows = np.arange(len(chosen))
+    while len(rows):
+        previous = np.where(rows > 0, chosen[rows - 1], 0)
+        points = largest(rows, previous)
+        changed = rows[points != chosen[rows]] + 1
+        chosen[rows] = points
+        rows = changed[changed < len(chosen)]
+    return np.concatenate([[0], chosen, [n - 1]])
+
+
+def minmax_indices(y, n_out):
+    # Indices of the minimum and maximum of each of n_out / 2 buckets
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(np.int64)
+    edges = np.unique(edges)
+    positions, real = _buckets(n, edges)
+    values = np.where(real, y[positions], np.nan)
+    # Buckets of missing values only keep their first point
+    missing = np.isnan(values).all(axis=1)
+    lowest = np.argmin(np.where(np.isnan(values), np.inf, values), axis=1)
+    highest = np.argmax(np.where(np.isnan(values), -np.inf, values), axis=1)
+    lowest[missing] = highest[missing] = 0
+    return np.unique(np.concatenate([edges[:-1] + lowest, edges[:-1] + highest, [0, n - 1]]))
+
+
+def decimate_indices(x, y, max_points, mode='lttb'):
+    # Sorted row positions to keep so that at most ~max_points remain
+    n = len(y)
+    if mode == 'none' or n <= max_points:
+        return np.arange(n)
+    if mode == 'minmax':
+        selected = minmax_indices(y, max_points)
+    elif mode == 'lttb':
+        selected = lttb_indices(x, y, max_points)
+    else:
+        raise ValueError(f"Unknown downsampling mode {mode!r}, expected one of {MODES}")
+    # Never drop the peak or the trough of the series
+    y = np.asarray(y, dtype=np.float64)
+    if not np.isnan(y).all():
+        selected = np.concatenate([selected, [np.nanargmin(y), np.nanargmax(y)]])
+    return np.unique(selected)
+
+
+def decimate_frame(frame, x_column, y_column, max_points, mode='lttb'):
+    # Rows of `frame` to plot, sorted by x_column; short series are returned as-is
+    if mode == 'none' or len(frame) <= max_points:
+        return frame
+    frame = frame.sort_values(x_column, kind='stable')
+    x = frame[x_column].to_numpy()
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype(np.int64)
+    keep = decimate_indices(x, frame[y_column].to_numpy(dtype=np.float64), max_points, mode)
+    return frame.iloc[keep]
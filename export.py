@@ -0,0 +1,115 @@
+# %%
+# Streaming exports of the rows behind the charts (EXPORT_ROUTES, on by default).
+#   GET /export/<dataset>.<csv|arrow>?company=Spirit&company=JetBlue&year=2023&type=revenue
+# dataset is sankey, line, radar or football; the filters are the ones of the
+# page controls and each can be repeated (start=2022&end=2024 for a year
+# range); a missing filter exports every value. The response is a generator:
+# rows are read a slice (memory backend) or EXPORT_CHUNK_ROWS rows (sql
+# backend, on a connection of its own) at a time, re-batched to
+# EXPORT_CHUNK_ROWS and encoded, so a worker never holds a whole export and
+# other requests are served while it streams. Arrow IPC needs pyarrow.
+import io
+
+import pandas as pd
+
+import schema
+from data_store import DashboardData
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+FORMATS = {
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+# Query parameter -> position of the key column in DashboardData.SLICE_KEYS
+FILTERS = {'company': 0, 'year': 1, 'type': 2}
+
+
+def parse_filters(name, args):
+    # {key column: values} from the request arguments; ValueError when bad
+    keys = DashboardData.SLICE_KEYS[name]
+    filters = {}
+    for parameter, position in FILTERS.items():
+        values = args.getlist(parameter)
+        if parameter == 'year' and (args.get('start') or args.get('end')):
+            if not (args.get('start') and args.get('end')):
+                raise ValueError("start and end go together")
+            values += range(int(args['start']), int(args['end']) + 1)
+        if not values:
+            continue
+        if position >= len(keys):
+            raise ValueError(f"{name} has no {parameter!r} filter")
+        filters[keys[position]] = [int(value) for value in values] if parameter == 'year' else values
+    return filters
+
+
+def rebatch(frames, chunk_rows):
+    # Frames of any size -> frames of about chunk_rows rows
+    pending, pending_rows = [], 0
+    for frame in frames:
+        if frame.empty:
+            continue
+        pending.append(frame)
+        pending_rows += len(frame)
+        if pending_rows >= chunk_rows:
+            yield pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0]
+            pending, pending_rows = [], 0
+    if pending:
+        yield pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0]
+
+
+# %%
+def csv_chunks(columns, frames):
+    yield pd.DataFrame(columns=columns).to_csv(index=False).encode()
+    for frame in frames:
+        yield frame[columns].to_csv(index=False, header=False, date_format='%Y-%m-%d').encode()
+
+
+def arrow_schema(name, columns):
+    # Fixed column types for the whole stream (chunks differ in their
+    # categories and downcast integers)
+    kinds = schema.SCHEMAS[name]
+    types = {'category': pa.string(), 'integer': pa.int64(), 'float': pa.float64(), 'datetime': pa.timestamp('us')}
+    return pa.schema([(column, types[kinds.get(column, 'category')]) for column in columns])
+
+
+def arrow_chunks(name, columns, frames):
+    arrow = arrow_schema(name, columns)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, arrow) as writer:
+        for frame in frames:
+            frame = frame.astype({column: str for column, kind in schema.SCHEMAS[name].items()
+                                  if kind == 'category' and column in frame})
+            writer.write_batch(pa.RecordBatch.from_pandas(frame[columns], schema=arrow, preserve_index=False))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+# %%
+def init_app(server, data_fn, chunk_rows=10000):
+    # GET /export/<dataset>.<format>; data_fn returns the current DashboardData
+    from flask import Response, abort, request
+
+    @server.route('/export/<name>.<fmt>')
+    def export(name, fmt):
+        if name not in DashboardData.SLICE_KEYS or fmt not in FORMATS:
+            abort(404)
+        if fmt == 'arrow' and pa is None:
+            abort(501, "Arrow exports need `pip install pyarrow`")
+        try:
+            filters = parse_filters(name, request.args)
+        except ValueError as error:
+            abort(400, str(error))
+
+        # The data as of this request, also if a hot reload swaps it mid-stream
+        data = data_fn()
+        columns = list(schema.SCHEMAS[name])
+        frames = rebatch(data.iter_rows(name, filters, chunk_rows), chunk_rows)
+        chunks = arrow_chunks(name, columns, frames) if fmt == 'arrow' else csv_chunks(columns, frames)
+        return Response(chunks, mimetype=FORMATS[fmt],
+                        headers={'Content-Disposition': f'attachment; filename="{name}.{fmt}"'})
@@ -0,0 +1,279 @@
+# %%
+# Memoization of the chart callbacks.
+# The callback inputs are small and discrete (company x year x multiple type), so
+# the same figures get rebuilt over and over. Figures are cached under the
+# normalized inputs plus a data version that changes with Airline_MA.db, so a
+# new database automatically invalidates every cached figure - or, when the
+# cache is given a stale_fn, only the figures the change affected (e.g. the
+# slices an incremental ingest appended to, see ingest.py).
+import functools
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import request_scope
+
+
+# %%
+def db_version(path):
+    # Cheap fingerprint of the database file: modification time and size, and
+    # those of its -wal file in WAL mode (see sql_backend.migrate), where commits
+    # only reach the main file at the next checkpoint
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 'missing'
+    version = f'{stat.st_mtime_ns}-{stat.st_size}'
+    try:
+        wal = os.stat(path + '-wal')
+    except OSError:
+        return version
+    # An empty -wal holds no commits (it is created by every reader)
+    return f'{version}+{wal.st_mtime_ns}-{wal.st_size}' if wal.st_size else version
+
+
+def normalize(value):
+    # Make callback inputs hashable and canonical, e.g. the slider can send
+    # 2023 or 2023.0 and the checklist sends a list
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(item) for item in value)
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+# %%
+class FigureMemo:
+    # Values derived from figure objects (e.g. their compacted form), computed
+    # once per object: the figure cache hands out the same object on every hit.
+    # go.Figure is unhashable, so entries are keyed by id() and keep the figure
+    # itself, which keeps that id from being reused while the entry lives.
+    # Bounded LRU.
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, figure, compute):
+        with self._lock:
+            entry = self._entries.get(id(figure))
+            if entry is not None and entry[0] is figure:
+                self._entries.move_to_end(id(figure))
+                return entry[1]
+        value = compute(figure)
+        with self._lock:
+            self._entries[id(figure)] = (figure, value)
+            self._entries.move_to_end(id(figure))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+# %%
+class SharedFigureStore:
+    # Figure store in a local SQLite file so every gunicorn worker on the box
+    # reuses the figures built by the others. Each row keeps its cache key, so
+    # figures a data change did not affect can be moved to the new version.
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(figures)")]
+            if columns and 'entry' not in columns:
+                # Cache file of an older layout: start over
+                conn.execute("DROP TABLE figures")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS figures ("
+                "key TEXT PRIMARY KEY, version TEXT, entry BLOB, value BLOB, last_used REAL)"
+            )
+
+    def _connect(self):
+        # One connection per thread and process: a connection inherited through
+        # fork (gunicorn preload_app, the warm-up pool) must not be reused
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, version):
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM figures WHERE key = ? AND version = ?", (key, version)).fetchone()
+        if row is None:
+            return None
+        # A hit counts as a use, so put() evicts the least recently used figures
+        conn.execute("UPDATE figures SET last_used = ? WHERE key = ?", (time.time(), key))
+        return pickle.loads(row[0])
+
+    def put(self, key, version, entry, figure):
+        # entry: the (function name, normalized args) cache key
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO figures (key, version, entry, value, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, version, pickle.dumps(entry), pickle.dumps(figure, protocol=pickle.HIGHEST_PROTOCOL), time.time()),
+        )
+        # Drop figures of older data versions and keep the newest max_entries
+        conn.execute("DELETE FROM figures WHERE version != ?", (version,))
+        conn.execute(
+            "DELETE FROM figures WHERE key NOT IN "
+            "(SELECT key FROM figures ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def carry_over(self, old_version, new_version, is_stale):
+        # Move the figures of old_version that is_stale(entry) keeps to new_version;
+        # the stale ones are dropped by the next put(). Only the first worker to
+        # see the new version finds anything left to move.
+        conn = self._connect()
+        rows = conn.execute("SELECT key, entry FROM figures WHERE version = ?", (old_version,)).fetchall()
+        keep = [(new_version, key) for key, entry in rows if not is_stale(pickle.loads(entry))]
+        conn.executemany("UPDATE figures SET version = ? WHERE key = ?", keep)
+        return len(keep)
+
+
+# %%
+class FigureCache:
+    # Bounded LRU cache of callback results, optionally backed by a SharedFigureStore.
+    # stale_fn(old_version, new_version) returns a predicate telling which cache
+    # keys a data change made stale, or None when everything is.
+    # order_fn(version) returns the position of a version in the data history
+    # (None if unknown). A request still drawing from a version older than the
+    # cached one (e.g. begun before a hot reload) is served uncached: it neither
+    # reads, fills nor invalidates the cache.
+    def __init__(self, version_fn, max_entries=256, shared_path='', shared_max_entries=None, stale_fn=None,
+                 order_fn=None):
+        self.version_fn = version_fn
+        self.stale_fn = stale_fn
+        self.order_fn = order_fn
+        self.max_entries = max_entries
+        self.shared = SharedFigureStore(shared_path, shared_max_entries or max_entries) if shared_path else None
+        self._entries = OrderedDict()
+        self._version = None
+        # Versions the cache moved past, recognized as older without order_fn
+        self._retired = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.carried_over = 0
+
+    def _is_older(self, version):
+        if version in self._retired:
+            return True
+        if self.order_fn is None or self._version is None:
+            return False
+        position, current = self.order_fn(version), self.order_fn(self._version)
+        return position is not None and current is not None and position < current
+
+    def _current_version(self):
+        version = self.version_fn()
+        if version != self._version and not self._is_older(version):
+            # The data changed: drop what it made stale (everything, unless stale_fn knows better)
+            is_stale = None
+            if self.stale_fn is not None and self._version is not None:
+                is_stale = self.stale_fn(self._version, version)
+            if is_stale is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if is_stale(key)]:
+                    del self._entries[key]
+                self.carried_over += len(self._entries)
+                if self.shared is not None:
+                    try:
+                        self.shared.carry_over(self._version, version, is_stale)
+                    except sqlite3.Error:
+                        pass
+            if self._version is not None:
+                self._retired[self._version] = None
+                while len(self._retired) > 8:
+                    self._retired.popitem(last=False)
+            self._version = version
+        return version
+
+    def memoize(self, func=None, canonical=None):
+        # canonical(*args) -> args maps inputs that must give the same figure to
+        # one form, used for both the cache key and the call (e.g. a checklist
+        # selection, which arrives in click order). @memoize or @memoize(canonical=...)
+        if func is None:
+            return functools.partial(self.memoize, canonical=canonical)
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            # version_fn() and func share a request scope, so a version_fn that
+            # reads it (app.data_version) names the data snapshot func draws from
+            with request_scope.shared_scope():
+                return lookup(*(canonical(*args) if canonical is not None else args))
+
+        def lookup(*args):
+            key = (func.__name__, normalize(args))
+            with self._lock:
+                version = self._current_version()
+                current = version == self._version
+                if current and key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+
+            shared_key = None
+            figure = None
+            if self.shared is not None:
+                shared_key = hashlib.sha1(repr(key).encode()).hexdigest()
+                try:
+                    figure = self.shared.get(shared_key, version)
+                except sqlite3.Error:
+                    figure = None
+
+            with self._lock:
+                if figure is not None:
+                    self.shared_hits += 1
+                else:
+                    self.misses += 1
+            if figure is None:
+                figure = func(*args)
+                if shared_key is not None and current:
+                    try:
+                        self.shared.put(shared_key, version, key, figure)
+                    except sqlite3.Error:
+                        pass
+
+            with self._lock:
+                if current and version == self._version:
+                    self._entries[key] = figure
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+            return figure
+        return wrapper
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'version': self._version,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'carried_over': self.carried_over,
+                'hit_rate': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                'shared': self.shared.path if self.shared is not None else None,
+            }
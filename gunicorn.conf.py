@@ -0,0 +1,19 @@
+# gunicorn settings, picked up automatically by `gunicorn app:server` (Procfile)
+# (every module level name here is read as a gunicorn setting, and `config` is
+# one of them, hence the alias)
+import config as dashboard_config
+
+# With PRELOAD_DATA=1 the app - and all of its data - is loaded once in the
+# master and the forked workers share it copy-on-write
+preload_app = dashboard_config.PRELOAD_DATA
+
+
+def on_starting(server):
+    # WARMUP_ON_BOOT=1: fill the shared figure cache before the workers start
+    if dashboard_config.WARMUP_ON_BOOT:
+        import warmup
+        report = warmup.warm_up(dashboard_config.WARMUP_WORKERS, dashboard_config.WARMUP_MAX_SUBSETS,
+                                dashboard_config.WARMUP_LINE_WIDTHS)
+        server.log.info("Warm-up: %d figures (%d rendered) in %.1fs, %d/%d checklist subsets",
+                        report['figures'], report['rendered'], report['seconds'],
+                        report['coverage']['checklist_subsets'], report['coverage']['checklist_subsets_possible'])
@@ -0,0 +1,163 @@
+# %%
+# HTTP caching of the callback responses (HTTP_CACHE=1, FIGURE_ENDPOINT=1).
+# A callback response depends only on the request (callback outputs, input
+# and state values, which input changed) and on the data, so
+#   - every POST to /_dash-update-component gets a weak ETag: a hash of the
+#     normalized request and the data version. A request carrying it in
+#     If-None-Match is answered 304 Not Modified without running anything,
+#     and the encoded responses are kept per worker, so a repeated
+#     interaction skips the callback and Dash's JSON encoding.
+#   - GET /figure/<chart>?company=Spirit&year=2023 returns one figure as JSON
+#     with the same kind of ETag and Cache-Control: public, max-age, which a
+#     local caching proxy (nginx proxy_cache, varnish, ...) can serve and
+#     revalidate on its own.
+# Responses are stored uncompressed; COMPRESS_RESPONSES still applies to
+# them on the way out. Background callback requests are left alone.
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+from figure_cache import normalize
+
+UPDATE_PATH = '/_dash-update-component'
+# Parts of a Dash update request that decide its response
+REQUEST_FIELDS = ('output', 'outputs', 'inputs', 'state', 'changedPropIds')
+
+
+def request_etag(body, version):
+    # Weak ETag of a Dash update request body under data `version`
+    request = {field: body.get(field) for field in REQUEST_FIELDS}
+    for field in ('inputs', 'state'):
+        request[field] = [
+            [{**item, 'value': normalize(item.get('value'))} for item in entry] if isinstance(entry, list)
+            else {**entry, 'value': normalize(entry.get('value'))}
+            for entry in request[field] or []
+        ]
+    canonical = json.dumps(request, sort_keys=True, separators=(',', ':'), default=str)
+    return 'W/"%s"' % hashlib.sha1(f'{version}|{canonical}'.encode()).hexdigest()
+
+
+def figure_etag(name, args, version):
+    return 'W/"%s"' % hashlib.sha1(repr((version, name, normalize(args))).encode()).hexdigest()
+
+
+class ResponseStore:
+    # Encoded response bodies by ETag, least recently used dropped first
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.not_modified = 0
+        self.misses = 0
+
+    def get(self, etag):
+        with self._lock:
+            body = self._entries.get(etag)
+            if body is not None:
+                self._entries.move_to_end(etag)
+            return body
+
+    def put(self, etag, body):
+        with self._lock:
+            self._entries[etag] = body
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _matches(request, etag):
+    return etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]
+
+
+# %%
+def init_app(server, version_fn, max_entries=512):
+    # ETags, 304s and stored responses for the Dash update requests. Register
+    # after compact.init_compression, so the store sees uncompressed bodies.
+    from flask import Response, g, request
+
+    store = ResponseStore(max_entries)
+
+    @server.before_request
+    def cached_response():
+        if request.method != 'POST' or not request.path.endswith(UPDATE_PATH) or request.args:
+            # (background callback polls carry their job in the query string)
+            return None
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return None
+        etag = request_etag(body, version_fn())
+        if _matches(request, etag):
+            store.not_modified += 1
+            return Response(status=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+        stored = store.get(etag)
+        if stored is not None:
+            store.hits += 1
+            return Response(stored, mimetype='application/json', headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+        store.misses += 1
+        g.http_cache_etag = etag
+        return None
+
+    @server.after_request
+    def store_response(response):
+        etag = g.pop('http_cache_etag', None)
+        if etag is None or response.status_code != 200 or response.mimetype != 'application/json' \
+                or response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return response
+        body = response.get_data()
+        if b'"cacheKey"' not in body:
+            # (not the job handle of a background callback)
+            store.put(etag, body)
+            response.headers['ETag'] = etag
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    return store
+
+
+def figure_endpoint(server, figures, version_fn, max_age=60, store=None):
+    # GET /figure/<chart>: figures = {chart: (function, [(query parameter, type)])};
+    # list parameters repeat (?companies=Spirit&companies=JetBlue)
+    from flask import Response, abort, request
+
+    store = store or ResponseStore(512)
+
+    @server.route('/figure/<name>')
+    def figure(name):
+        if name not in figures:
+            abort(404)
+        function, parameters = figures[name]
+        args = []
+        for parameter, kind in parameters:
+            if kind is list:
+                args.append(request.args.getlist(parameter))
+                continue
+            value = request.args.get(parameter)
+            if value is None:
+                abort(400, f"missing parameter {parameter!r}")
+            try:
+                args.append(kind(value))
+            except ValueError:
+                abort(400, f"bad value for {parameter!r}")
+        etag = figure_etag(name, args, version_fn())
+        headers = {'ETag': etag, 'Cache-Control': f'public, max-age={max_age}'}
+        if _matches(request, etag):
+            store.not_modified += 1
+            return Response(status=304, headers=headers)
+        body = store.get(etag)
+        if body is None:
+            store.misses += 1
+            try:
+                body = pio.to_json(function(*args))
+            except (IndexError, KeyError):
+                # e.g. no income statement for that airline and year
+                abort(404)
+            store.put(etag, body)
+        else:
+            store.hits += 1
+        return Response(body, mimetype='application/json', headers=headers)
+
+    return store
@@ -0,0 +1,365 @@
+# %%
+# Incremental ingest of daily multiples.
+# Every Multiple row carries the Q1, Q3 and average of its (company, multiple
+# type) series as of its date. Appending a day used to mean recomputing them
+# over the whole table; here each series keeps a small streaming state in the
+# MultipleStats table, so a new observation only updates that state:
+#   --bands std        average and average -/+ one (population) standard
+#                      deviation, as in Airline_MA.db and the chart labels;
+#                      running moments (Welford)
+#   --bands quartile   the 25% and 75% quantiles (as benchmarks/generate_db.py
+#                      --bands quartile writes them); P-square estimators over
+#                      the whole history (five markers, constant memory; an
+#                      estimate, which lags on strongly trending series) or
+#                      exact quantiles over a trailing --window of observations
+# A series without a state (first ingest, or other --bands/--window) is read
+# once in date order to build it. Rows are written in batched transactions
+# together with the state of their series and one SliceChanges row per
+# (company, year, multiple type) slice they touch; the dashboard reads that
+# log when the file changes and drops only the figures of those slices (see
+# stale_figures in app.py). Observations not newer than the last one of their
+# series are skipped, so re-running the same file is a no-op.
+#
+#   python ingest.py new_multiples.csv [--db Airline_MA.db] [--bands std] [--window 0]
+# The CSV has company_name (or company_id), multiple_type, date and multiple_value columns.
+import argparse
+import bisect
+import json
+import math
+import sqlite3
+import time
+from collections import deque
+
+import pandas as pd
+
+from figure_cache import db_version
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS "MultipleStats" (
+    "company_id" INTEGER,
+    "multiple_type" TEXT,
+    "bands" TEXT,
+    "window" INTEGER,
+    "last_date" TEXT,
+    "state" TEXT,
+    PRIMARY KEY("company_id", "multiple_type")
+);
+CREATE TABLE IF NOT EXISTS "SliceChanges" (
+    "change_id" INTEGER PRIMARY KEY AUTOINCREMENT,
+    "company_name" TEXT,
+    "year" INTEGER,
+    "multiple_type" TEXT,
+    "ingested_at" REAL
+);
+"""
+
+BANDS = ('std', 'quartile')
+
+
+# %%
+def interpolated_quantile(ordered, p):
+    # Linear interpolation between the closest ranks, like pandas' quantile()
+    position = (len(ordered) - 1) * p
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+class P2Quantile:
+    # Jain & Chlamtac's P-square estimate of the p-quantile: five marker
+    # heights and positions are adjusted with every observation. Exact until
+    # the fifth observation.
+    def __init__(self, p, count=0, heights=None, positions=None, desired=None):
+        self.p = p
+        self.count = count
+        self.heights = heights or []
+        self.positions = positions or [0, 1, 2, 3, 4]
+        self.desired = desired or [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        self.count += 1
+        q, n = self.heights, self.positions
+        if self.count <= 5:
+            bisect.insort(q, x)
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect.bisect_right(q, x) - 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                # Piecewise-parabolic prediction, linear if it leaves the neighbours' range
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def value(self):
+        if self.count <= 5:
+            return interpolated_quantile(self.heights, self.p)
+        return self.heights[2]
+
+    def state(self):
+        return {'p': self.p, 'count': self.count, 'heights': self.heights,
+                'positions': self.positions, 'desired': self.desired}
+
+
+# %%
+class SeriesStats:
+    # Q1, Q3 and average of one (company, multiple type) series, updated one
+    # observation at a time; window=0 covers the whole history, otherwise the
+    # last `window` observations
+    def __init__(self, bands='std', window=0, state=None):
+        if bands not in BANDS:
+            raise ValueError(f"bands must be one of {BANDS}, got {bands!r}")
+        self.bands = bands
+        self.window = window
+        state = state or {}
+        # Running mean and sum of squared deviations (Welford)
+        self.count = state.get('count', 0)
+        self.mean = state.get('mean', 0.0)
+        self.m2 = state.get('m2', 0.0)
+        self.recent = deque(state.get('recent', []))
+        self.ordered = sorted(self.recent)
+        self.quartiles = [P2Quantile(**q) for q in state['quartiles']] if 'quartiles' in state \
+            else [P2Quantile(0.25), P2Quantile(0.75)]
+
+    def _add_moment(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def _remove_moment(self, x):
+        if self.count == 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        delta = x - self.mean
+        self.count -= 1
+        self.mean -= delta / self.count
+        self.m2 -= delta * (x - self.mean)
+
+    def add(self, x):
+        # Returns the (Q1, Q3, average) of the series including x
+        self._add_moment(x)
+        if self.window:
+            self.recent.append(x)
+            bisect.insort(self.ordered, x)
+            if len(self.recent) > self.window:
+                old = self.recent.popleft()
+                del self.ordered[bisect.bisect_left(self.ordered, old)]
+                self._remove_moment(old)
+        elif self.bands == 'quartile':
+            for quartile in self.quartiles:
+                quartile.add(x)
+        return self.values()
+
+    def values(self):
+        if self.bands == 'std':
+            std = math.sqrt(max(self.m2, 0.0) / self.count)
+            return self.mean - std, self.mean + std, self.mean
+        if self.window:
+            return (interpolated_quantile(self.ordered, 0.25), interpolated_quantile(self.ordered, 0.75), self.mean)
+        return self.quartiles[0].value(), self.quartiles[1].value(), self.mean
+
+    def state(self):
+        state = {'count': self.count, 'mean': self.mean, 'm2': self.m2}
+        if self.window:
+            state['recent'] = list(self.recent)
+        elif self.bands == 'quartile':
+            state['quartiles'] = [quartile.state() for quartile in self.quartiles]
+        return state
+
+
+# %%
+# Change log read by the dashboard
+def change_mark(db_path):
+    # Id of the last SliceChanges row (0 when nothing was ingested yet)
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return 0
+    try:
+        return conn.execute("SELECT COALESCE(MAX(change_id), 0) FROM SliceChanges").fetchone()[0]
+    except sqlite3.Error:
+        return 0
+    finally:
+        conn.close()
+
+
+def changed_slices(db_path, since):
+    # (company_name, year, multiple_type) of every slice ingested after change `since`
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT DISTINCT company_name, year, multiple_type FROM SliceChanges WHERE change_id > ?",
+                            (since,)).fetchall()
+    finally:
+        conn.close()
+    return set(rows)
+
+
+_versions = {}
+
+
+def data_version(db_path):
+    # db_version plus the change log position, '<mtime>-<size>@<change id>'.
+    # The mark is read before the file is stat'ed, so it never claims a change
+    # the data of that version might not contain.
+    cached = _versions.get(db_path)
+    if cached is not None and cached[0] == db_version(db_path):
+        return cached[1]
+    mark = change_mark(db_path)
+    stat = db_version(db_path)
+    _versions[db_path] = (stat, f'{stat}@{mark}')
+    return _versions[db_path][1]
+
+
+def version_mark(version):
+    # Change log position of a data_version() string (None for other versions)
+    _, separator, mark = str(version).rpartition('@')
+    return int(mark) if separator and mark.isdigit() else None
+
+
+# %%
+def read_observations(path, companies):
+    # New rows from a CSV, with company ids resolved from company_name if needed
+    rows = pd.read_csv(path)
+    if 'company_id' not in rows:
+        ids = rows['company_name'].map({name: company_id for company_id, name in companies.items()})
+        unknown = rows.loc[ids.isna(), 'company_name'].unique().tolist()
+        if unknown:
+            raise ValueError(f"unknown airlines: {unknown}")
+        rows['company_id'] = ids.astype(int)
+    rows['date'] = pd.to_datetime(rows['date']).dt.strftime('%Y-%m-%d')
+    rows['multiple_value'] = pd.to_numeric(rows['multiple_value'], errors='raise')
+    # The last row wins if a day appears twice
+    rows = rows.drop_duplicates(['company_id', 'multiple_type', 'date'], keep='last')
+    return rows.sort_values(['company_id', 'multiple_type', 'date'], kind='stable')
+
+
+def load_states(conn, keys, bands, window):
+    # {(company_id, multiple_type): [SeriesStats, last date]} for `keys`, and
+    # how many had no state for these bands and window; those are built from
+    # their history in one ordered pass over the Multiple table
+    states = {}
+    for company_id, multiple_type, state_bands, state_window, last_date, state in conn.execute(
+            'SELECT company_id, multiple_type, bands, "window", last_date, state FROM MultipleStats'):
+        if (company_id, multiple_type) in keys and state_bands == bands and state_window == window:
+            states[company_id, multiple_type] = [SeriesStats(bands, window, json.loads(state)), last_date]
+    missing = {key: [SeriesStats(bands, window), None] for key in keys if key not in states}
+    if missing:
+        history = conn.execute("SELECT company_id, multiple_type, date, multiple_value FROM Multiple "
+                               "WHERE multiple_value IS NOT NULL ORDER BY company_id, multiple_type, date")
+        for company_id, multiple_type, date, value in history:
+            entry = missing.get((company_id, multiple_type))
+            if entry is not None:
+                entry[0].add(value)
+                entry[1] = date
+        states.update(missing)
+    return states, len(missing)
+
+
+def ingest(db_path, observations, bands='std', window=0, batch_size=5000):
+    # Append `observations` (see read_observations) and their Q1/Q3/average
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    report = {'inserted': 0, 'skipped': 0, 'batches': 0, 'series': 0, 'bootstrapped': 0, 'changed_slices': 0}
+    try:
+        conn.executescript(STATE_SCHEMA)
+        names = dict(conn.execute("SELECT company_id, company_name FROM Airline"))
+        keys = set(zip(observations['company_id'].astype(int).tolist(), observations['multiple_type'].tolist()))
+        unknown = sorted(company_id for company_id, _ in keys if company_id not in names)
+        if unknown:
+            raise ValueError(f"unknown company_id {unknown}")
+        states, report['bootstrapped'] = load_states(conn, keys, bands, window)
+        pending, touched, changed = [], set(), set()
+
+        def flush():
+            # One transaction: the rows, the state of their series and the change log
+            if not pending:
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                next_id = conn.execute("SELECT COALESCE(MAX(multiple_id), 0) + 1 FROM Multiple").fetchone()[0]
+                conn.executemany(
+                    "INSERT INTO Multiple (multiple_id, company_id, multiple_type, date, multiple_value, Q1, Q3, average) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(next_id + offset, *row) for offset, row in enumerate(pending)],
+                )
+                conn.executemany(
+                    'INSERT OR REPLACE INTO MultipleStats (company_id, multiple_type, bands, "window", last_date, state) '
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(*key, bands, window, states[key][1], json.dumps(states[key][0].state())) for key in touched],
+                )
+                now = time.time()
+                conn.executemany(
+                    "INSERT INTO SliceChanges (company_name, year, multiple_type, ingested_at) VALUES (?, ?, ?, ?)",
+                    [(*key, now) for key in sorted(changed)],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            report['inserted'] += len(pending)
+            report['batches'] += 1
+            report['changed_slices'] += len(changed)
+            pending.clear()
+            touched.clear()
+            changed.clear()
+
+        for (company_id, multiple_type), series in observations.groupby(['company_id', 'multiple_type'], sort=False):
+            company_id = int(company_id)
+            stats, last_date = states[company_id, multiple_type]
+            report['series'] += 1
+            for date, value in zip(series['date'], series['multiple_value']):
+                if last_date is not None and date <= last_date:
+                    report['skipped'] += 1
+                    continue
+                value = float(value)
+                q1, q3, average = stats.add(value)
+                pending.append((company_id, multiple_type, date, value, round(q1, 3), round(q3, 3), round(average, 3)))
+                last_date = date
+                states[company_id, multiple_type][1] = last_date
+                touched.add((company_id, multiple_type))
+                changed.add((names[company_id], int(date[:4]), multiple_type))
+                if len(pending) >= batch_size:
+                    flush()
+        flush()
+    finally:
+        conn.close()
+    report['seconds'] = time.perf_counter() - started
+    return report
+
+
+if __name__ == "__main__":
+    import config
+    parser = argparse.ArgumentParser(description='Append daily multiples and update their rolling Q1/Q3/average')
+    parser.add_argument('csv')
+    parser.add_argument('--db', default=config.DB_PATH)
+    parser.add_argument('--bands', choices=BANDS, default='std')
+    parser.add_argument('--window', type=int, default=0, help='trailing observations per series (0 = whole history)')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+    conn = sqlite3.connect(args.db)
+    try:
+        companies = dict(conn.execute("SELECT company_id, company_name FROM Airline"))
+    finally:
+        conn.close()
+    print(json.dumps(ingest(args.db, read_observations(args.csv, companies), args.bands, args.window,
+                            args.batch_size), indent=2))
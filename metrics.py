@@ -0,0 +1,203 @@
+# %%
+# Request instrumentation and the /metrics endpoint (METRICS=1, the default).
+# Every figure callback is timed as a whole and split into phases:
+#   data       slice lookups / SQL queries (timed in data_store.py, sql_backend.py)
+#   load       reading and indexing a dataset when a callback is the first user
+#   figure     the rest of the callback: building the Plotly figure
+#   serialize  Dash's dispatch and JSON encoding of the response (request time
+#              minus callback time, only for /_dash-update-component requests)
+# together with response sizes and the figure cache counters, in the
+# Prometheus text format. Each gunicorn worker keeps its own numbers.
+# With SLOW_CALLBACK_MS set, callbacks slower than that are logged with their
+# arguments and phase timings.
+import bisect
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1e3, 4e3, 16e3, 64e3, 256e3, 1e6, 4e6, 16e6)
+
+_local = threading.local()
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+# %%
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [count per bucket (+Inf last), sum]
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._series.items()):
+                prefix = _labels(self.labels, labels)
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{prefix},le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_sum{{{prefix}}} {total}')
+                lines.append(f'{self.name}_count{{{prefix}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{{{_labels(self.labels, labels)}}} {value}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def histogram(self, name, help, labels=(), buckets=TIME_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        # func() -> [(name, type, help, value)], read at every scrape
+        self.collectors.append(func)
+        return func
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            for name, kind, help, value in collect():
+                if value is None:
+                    continue
+                lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"])
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CALLBACK_SECONDS = REGISTRY.histogram(
+    'dash_callback_seconds', 'Callback time per phase (total, data, load, figure, serialize)', ('callback', 'phase'))
+CALLBACK_ERRORS = REGISTRY.counter('dash_callback_errors_total', 'Callbacks that raised', ('callback',))
+SLOW_CALLBACKS = REGISTRY.counter('dash_slow_callbacks_total', 'Callbacks slower than SLOW_CALLBACK_MS', ('callback',))
+RESPONSE_BYTES = REGISTRY.histogram(
+    'dash_response_bytes', 'Size of the _dash-update-component responses', ('callback',), SIZE_BUCKETS)
+DATA_LOAD_SECONDS = REGISTRY.histogram(
+    'dashboard_data_load_seconds', 'Reading (read) and indexing (index) of a dataset', ('dataset', 'step'))
+
+
+# %%
+@contextmanager
+def phase(name):
+    # Add the time spent in the block to `name` of the callback running in this thread
+    phases = getattr(_local, 'phases', None)
+    if phases is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + time.perf_counter() - started
+
+
+def observe_load(dataset, step, seconds):
+    DATA_LOAD_SECONDS.observe(seconds, dataset, step)
+    phases = getattr(_local, 'phases', None)
+    if phases is not None:
+        phases['load'] = phases.get('load', 0.0) + seconds
+
+
+def instrument(func, slow_ms=0):
+    # Time every call of the callback `func` and its phases
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        outer = getattr(_local, 'phases', None)
+        _local.phases = phases = {}
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        except Exception:
+            CALLBACK_ERRORS.inc(name)
+            raise
+        finally:
+            total = time.perf_counter() - started
+            _local.phases = outer
+            _local.last_callback = (name, total)
+            phases['figure'] = max(0.0, total - sum(phases.values()))
+            CALLBACK_SECONDS.observe(total, name, 'total')
+            for phase_name, seconds in phases.items():
+                CALLBACK_SECONDS.observe(seconds, name, phase_name)
+            if slow_ms and total * 1000 >= slow_ms:
+                SLOW_CALLBACKS.inc(name)
+                logger.warning("slow callback %s: %.0f ms (%s) args=%r", name, total * 1000,
+                               ', '.join(f"{k} {v * 1000:.0f} ms" for k, v in phases.items()), args)
+    return wrapper
+
+
+# %%
+def init_app(server):
+    # Time the Dash update requests and serve GET /metrics on the Flask server
+    from flask import Response
+
+    @server.before_request
+    def start_timer():
+        _local.request_started = time.perf_counter()
+        _local.last_callback = None
+
+    @server.after_request
+    def record_response(response):
+        from flask import request
+        last = getattr(_local, 'last_callback', None)
+        if last is not None and request.path.endswith('/_dash-update-component'):
+            name, callback_seconds = last
+            elapsed = time.perf_counter() - _local.request_started
+            CALLBACK_SECONDS.observe(max(0.0, elapsed - callback_seconds), name, 'serialize')
+            if not response.direct_passthrough:
+                RESPONSE_BYTES.observe(len(response.get_data()), name)
+        return response
+
+    @server.route('/metrics')
+    def metrics():
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,166 @@
+# %%
+# Partial figure updates (PATCH_FIGURES=1).
+# Moving the year slider keeps the shape of a chart: the sankey keeps its
+# nodes, colors and layout and only its link values and title change; the
+# line graph keeps its trace, lines and annotations and only the x/y arrays,
+# the line positions and labels change. In this mode every graph gets a
+# '<graph>-drawn' store holding a token for the figure the browser has, and
+# the callback answers with a dash.Patch of the values that differ between
+# that figure and the new one instead of the whole figure:
+#   - a full figure goes out on the first render (no token yet), when the
+#     token is unknown to this worker (another gunicorn worker, a background
+#     job process, or an old entry dropped) and when the structure changes:
+#     other traces, another number of lines/annotations, or another sankey
+#     topology (operating income vs. operating loss links)
+#   - the same figure again is no_update
+# The figures sent are kept per worker by token (up to PATCH_HISTORY); a
+# figure object returned again (a figure cache hit) keeps its token.
+import functools
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+from dash import Output, Patch, State, dcc, no_update
+
+from figure_cache import FigureMemo
+
+NoUpdate = type(no_update)
+_DELETE = object()
+# Keys whose change means another chart rather than new values: the trace
+# type, and the node indices of the sankey links
+STRUCTURAL_KEYS = {'type', 'source', 'target'}
+
+
+def drawn_id(graph_id):
+    return f'{graph_id}-drawn'
+
+
+def drawn_store(graph_id):
+    return dcc.Store(id=drawn_id(graph_id))
+
+
+def drawn_outputs(graph_ids):
+    return [Output(drawn_id(graph_id), 'data') for graph_id in graph_ids]
+
+
+def drawn_states(graph_ids):
+    return [State(drawn_id(graph_id), 'data') for graph_id in graph_ids]
+
+
+# %%
+def _equal(old, new):
+    if isinstance(old, np.ndarray) or isinstance(new, np.ndarray):
+        try:
+            return np.array_equal(np.asarray(old), np.asarray(new))
+        except (TypeError, ValueError):
+            return False
+    try:
+        return bool(old == new)
+    except (TypeError, ValueError):
+        return False
+
+
+def _is_records(value):
+    return isinstance(value, (list, tuple)) and all(isinstance(item, dict) for item in value)
+
+
+def figure_changes(old, new, path=()):
+    # (path, value) assignments turning plotly JSON `old` into `new`, or None
+    # when the structure differs
+    changes = []
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in new.items():
+            if key not in old:
+                changes.append((path + (key,), value))
+                continue
+            nested = figure_changes(old[key], value, path + (key,))
+            if nested is None:
+                return None
+            changes.extend(nested)
+        changes.extend((path + (key,), _DELETE) for key in old if key not in new)
+    elif _is_records(old) and _is_records(new) and (old or new):
+        # Traces, shapes, annotations: same count or a new chart
+        if len(old) != len(new):
+            return None
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            nested = figure_changes(old_item, new_item, path + (index,))
+            if nested is None:
+                return None
+            changes.extend(nested)
+    elif not _equal(old, new):
+        if path and path[-1] in STRUCTURAL_KEYS:
+            return None
+        changes.append((path, new))
+    return changes
+
+
+def as_patch(changes):
+    patch = Patch()
+    for path, value in changes:
+        target = patch
+        for key in path[:-1]:
+            target = target[key]
+        if value is _DELETE:
+            del target[path[-1]]
+        else:
+            target[path[-1]] = value
+    return patch
+
+
+# %%
+class DrawnFigures:
+    # Figures sent to the browsers of this worker, by token
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._figures = OrderedDict()
+        # Token and plotly JSON per figure object, so a cached figure sent
+        # again is recognized and stored once
+        self._tokens = FigureMemo(max_entries)
+        self._lock = threading.Lock()
+        self.full = 0
+        self.patches = 0
+        self.unchanged = 0
+
+    def _remember(self, figure):
+        token, plotly_json = self._tokens.get(figure, lambda figure: (
+            uuid.uuid4().hex, figure.to_plotly_json() if hasattr(figure, 'to_plotly_json') else figure))
+        self._figures[token] = plotly_json
+        self._figures.move_to_end(token)
+        while len(self._figures) > self.max_entries:
+            self._figures.popitem(last=False)
+        return token, plotly_json
+
+    def update(self, figure, drawn):
+        # (figure, Patch or no_update for the graph, token for its drawn store)
+        if isinstance(figure, NoUpdate):
+            return figure, no_update
+        with self._lock:
+            old = self._figures.get(drawn) if drawn else None
+            token, new = self._remember(figure)
+            if token == drawn:
+                self.unchanged += 1
+                return no_update, no_update
+            changes = figure_changes(old, new) if old is not None else None
+            if changes is None:
+                self.full += 1
+                return figure, token
+            if not changes:
+                # (the same figure rebuilt, e.g. with the figure cache off)
+                self.unchanged += 1
+                return no_update, token
+            self.patches += 1
+        return as_patch(changes), token
+
+
+def partial(func, count, drawn):
+    # Wraps a figure callback drawing `count` graphs, which gets their drawn
+    # tokens as its last State arguments and also returns the new tokens
+    @functools.wraps(func)
+    def wrapper(*args):
+        tokens = args[len(args) - count:]
+        result = func(*args[:len(args) - count])
+        figures = list(result) if count > 1 else [result]
+        updates = [drawn.update(figure, token) for figure, token in zip(figures, tokens)]
+        return [update[0] for update in updates] + [update[1] for update in updates]
+    return wrapper
@@ -0,0 +1,71 @@
+# %%
+# Time-aggregation pyramid of the multiple series (multi-year trend graph).
+# A year-range view over several airlines would plot every daily row of
+# data_line. Instead each (company, multiple type) series is aggregated once,
+# when the data is loaded (and so again after an ingest or a hot reload),
+# into daily, weekly and monthly buckets holding the mean, min, max and last
+# value and the number of observations. A query picks the finest level that
+# fits the points the graph can show, so the rows it reads and sends are
+# bounded by the graph width rather than by the number of years selected.
+import numpy as np
+
+from data_store import SliceStore
+
+# (level, pandas period) from finest to coarsest
+LEVELS = (('day', 'D'), ('week', 'W'), ('month', 'M'))
+LABELS = {'day': 'daily', 'week': 'weekly', 'month': 'monthly'}
+SERIES_KEYS = ['company_name', 'multiple_type']
+AGGREGATES = ['mean', 'min', 'max', 'last', 'count']
+
+
+def aggregate(line, period):
+    # One row per series and bucket, dated by the start of the bucket. The
+    # Multiple table is stored newest first: sorted by date so 'last' is the
+    # latest value of the bucket
+    frame = line[SERIES_KEYS + ['date', 'multiple_value']].sort_values('date', kind='stable')
+    bucket = frame['date'].dt.to_period(period).dt.start_time.rename('date')
+    grouped = frame.groupby([frame['company_name'], frame['multiple_type'], bucket], observed=True, sort=True)
+    levels = grouped['multiple_value'].agg(AGGREGATES).reset_index()
+    levels['count'] = levels['count'].astype(np.int32)
+    return levels
+
+
+class TrendPyramid:
+    # Aggregated levels of data_line, indexed per (company, multiple type)
+    def __init__(self, line):
+        self.levels = {level: SliceStore(aggregate(line, period), SERIES_KEYS) for level, period in LEVELS}
+        # Series dates per level, for the range lookups
+        self._dates = {}
+        self.companies = line['company_name'].unique().tolist()
+        years = line['date'].dt.year
+        self.years = (int(years.min()), int(years.max())) if len(line) else None
+
+    def _bounds(self, level, company, multiple_type, start, end):
+        # Row range of one series from 1 January `start` to 31 December `end`
+        key = (level, company, multiple_type)
+        if key not in self._dates:
+            rows = self.levels[level].get(company, multiple_type)
+            self._dates[key] = rows['date'].to_numpy()
+        dates = self._dates[key]
+        first, last = dates.searchsorted([np.datetime64(f'{int(start)}-01-01'), np.datetime64(f'{int(end) + 1}-01-01')])
+        return int(first), int(last)
+
+    def resolution(self, companies, multiple_type, start, end, max_points):
+        # Finest level with at most max_points buckets in every selected series
+        for level, _ in LEVELS:
+            widest = max((last - first for first, last in
+                          (self._bounds(level, company, multiple_type, start, end) for company in companies)), default=0)
+            if widest <= max_points:
+                return level
+        return LEVELS[-1][0]
+
+    def select(self, companies, multiple_type, start, end, max_points):
+        # (level, {company: rows}) for the years start..end of the selected series
+        level = self.resolution(companies, multiple_type, start, end, max_points)
+        series = {}
+        for company in companies:
+            first, last = self._bounds(level, company, multiple_type, start, end)
+            if last > first:
+                series[company] = self.levels[level].get(company, multiple_type).iloc[first:last]
+        return level, series
+
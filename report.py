@@ -0,0 +1,202 @@
+# %%
+# Offline report: every chart of every airline/year as static HTML.
+# For board packs, each figure the pages can show (the combinations of
+# warmup.tasks: airline x year (x multiple type) on the Overview page,
+# checklist subset x year on the Comparison page) is drawn by the callbacks'
+# own figure functions in a process pool and written to
+#   <out>/<chart>/<airline>-<year>[-<type>].html
+# next to one shared <out>/plotly.min.js that every file loads, plus an
+# <out>/index.html linking them all.
+# Re-runs are incremental: <out>/manifest.json records a fingerprint of the
+# rows behind each file (and of the figure code and settings), and only the
+# files whose fingerprint changed are rendered again; files of combinations
+# that no longer exist are removed. --force renders everything.
+#
+#   python report.py out/ [--workers 4] [--max-subsets 64] [--force]
+import argparse
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import plotly
+import plotly.io as pio
+
+import config
+import warmup
+
+BUNDLE = 'plotly.min.js'
+MANIFEST = 'manifest.json'
+# Bump when the file layout changes
+FORMAT_VERSION = 1
+CHARTS = {
+    'update_sankey': 'sankey',
+    'update_graphs': 'line',
+    'update_radar_chart': 'radar',
+    'update_bar_chart': 'bar',
+}
+
+
+def slug(value):
+    return re.sub(r'[^A-Za-z0-9]+', '-', str(value)).strip('-')
+
+
+def file_name(name, args):
+    # <chart>/<airline(s)>-<year>[-<type>].html
+    if name in ('update_sankey', 'update_graphs'):
+        parts = [slug(args[0]), str(args[1]), *(slug(value) for value in args[2:3])]
+    else:
+        parts = ['+'.join(slug(company) for company in args[0]) or 'none', str(args[1])]
+    return f"{CHARTS[name]}/{'-'.join(parts)}.html"
+
+
+def write_atomic(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(temporary, path)
+
+
+# %%
+def code_fingerprint():
+    # What else decides how a figure looks: the figure code (app.py and every
+    # module of this folder it loads: valuation.py, downsample.py, pyramid.py,
+    # schema.py, ...), plotly and the settings
+    import app
+    root = os.path.dirname(os.path.abspath(app.__file__))
+    modules = sorted(os.path.abspath(module.__file__) for module in list(sys.modules.values())
+                     if getattr(module, '__file__', None)
+                     and os.path.dirname(os.path.abspath(module.__file__)) == root)
+    digest = hashlib.sha1(f'{FORMAT_VERSION}|{plotly.__version__}'.encode())
+    for path in modules:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    digest.update(repr((config.FOOTBALL_MULTIPLES, config.LINE_DOWNSAMPLE, config.LINE_MAX_POINTS)).encode())
+    return digest.hexdigest()
+
+
+def rows_fingerprint(name, args, code):
+    # Hash of the rows a figure is drawn from (the lookups of its callback)
+    import app
+    data = app.current_data()
+    if name == 'update_sankey':
+        frames = [data.sankey_slices.get(*args)]
+    elif name == 'update_graphs':
+        frames = [app.line_rows(*args[:3])]
+    else:
+        rows = app.comparison_rows(args[0], args[1])
+        frames = [] if rows is None else [*rows[0], rows[1]]
+    digest = hashlib.sha1(f'{code}|{name}|{args!r}'.encode())
+    for frame in frames:
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _render(task):
+    # Runs in a pool process: draws one figure and writes its file
+    import app
+    name, args, out_dir, path = task
+    started = time.perf_counter()
+    try:
+        figure = getattr(app, name)(*args)
+    except (IndexError, KeyError):
+        # e.g. no income statement for that airline and year
+        return path, False, time.perf_counter() - started
+    # The bundle is referenced relative to the file, so the folder can be moved
+    bundle = '../' * path.count('/') + BUNDLE
+    write_atomic(os.path.join(out_dir, path), pio.to_html(figure, include_plotlyjs=bundle, full_html=True))
+    return path, True, time.perf_counter() - started
+
+
+def index_page(files):
+    # Links to every file, grouped by chart
+    sections = []
+    for chart in CHARTS.values():
+        links = ''.join(f'<li><a href="{html.escape(path)}">{html.escape(path.split("/", 1)[1][:-5])}</a></li>'
+                        for path in sorted(files) if path.startswith(chart + '/'))
+        sections.append(f'<h2>{chart}</h2><ul>{links}</ul>')
+    return f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>Airline report</title></head><body>{"".join(sections)}</body></html>'
+
+
+# %%
+def render_report(out_dir, workers=0, max_subsets=64, force=False):
+    # Render what changed since the last run into out_dir; returns a report
+    import app
+    started = time.perf_counter()
+    data = app.current_data().preload()
+    todo, coverage = warmup.tasks(data, max_subsets)
+    code = code_fingerprint()
+
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    wanted, changed = {}, []
+    for name, args in todo:
+        path = file_name(name, args)
+        fingerprint = rows_fingerprint(name, args, code)
+        wanted[path] = fingerprint
+        if force or previous.get(path) != fingerprint or not os.path.exists(os.path.join(out_dir, path)):
+            changed.append((name, args, path))
+
+    bundle = plotly.offline.get_plotlyjs()
+    bundle_path = os.path.join(out_dir, BUNDLE)
+    if force or not os.path.exists(bundle_path) or os.path.getsize(bundle_path) != len(bundle.encode()):
+        write_atomic(bundle_path, bundle)
+
+    # fork shares the loaded data with the pool; spawn re-imports the app
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+    render_started = time.perf_counter()
+    written, skipped = [], []
+    tasks = [(name, args, out_dir, path) for name, args, path in changed]
+    if tasks:
+        with ProcessPoolExecutor(workers or os.cpu_count(), mp_context=context) as pool:
+            for path, rendered, _ in pool.map(_render, tasks, chunksize=8):
+                (written if rendered else skipped).append(path)
+    render_seconds = time.perf_counter() - render_started
+
+    # Combinations without data have no file; forget them so they are tried again
+    for path in skipped:
+        wanted.pop(path, None)
+    files = [path for path in wanted if os.path.exists(os.path.join(out_dir, path))]
+    removed = [path for path in previous if path not in wanted]
+    for path in removed:
+        try:
+            os.remove(os.path.join(out_dir, path))
+        except FileNotFoundError:
+            pass
+    write_atomic(os.path.join(out_dir, 'index.html'), index_page(files))
+    write_atomic(manifest_path, json.dumps(wanted, indent=1, sort_keys=True))
+
+    return {
+        'seconds': time.perf_counter() - started,
+        'combinations': len(todo),
+        'rendered': len(written),
+        'unchanged': len(todo) - len(changed),
+        'skipped_no_data': len(skipped),
+        'removed': len(removed),
+        'files_per_second': len(written) / render_seconds if written else 0.0,
+        'coverage': coverage,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Render every chart combination to static HTML')
+    parser.add_argument('out_dir')
+    parser.add_argument('--workers', type=int, default=config.WARMUP_WORKERS, help='pool size (0 = one per CPU)')
+    parser.add_argument('--max-subsets', type=int, default=config.WARMUP_MAX_SUBSETS)
+    parser.add_argument('--force', action='store_true', help='render every file again')
+    args = parser.parse_args()
+    print(json.dumps(render_report(args.out_dir, args.workers, args.max_subsets, args.force), indent=2))
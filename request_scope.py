@@ -0,0 +1,50 @@
+# %%
+# Request-scoped memo.
+# The charts of a page are drawn by one multi-output callback (app.py); inside
+# it every chart asks for the same data snapshot and the same filtered slices.
+# Within `with scope():` memo() computes each key once and hands the result to
+# every later caller in the same thread; outside a scope it just computes.
+import functools
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+@contextmanager
+def scope():
+    outer = getattr(_local, 'values', None)
+    _local.values = {}
+    try:
+        yield
+    finally:
+        _local.values = outer
+
+
+@contextmanager
+def shared_scope():
+    # The open scope if there is one (e.g. a figure drawn inside a page
+    # callback), otherwise a new one
+    if getattr(_local, 'values', None) is not None:
+        yield
+    else:
+        with scope():
+            yield
+
+
+def memo(key, compute):
+    values = getattr(_local, 'values', None)
+    if values is None:
+        return compute()
+    if key not in values:
+        values[key] = compute()
+    return values[key]
+
+
+def scoped(func):
+    # Run `func` in its own scope (used for the multi-output page callbacks)
+    @functools.wraps(func)
+    def wrapper(*args):
+        with scope():
+            return func(*args)
+    return wrapper
@@ -0,0 +1,93 @@
+# %%
+# Column types of the four derived datasets.
+# Every loader (SQLite queries, the columnar snapshot, the sql backend's per
+# slice queries) passes its frames through conform(), so the callbacks always
+# get the same compact, already-coerced columns and never convert per request:
+#   category   repeated text (airline, multiple type, ...) as integer codes
+#   integer    the smallest signed integer type that holds the values (years
+#              fit in int16)
+#   float      float64 - these values are plotted, and float32 would change
+#              the numbers shown (compact.py trims them on the wire instead);
+#              text such as "1,234.50" is parsed here, unparseable values
+#              become NaN
+#   datetime   parsed from 'YYYY-MM-DD' text if needed
+# A missing column raises ValueError; columns not listed are left alone.
+import numpy as np
+import pandas as pd
+
+SANKEY_NUMERIC = [
+    "Revenue", "Sales & Services Revenue", "Other Revenue",
+    "Operating Expenses", "Selling & Marketing", "Depreciation & Amortization",
+    "Other Operating Expense", "Operating Income", "Operating Loss"
+]
+RADAR_METRICS = ["Profitability", "Liquidity", "Credit", "Leverage_Ratio", "ROIC"]
+
+SCHEMAS = {
+    'sankey': {'company_name': 'category', 'year': 'integer', **dict.fromkeys(SANKEY_NUMERIC, 'float')},
+    'line': {
+        'multiple_id': 'integer', 'company_id': 'integer', 'multiple_type': 'category', 'date': 'datetime',
+        'multiple_value': 'float', 'Q1': 'float', 'Q3': 'float', 'average': 'float',
+        'company_name': 'category', 'year': 'integer',
+    },
+    'radar': {'company_name': 'category', 'ratio_year': 'integer', **dict.fromkeys(RADAR_METRICS, 'float')},
+    'football': {
+        'company_name': 'category', 'fin_year': 'integer', 'multiple_type': 'category', 'Range': 'category',
+        'Value': 'float', 'Range_Display': 'category', 'Label': 'category',
+    },
+}
+
+
+# %%
+def to_float(series):
+    if pd.api.types.is_float_dtype(series.dtype) and series.dtype.itemsize == 8:
+        return series
+    if not pd.api.types.is_numeric_dtype(series.dtype):
+        # Thousands separators in text columns (None/NaN become 'None'/'nan' and parse as NaN)
+        series = series.astype(str).str.replace(',', '', regex=False)
+    return pd.to_numeric(series, errors='coerce').astype(np.float64)
+
+
+def to_integer(series, name):
+    if not pd.api.types.is_integer_dtype(series.dtype):
+        values = pd.to_numeric(series, errors='coerce')
+        if values.isna().any() or (values % 1 != 0).any():
+            raise ValueError(f"column {name!r} must hold integers")
+        series = values.astype(np.int64)
+    if series.empty:
+        return series.astype(np.int16)
+    return pd.to_numeric(series, downcast='integer') if series.dtype.itemsize > 2 else series
+
+
+def to_category(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    return series.astype('category')
+
+
+def to_datetime(series):
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return series
+    return pd.to_datetime(series, format='%Y-%m-%d')
+
+
+def conform(name, frame):
+    # `frame` with the columns of SCHEMAS[name] converted (in place when the
+    # frame is already typed, so memory-mapped snapshot columns stay mapped)
+    schema = SCHEMAS[name]
+    missing = [column for column in schema if column not in frame.columns]
+    if missing:
+        raise ValueError(f"dataset {name!r} is missing columns {missing}")
+    converted = {}
+    for column, kind in schema.items():
+        series = frame[column]
+        if kind == 'category':
+            result = to_category(series)
+        elif kind == 'integer':
+            result = to_integer(series, column)
+        elif kind == 'float':
+            result = to_float(series)
+        else:
+            result = to_datetime(series)
+        if result is not series:
+            converted[column] = result
+    return frame.assign(**converted) if converted else frame
@@ -0,0 +1,110 @@
+# %%
+# Hot reload of Airline_MA.db (HOT_RELOAD=1).
+# The callbacks read the datasets through SnapshotManager.current(), which
+# hands out the data together with its version (so a figure is cached under
+# the version of the data it was drawn from, not a newer one). A
+# background thread polls the database file; when it changes, the new
+# datasets are read and indexed off the request path and then swapped in with
+# a single reference assignment. A callback that took the old snapshot keeps
+# using it until it returns, so it never sees a mix of old and new frames and
+# never pays for the reload itself.
+import os
+import threading
+import time
+import traceback
+
+from figure_cache import db_version
+
+
+class SnapshotManager:
+    def __init__(self, db_path, build, watch=False, poll_interval=2.0, version_fn=db_version):
+        # build(db_path, reload) returns a DashboardData-like object; reload is
+        # True for the background rebuilds, which must be fully materialized.
+        # version_fn(db_path) fingerprints the file (see ingest.data_version)
+        self.db_path = db_path
+        self.build = build
+        self.version_fn = version_fn
+        self.watch = watch
+        self.poll_interval = poll_interval
+        # The version of the first snapshot is read on first use (see
+        # _resolved), so creating the manager - importing the app - does not
+        # open the database
+        self._snapshot = (None, build(db_path, False), time.time())
+        self._reload_lock = threading.Lock()
+        self._version_lock = threading.Lock()
+        self._watcher_pid = None
+        self.reloads = 0
+        self.last_reload_seconds = None
+        self.last_error = None
+
+    # %%
+    def current(self):
+        # (data, version) of the snapshot being served
+        if self.watch and self._watcher_pid != os.getpid():
+            # Threads don't survive fork: start one in each (gunicorn) worker
+            self._start_watcher()
+        version, data, _ = self._resolved()
+        return data, version
+
+    @property
+    def version(self):
+        return self._resolved()[0]
+
+    def _resolved(self):
+        snapshot = self._snapshot
+        if snapshot[0] is None:
+            with self._version_lock:
+                if self._snapshot[0] is None:
+                    self._snapshot = (self.version_fn(self.db_path), *self._snapshot[1:])
+                snapshot = self._snapshot
+        return snapshot
+
+    def reload(self, force=False):
+        # Rebuild from the file and swap the new snapshot in; returns True if it did
+        with self._reload_lock:
+            version = self.version_fn(self.db_path)
+            if version == self.version and not force:
+                return False
+            started = time.perf_counter()
+            data = self.build(self.db_path, True)
+            if self.version_fn(self.db_path) != version:
+                # Written to while we were reading: try again on the next poll
+                return False
+            self.swap(data, version)
+            self.last_reload_seconds = time.perf_counter() - started
+            self.reloads += 1
+            self.last_error = None
+            return True
+
+    def swap(self, data, version):
+        # Serve `data` from now on (one reference assignment, so it is atomic)
+        self._snapshot = (version, data, time.time())
+
+    def _start_watcher(self):
+        with self._reload_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+        thread = threading.Thread(target=self._watch_loop, name='db-watcher', daemon=True)
+        thread.start()
+
+    def _watch_loop(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.reload()
+            except Exception:
+                # Keep serving the last good snapshot
+                self.last_error = traceback.format_exc(limit=1)
+
+    def stats(self):
+        version, data, loaded_at = self._resolved()
+        return {
+            'version': version,
+            'loaded_at': loaded_at,
+            'reloads': self.reloads,
+            'last_reload_seconds': self.last_reload_seconds,
+            'last_error': self.last_error,
+            'watching': self.watch,
+            'datasets_loaded': data.loaded(),
+        }
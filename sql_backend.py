@@ -0,0 +1,326 @@
+# %%
+# SQL-pushdown backend (DATA_BACKEND=sql).
+# For data sets too large to hold in every worker, each callback lookup runs a
+# parameterized query that only returns the rows of its slice, using the same
+# post-processing as the in-memory loader (data_loader.py). Connections are
+# read-only and kept one per thread, so threaded gunicorn workers never share one.
+#
+# Add the indexes the queries rely on (once, after every schema change):
+#   python sql_backend.py migrate [path/to/Airline_MA.db]
+import os
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+import metrics
+import schema
+from data_store import DashboardData
+from pyramid import LEVELS
+from valuation import MULTIPLE_BASES, football_ranges
+
+# Composite indexes matching the WHERE clauses below
+INDEXES = {
+    'idx_multiple_company_type_date': 'Multiple (company_id, multiple_type, date)',
+    'idx_incomestatement_company_year': 'IncomeStatement (company_id, year)',
+    'idx_keyratios_company_year': 'KeyRatios (company_id, ratio_year)',
+    'idx_key_financial_company_year': 'key_financial (company_id, fin_year)',
+    'idx_airline_company_name': 'Airline (company_name, company_id)',
+}
+
+
+def migrate(db_path):
+    # Create the missing indexes and switch the file to WAL, so readers don't
+    # block a writer (e.g. a data ingest) and vice versa
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        for name, target in INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# %%
+class ConnectionPool:
+    # One read-only connection per thread (and per process, so forked workers
+    # never reuse the master's connection)
+    def __init__(self, db_path, immutable=False):
+        mode = 'immutable=1' if immutable else 'mode=ro'
+        self.uri = f"file:{os.path.abspath(db_path)}?{mode}"
+        self._local = threading.local()
+
+    def connect(self):
+        # A new connection, owned by the caller (e.g. for a long streaming read)
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only=1")
+        return conn
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self.connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.connection(), params=list(params))
+
+
+# Page controls: unique values in order of first appearance
+DISTINCT_QUERIES = {
+    ('sankey', 'company_name'): "SELECT a.company_name FROM Airline a JOIN IncomeStatement i ON a.company_id = i.company_id GROUP BY a.company_name ORDER BY MIN(i.rowid)",
+    ('sankey', 'year'): "SELECT i.year FROM Airline a JOIN IncomeStatement i ON a.company_id = i.company_id GROUP BY i.year ORDER BY MIN(i.rowid)",
+    ('line', 'multiple_type'): "SELECT m.multiple_type FROM Multiple m JOIN Airline a ON a.company_id = m.company_id GROUP BY m.multiple_type ORDER BY MIN(m.rowid)",
+    ('radar', 'company_name'): "SELECT a.company_name FROM Airline a JOIN KeyRatios k ON a.company_id = k.company_id GROUP BY a.company_name ORDER BY MIN(k.rowid)",
+    # Years with at least one valuation in data_football (see valuation.MULTIPLE_BASES)
+    ('football', 'fin_year'): "SELECT k.fin_year FROM key_financial k JOIN Airline a ON a.company_id = k.company_id WHERE "
+                              + " OR ".join(
+                                  f"(k.{column} IS NOT NULL AND EXISTS (SELECT 1 FROM Multiple m WHERE m.company_id = k.company_id"
+                                  f" AND m.multiple_type = '{multiple_type}' AND m.Q1 IS NOT NULL AND m.Q3 IS NOT NULL))"
+                                  for multiple_type, (column, _) in MULTIPLE_BASES.items()
+                              )
+                              + " GROUP BY k.fin_year ORDER BY MIN(k.rowid)",
+}
+
+
+# Streaming exports: SQL expression of every key column, and the cleaning the
+# readers in data_loader.py apply to their query results
+EXPORT_COLUMNS = {
+    'sankey': {'company_name': 'a.company_name', 'year': 'i.year'},
+    'line': {'company_name': 'company_name', 'year': None, 'multiple_type': 'multiple_type'},
+    'radar': {'company_name': 'a.company_name', 'ratio_year': 'k.ratio_year'},
+    'football': {'company_name': 'company_name', 'fin_year': 'fin_year', 'multiple_type': 'multiple_type'},
+}
+EXPORT_QUERIES = {
+    'sankey': (data_loader.SANKEY_QUERY, data_loader.clean_sankey),
+    'line': (data_loader.LINE_QUERY, data_loader.clean_line),
+    'radar': (data_loader.RADAR_QUERY, lambda frame: schema.conform('radar', frame)),
+    'football': (data_loader.FOOTBALL_QUERY, lambda frame: schema.conform('football', football_ranges(frame))),
+}
+
+
+def _placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+# Start date of the bucket of a Multiple row per pyramid level (pandas'
+# to_period('W') weeks run Monday to Sunday)
+TREND_BUCKETS = {
+    'day': "date(date)",
+    'week': "date(date, 'weekday 0', '-6 days')",
+    'month': "date(date, 'start of month')",
+}
+# Rows of the selected series with their bucket per level; a bucket belongs to
+# the selected years when it starts within them, like the date range lookup
+# of TrendPyramid (a week started in December ends in January)
+TREND_ROWS = ("WITH rows AS (SELECT company_name, multiple_type, date, Multiple.rowid AS row, multiple_value, {buckets}"
+              " FROM Multiple NATURAL JOIN Airline WHERE company_name IN ({companies}) AND multiple_type = ?"
+              " AND date >= ? AND date < date(?, '+7 days')) ")
+
+
+# %%
+class SQLSlices:
+    # Same get/get_many interface as data_store.SliceStore, answered by SQL.
+    # `columns` are the key columns; position 1 is always the year, which is the
+    # same for every key of one lookup.
+    def __init__(self, fetch, columns):
+        self._fetch = fetch
+        self._order_columns = [column for position, column in enumerate(columns) if position != 1]
+
+    def get(self, *key):
+        with metrics.phase('data'):
+            return self._fetch([key])
+
+    def get_many(self, keys):
+        with metrics.phase('data'):
+            return self._get_many(keys)
+
+    def _get_many(self, keys):
+        frame = self._fetch(list(keys))
+        if len(keys) < 2 or frame.empty:
+            return frame
+        # Keep the order of `keys` like SliceStore does
+        order = {tuple(key[:1]) + tuple(key[2:]): position for position, key in enumerate(keys)}
+        rows = zip(*(frame[column] for column in self._order_columns))
+        position = np.array([order.get(row, len(order)) for row in rows])
+        return frame.iloc[position.argsort(kind='stable')].reset_index(drop=True)
+
+
+class SQLTrend:
+    # Same companies / years / select() as pyramid.TrendPyramid, answered by
+    # GROUP BY queries over the requested slice only, so no multiple rows are
+    # held in the worker and nothing is rebuilt when the file changes
+    def __init__(self, pool):
+        self.pool = pool
+
+    @property
+    def companies(self):
+        with metrics.phase('data'):
+            return [row[0] for row in self.pool.connection().execute(
+                "SELECT company_name FROM Multiple NATURAL JOIN Airline GROUP BY company_name ORDER BY MIN(Multiple.rowid)")]
+
+    @property
+    def years(self):
+        with metrics.phase('data'):
+            first, last = self.pool.connection().execute("SELECT MIN(date), MAX(date) FROM Multiple").fetchone()
+        return (int(first[:4]), int(last[:4])) if first else None
+
+    def _rows(self, companies, levels):
+        buckets = ', '.join(f"{TREND_BUCKETS[level]} AS {level}" for level in levels)
+        return TREND_ROWS.format(buckets=buckets, companies=_placeholders(companies))
+
+    def _params(self, companies, multiple_type, start, end, buckets=1):
+        # Parameters of the rows, then the year bounds of each bucket test
+        bounds = [f"{int(start)}-01-01", f"{int(end) + 1}-01-01"]
+        return [*companies, multiple_type, *bounds] + bounds * buckets
+
+    def resolution(self, companies, multiple_type, start, end, max_points):
+        # Finest level with at most max_points buckets in every selected series
+        widest = ', '.join(f"MAX({level})" for level, _ in LEVELS)
+        counts = ', '.join(f"COUNT(DISTINCT CASE WHEN {level} >= ? AND {level} < ? THEN {level} END) AS {level}"
+                           for level, _ in LEVELS)
+        with metrics.phase('data'):
+            rows = self.pool.connection().execute(
+                f"{self._rows(companies, TREND_BUCKETS)} SELECT {widest} FROM (SELECT {counts} FROM rows GROUP BY company_name)",
+                self._params(companies, multiple_type, start, end, len(LEVELS)),
+            ).fetchone()
+        for (level, _), buckets in zip(LEVELS, rows):
+            if (buckets or 0) <= max_points:
+                return level
+        return LEVELS[-1][0]
+
+    def select(self, companies, multiple_type, start, end, max_points):
+        # (level, {company: rows}) for the years start..end of the selected series.
+        # 'last' is the value of the newest non-missing row of each bucket, found
+        # by the largest "date rowid" key (same order as the stable date sort of
+        # pyramid.aggregate) and read back by rowid
+        level = self.resolution(companies, multiple_type, start, end, max_points)
+        frame = self.pool.query(
+            f"{self._rows(companies, [level])} SELECT company_name, multiple_type, date, mean, min, max,"
+            " (SELECT multiple_value FROM Multiple WHERE rowid = CAST(substr(newest, -12) AS INTEGER)) AS last, count"
+            f" FROM (SELECT company_name, multiple_type, {level} AS date, AVG(multiple_value) AS mean,"
+            " MIN(multiple_value) AS min, MAX(multiple_value) AS max, COUNT(multiple_value) AS count,"
+            " MAX(CASE WHEN multiple_value IS NOT NULL THEN printf('%s %012d', date, row) END) AS newest"
+            f" FROM rows WHERE {level} >= ? AND {level} < ? GROUP BY company_name, {level})"
+            " ORDER BY company_name, date",
+            self._params(companies, multiple_type, start, end),
+        )
+        frame['date'] = pd.to_datetime(frame['date'], format='%Y-%m-%d')
+        frame['count'] = frame['count'].astype(np.int32)
+        series = {company: rows.reset_index(drop=True) for company, rows in frame.groupby('company_name', sort=False)}
+        return level, {company: series[company] for company in companies if company in series}
+
+
+class SQLDashboardData:
+    # Drop-in replacement for data_store.DashboardData that keeps no rows in memory
+    def __init__(self, db_path, immutable=False):
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path, immutable=immutable)
+        keys = DashboardData.SLICE_KEYS
+        self.sankey_slices = SQLSlices(self._sankey, keys['sankey'])
+        self.line_slices = SQLSlices(self._line, keys['line'])
+        self.radar_slices = SQLSlices(self._radar, keys['radar'])
+        self.football_slices = SQLSlices(self._football, keys['football'])
+        self.trend = SQLTrend(self.pool)
+
+    # Each fetch receives (company, year[, type]) keys; the pages only ever ask
+    # for one year (and type) at a time, with one or several companies
+    def _sankey(self, keys):
+        companies = [key[0] for key in keys]
+        return data_loader.clean_sankey(self.pool.query(
+            data_loader.SANKEY_QUERY + f" WHERE a.company_name IN ({_placeholders(companies)}) AND i.year = ?",
+            companies + [keys[0][1]],
+        ))
+
+    def _line(self, keys):
+        companies = [key[0] for key in keys]
+        year, multiple_type = keys[0][1], keys[0][2]
+        # A date range instead of strftime() so the (company_id, multiple_type, date) index is used
+        return data_loader.clean_line(self.pool.query(
+            data_loader.LINE_QUERY + f" WHERE company_name IN ({_placeholders(companies)})"
+            " AND multiple_type = ? AND date >= ? AND date < ? ORDER BY Multiple.rowid",
+            companies + [multiple_type, f"{int(year)}-01-01", f"{int(year) + 1}-01-01"],
+        ))
+
+    def _radar(self, keys):
+        companies = [key[0] for key in keys]
+        return schema.conform('radar', self.pool.query(
+            data_loader.RADAR_QUERY + f" WHERE a.company_name IN ({_placeholders(companies)}) AND k.ratio_year = ?",
+            companies + [keys[0][1]],
+        ))
+
+    def _football(self, keys):
+        companies = list(dict.fromkeys(key[0] for key in keys))
+        types = list(dict.fromkeys(key[2] for key in keys))
+        return schema.conform('football', football_ranges(self.pool.query(
+            data_loader.FOOTBALL_QUERY + f" WHERE company_name IN ({_placeholders(companies)}) AND fin_year = ?"
+            f" AND multiple_type IN ({_placeholders(types)})",
+            companies + [keys[0][1]] + types,
+        )))
+
+    def iter_rows(self, name, filters, chunk_rows=10000):
+        # Rows of dataset `name` whose key values are all in `filters`, read
+        # chunk_rows at a time on a connection of their own (export.py)
+        conditions, params = [], []
+        for column, values in filters.items():
+            values = list(values)
+            if name == 'line' and column == 'year':
+                # Date ranges, so the (company_id, multiple_type, date) index is used
+                conditions.append('(' + ' OR '.join(['(date >= ? AND date < ?)'] * len(values) or ['0']) + ')')
+                params += [bound for year in values for bound in (f"{int(year)}-01-01", f"{int(year) + 1}-01-01")]
+            else:
+                conditions.append(f"{EXPORT_COLUMNS[name][column]} IN ({_placeholders(values)})")
+                params += values
+        query, clean = EXPORT_QUERIES[name]
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        conn = self.pool.connect()
+        try:
+            cursor = conn.execute(query, params)
+            columns = [description[0] for description in cursor.description]
+            # The rows of one football valuation can be several (one band each,
+            # see valuation.one_band_per_key); that small dataset is cleaned in one piece
+            fetch = cursor.fetchall if name == 'football' else lambda: cursor.fetchmany(chunk_rows)
+            while True:
+                rows = fetch()
+                if not rows:
+                    break
+                yield clean(pd.DataFrame(rows, columns=columns))
+        finally:
+            conn.close()
+
+    def frame(self, name):
+        # Whole dataset, read on demand and not kept (client-side payloads only)
+        return data_loader.READERS[name](self.pool.connection())
+
+    def distinct(self, name, column):
+        # Ordered like DataFrame.unique() on the in-memory frames
+        with metrics.phase('data'):
+            return [row[0] for row in self.pool.connection().execute(DISTINCT_QUERIES[name, column])]
+
+    sankey = property(lambda self: self.frame('sankey'))
+    line = property(lambda self: self.frame('line'))
+    radar = property(lambda self: self.frame('radar'))
+    football = property(lambda self: self.frame('football'))
+
+    def preload(self):
+        return self
+
+    def loaded(self):
+        return []
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != 'migrate':
+        sys.exit("usage: python sql_backend.py migrate [db_path]")
+    import config
+    path = sys.argv[2] if len(sys.argv) > 2 else config.DB_PATH
+    migrate(path)
+    print(f"Indexes up to date in {path}")
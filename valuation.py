@@ -0,0 +1,75 @@
+# %%
+# Valuation engine for the football field chart -> Final use: data_football
+# Every (company, year) financial metric is multiplied by the lower (Q1) and
+# upper (Q3) trading multiple of its type, for all multiple types, companies
+# and years in one vectorized pass. The chart callback then only looks up the
+# precomputed rows.
+import numpy as np
+import pandas as pd
+
+# Multiple type -> (key_financial column it applies to, Range name prefix).
+# Types without a matching metric (e.g. P_BV, there is no book value in
+# key_financial) cannot be turned into an enterprise value and are skipped.
+MULTIPLE_BASES = {
+    'revenue': ('revenue', 'EV_Revenue'),
+    'EBITDA': ('EBITDA', 'EV_EBITDA'),
+}
+
+FOOTBALL_COLUMNS = ['company_name', 'fin_year', 'multiple_type', 'Range', 'Value', 'Range_Display', 'Label']
+FOOTBALL_KEY = ['company_name', 'fin_year', 'multiple_type']
+
+
+def one_band_per_key(key_financial):
+    # The rows can carry several lower/upper bands per company / fin_year /
+    # multiple_type (the Q1/Q3 of a series change as multiples are ingested);
+    # a valuation uses one of them: the last row of its key. With a band_year
+    # column that is the band of fin_year or the closest year before it, and
+    # the first band for years before any
+    key_financial = key_financial.reset_index(drop=True)
+    if 'band_year' in key_financial:
+        band_year = key_financial['band_year'].to_numpy(dtype=np.float64)
+        before = band_year <= key_financial['fin_year'].to_numpy(dtype=np.float64)
+        # Sorted so the wanted band comes last: the bands after fin_year
+        # first, latest to earliest, then the others, earliest to latest
+        order = np.lexsort((np.where(before, band_year, -band_year), before))
+        keep = np.zeros(len(key_financial), dtype=bool)
+        keep[order[~key_financial.iloc[order].duplicated(FOOTBALL_KEY, keep='last').to_numpy()]] = True
+    else:
+        keep = ~key_financial.duplicated(FOOTBALL_KEY, keep='last').to_numpy()
+    return key_financial[keep].reset_index(drop=True)
+
+
+def football_ranges(key_financial):
+    # key_financial: rows per company / fin_year / multiple_type with the
+    # metric columns of MULTIPLE_BASES plus the 'lower' and 'upper' multiples,
+    # reduced to one band per key first (one_band_per_key).
+    # Returns two rows per valuation: the lower bound ('<prefix>_lower') and the
+    # width of the range on top of it ('<prefix>_upper'), lower rows first.
+    key_financial = one_band_per_key(key_financial)
+    types = list(MULTIPLE_BASES)
+    type_index = pd.Categorical(key_financial['multiple_type'], categories=types).codes
+    known = type_index >= 0
+
+    # base[i] = metric of row i's multiple type, picked from an (n, types) matrix
+    metrics = np.column_stack([
+        pd.to_numeric(key_financial[column], errors='coerce').to_numpy(dtype=np.float64)
+        if column in key_financial else np.full(len(key_financial), np.nan)
+        for column, _ in MULTIPLE_BASES.values()
+    ]) if len(key_financial) else np.empty((0, len(types)))
+    base = np.where(known, metrics[np.arange(len(key_financial)), np.maximum(type_index, 0)], np.nan)
+
+    low = base * key_financial['lower'].to_numpy(dtype=np.float64)
+    high = base * key_financial['upper'].to_numpy(dtype=np.float64)
+    # A negative metric flips the bounds
+    lower = np.minimum(low, high)
+    width = np.abs(high - low)
+
+    valid = known & ~np.isnan(lower) & ~np.isnan(width)
+    rows = key_financial.loc[valid, FOOTBALL_KEY].reset_index(drop=True)
+    prefixes = np.array([prefix for _, prefix in MULTIPLE_BASES.values()], dtype=object)[type_index[valid]]
+
+    lower_rows = rows.assign(Range=prefixes + '_lower', Value=lower[valid], Range_Display='Transparent')
+    upper_rows = rows.assign(Range=prefixes + '_upper', Value=width[valid], Range_Display=rows['company_name'])
+    data_football = pd.concat([lower_rows, upper_rows], ignore_index=True)
+    data_football['Label'] = data_football['company_name'] + ' (' + data_football['multiple_type'] + ')'
+    return data_football[FOOTBALL_COLUMNS].astype({'Value': 'float64'})
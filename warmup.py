@@ -0,0 +1,115 @@
+# %%
+# Warm-up: pre-render every figure into the shared figure cache.
+# The inputs of the charts are finite - airline x year (x multiple type) on the
+# Overview page, checklist subset x year on the Comparison page - so instead of
+# the first visitor of every combination paying for the figure, all of them
+# are rendered up front in a process pool. Each pool process calls the same
+# callbacks the server does, and FigureCache stores the results in the SQLite
+# file at FIGURE_CACHE_PATH that every gunicorn worker reads.
+# Checklist subsets grow as 2^airlines, so only the largest `max_subsets` (in
+# checklist order, the full selection first) are rendered per year.
+#
+#   FIGURE_CACHE_PATH=/tmp/figures.db python warmup.py [--workers 4] [--max-subsets 64]
+# or WARMUP_ON_BOOT=1 with gunicorn (see gunicorn.conf.py).
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+def year_range(years):
+    # Every value the page's slider (step=1) can send
+    return list(range(int(min(years)), int(max(years)) + 1)) if years else []
+
+
+def checklist_subsets(companies, max_subsets):
+    # Selections of the company checklist, largest first, in checklist order
+    # (the order app.checklist_order puts every selection in, whatever the
+    # order it was clicked in)
+    subsets = []
+    for size in range(len(companies), -1, -1):
+        for subset in itertools.combinations(companies, size):
+            if len(subsets) >= max_subsets:
+                return subsets
+            subsets.append(list(subset))
+    return subsets
+
+
+def tasks(data, max_subsets=64, line_widths=()):
+    # (callback name, args) of every figure to render, and the coverage they give
+    companies = data.distinct('sankey', 'company_name')
+    sankey_years = year_range(data.distinct('sankey', 'year'))
+    multiple_types = data.distinct('line', 'multiple_type')
+    radar_companies = data.distinct('radar', 'company_name')
+    football_years = year_range(data.distinct('football', 'fin_year'))
+    subsets = checklist_subsets(radar_companies, max_subsets)
+    widths = [None, *line_widths]
+
+    result = [('update_sankey', (company, year)) for company, year in itertools.product(companies, sankey_years)]
+    result += [('update_graphs', (company, year, multiple_type, width))
+               for company, year, multiple_type, width in itertools.product(companies, sankey_years, multiple_types, widths)]
+    for name in ('update_radar_chart', 'update_bar_chart'):
+        result += [(name, (subset, year)) for subset, year in itertools.product(subsets, football_years)]
+    coverage = {
+        'checklist_subsets': len(subsets),
+        'checklist_subsets_possible': 2 ** len(radar_companies),
+        'line_widths': widths,
+    }
+    return result, coverage
+
+
+# %%
+def _render(task):
+    # Runs in a pool process
+    import app
+    name, args = task
+    misses = app.figure_cache.misses
+    started = time.perf_counter()
+    getattr(app, name)(*args)
+    return name, time.perf_counter() - started, app.figure_cache.misses > misses
+
+
+def warm_up(workers=0, max_subsets=64, line_widths=()):
+    # Render everything into the shared cache; returns a report
+    import app
+    if app.figure_cache.shared is None:
+        raise RuntimeError("warm-up needs a shared figure cache, set FIGURE_CACHE_PATH")
+    started = time.perf_counter()
+    data = app.current_data().preload()
+    todo, coverage = tasks(data, max_subsets, line_widths)
+    if len(todo) > app.figure_cache.shared.max_entries:
+        print(f"Warning: {len(todo)} figures but FIGURE_CACHE_SHARED_SIZE is {app.figure_cache.shared.max_entries}, "
+              "the oldest will be evicted.")
+
+    # fork shares the loaded data with the pool; spawn re-imports the app
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+    per_callback = {}
+    with ProcessPoolExecutor(workers or os.cpu_count(), mp_context=context) as pool:
+        for name, seconds, rendered in pool.map(_render, todo, chunksize=8):
+            stats = per_callback.setdefault(name, {'figures': 0, 'rendered': 0, 'render_seconds': 0.0})
+            stats['figures'] += 1
+            stats['rendered'] += rendered
+            stats['render_seconds'] += seconds
+
+    return {
+        'seconds': time.perf_counter() - started,
+        'figures': len(todo),
+        'rendered': sum(stats['rendered'] for stats in per_callback.values()),
+        'already_cached': len(todo) - sum(stats['rendered'] for stats in per_callback.values()),
+        'callbacks': per_callback,
+        'coverage': coverage,
+    }
+
+
+if __name__ == "__main__":
+    import config
+    parser = argparse.ArgumentParser(description='Pre-render every figure into the shared figure cache')
+    parser.add_argument('--workers', type=int, default=config.WARMUP_WORKERS, help='pool size (0 = one per CPU)')
+    parser.add_argument('--max-subsets', type=int, default=config.WARMUP_MAX_SUBSETS)
+    parser.add_argument('--line-widths', type=int, nargs='*', default=config.WARMUP_LINE_WIDTHS)
+    args = parser.parse_args()
+    print(json.dumps(warm_up(args.workers, args.max_subsets, args.line_widths), indent=2))